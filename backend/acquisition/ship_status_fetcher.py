@@ -2,6 +2,7 @@ import os
 import requests
 from datetime import datetime
 import sys
+import time
 import reverse_geocoder as rg
 import pycountry
 import pycountry_convert as pc
@@ -11,8 +12,27 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import database
 import config
+import event_bus
+from analysis import geofence
+
+try:
+    import ijson
+except ImportError:  # 未安装 ijson 时整体解码响应
+    ijson = None
+
+FLEET_API_TIMEOUT = (10, 30)
+# 接口未返回 updatetime 的船舶位置不变时也按该间隔写入心跳点，
+# 需小于离线判定 (ships_status offline_hours=2) 与活动分段间隔 (ship_activity.GAP_HOURS=2)
+HEARTBEAT_SECONDS = 60 * 60
 
 _geo_initialized = False
+_session = None
+# 上次成功响应的条件请求头与解析结果 (304 时复用)
+_fleet_cache = {"etag": None, "last_modified": None, "ships": {}}
+# mmsi -> 最近一次写入的位置指纹，None 表示尚未从数据库加载
+_fingerprints = None
+# mmsi -> 最近一次写入的时间 (epoch 秒)，用于心跳
+_last_written = {}
 
 def _ensure_geo_loaded():
     """确保地理编码数据已加载（只加载一次）"""
@@ -22,29 +42,144 @@ def _ensure_geo_loaded():
         rg.search((0, 0), mode=1)  # 预加载地理数据
         _geo_initialized = True
 
+def _get_session():
+    """复用 keep-alive 连接的 Fleet API 会话"""
+    global _session
+    if _session is None:
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=2)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _session = session
+    return _session
+
+def _parse_fleet_response(resp):
+    """
+    解析 {"result": "ok", "list": [...]}，返回 (result, {mmsi: item})
+
+    安装了 ijson 时边下载边解析，不在内存中保留完整响应文本。
+    """
+    ship_map = {}
+    if ijson is None:
+        data = resp.json()
+        for item in data.get("list", []) or []:
+            if item.get("mmsi"):
+                ship_map[str(item["mmsi"])] = item
+        return data.get("result"), ship_map
+
+    resp.raw.decode_content = True
+    result = None
+    builder = None
+    for prefix, event, value in ijson.parse(resp.raw, use_float=True):
+        if prefix == "result":
+            result = value
+        elif prefix == "list.item" and event == "start_map":
+            builder = ijson.ObjectBuilder()
+            builder.event(event, value)
+        elif builder is not None:
+            builder.event(event, value)
+            if prefix == "list.item" and event == "end_map":
+                item = builder.value
+                builder = None
+                if item.get("mmsi"):
+                    ship_map[str(item["mmsi"])] = item
+    return result, ship_map
+
 def fetch_all_fleet_positions():
-    """从 Fleet API 获取所有船舶位置"""
+    """从 Fleet API 获取所有船舶位置 (条件请求，数据未变化时返回上次结果)"""
+    headers = {}
+    if _fleet_cache["etag"]:
+        headers["If-None-Match"] = _fleet_cache["etag"]
+    if _fleet_cache["last_modified"]:
+        headers["If-Modified-Since"] = _fleet_cache["last_modified"]
     try:
-        resp = requests.get(config.FLEET_API_URL, timeout=30)
-        if resp.status_code != 200:
-            print(f"[API] 请求失败: {resp.status_code}")
-            return {}
-        
-        data = resp.json()
-        if data.get("result") != "ok":
-            print(f"[API] 返回错误: {data}")
-            return {}
-            
-        ship_map = {}
-        for item in data.get("list", []):
-            mmsi = item.get("mmsi")
-            if mmsi:
-                ship_map[str(mmsi)] = item
-        return ship_map
+        with _get_session().get(config.FLEET_API_URL, headers=headers, timeout=FLEET_API_TIMEOUT, stream=True) as resp:
+            if resp.status_code == 304:
+                print("[API] Fleet 数据未变化 (304)")
+                return _fleet_cache["ships"]
+            if resp.status_code != 200:
+                print(f"[API] 请求失败: {resp.status_code}")
+                return {}
+
+            result, ship_map = _parse_fleet_response(resp)
+            if result != "ok":
+                print(f"[API] 返回错误: result={result}")
+                return {}
+            _fleet_cache.update({
+                "etag": resp.headers.get("ETag"),
+                "last_modified": resp.headers.get("Last-Modified"),
+                "ships": ship_map,
+            })
+            return ship_map
     except Exception as e:
         print(f"[API] 获取数据异常: {e}")
         return {}
 
+def _fingerprint(lat, lng, speed, heading, status_raw, update_time):
+    return (update_time or "", lat, lng, speed, heading, status_raw)
+
+def _unchanged(previous, fingerprint, last_written=None):
+    """
+    与上次写入的指纹比较；接口未返回 updatetime 时 (入库时间为写入时刻) 只比较位置、航速与状态，
+    且距上次写入超过 HEARTBEAT_SECONDS 时视为有变化 (写入心跳点，避免停泊船舶被判为离线)
+    """
+    if previous is None:
+        return False
+    if not fingerprint[0]:
+        if not last_written or time.time() - last_written >= HEARTBEAT_SECONDS:
+            return False
+        return previous[1:] == fingerprint[1:]
+    return previous == fingerprint
+
+def _load_fingerprints():
+    """从最新位置表恢复指纹，进程重启后无需全量重写"""
+    global _fingerprints
+    if _fingerprints is None:
+        _fingerprints = {}
+        try:
+            for mmsi, lat, lng, speed, heading, status_raw, timestamp, _ in database.get_latest_positions(0):
+                _fingerprints[str(mmsi)] = _fingerprint(lat, lng, speed, heading, status_raw, timestamp)
+                try:
+                    _last_written[str(mmsi)] = datetime.fromisoformat(str(timestamp)).timestamp()
+                except (TypeError, ValueError):
+                    pass
+        except Exception as e:
+            print(f"[Status] 加载位置指纹失败: {e}")
+    return _fingerprints
+
+def _parse_position(ship_info):
+    """Fleet API 条目转为 (lat, lng, speed, heading, status_raw, update_time)"""
+    return (
+        float(ship_info.get("lat", 0)),
+        float(ship_info.get("lon", 0)),
+        float(ship_info.get("speed", 0)),
+        float(ship_info.get("heading", 0)),
+        ship_info.get("status", "Unknown"),
+        ship_info.get("updatetime"),
+    )
+
+def _reverse_geocode(coords):
+    """批量地理反向编码，返回与 coords 对应的 (country, continent, province, city)"""
+    empty = ("", "", "", "")
+    if not coords:
+        return []
+    try:
+        results = rg.search(coords, mode=1)
+    except Exception as geo_e:
+        print(f"[Status] Geo Error: {geo_e}")
+        return [empty] * len(coords)
+    geo = []
+    for info in results:
+        cc = info.get('cc', '')
+        country_name = ""
+        continent = ""
+        if cc:
+            c_obj = pycountry.countries.get(alpha_2=cc)
+            country_name = c_obj.name if c_obj else cc
+            continent = get_continent_name(cc)
+        geo.append((country_name, continent, info.get('admin1', ''), info.get('name', '')))
+    return geo
+
 def get_continent_name(country_code):
     try:
         if not country_code: return 'Unknown'
@@ -63,7 +198,7 @@ def get_continent_name(country_code):
         return 'Unknown'
 
 def update_ship_statuses():
-    """批量更新船舶状态"""
+    """批量更新船舶状态，返回本轮写入位置的船舶数"""
     print("[Status] 开始更新船舶位置信息...")
     database.init_track_db()
     
@@ -71,7 +206,7 @@ def update_ship_statuses():
     fleet_data = fetch_all_fleet_positions()
     if not fleet_data:
         print("[Status] 未获取到船舶位置数据")
-        return
+        return 0
 
     conn = database.sqlite3.connect(database.TRACK_DB_PATH, timeout=30)
     c = conn.cursor()
@@ -80,93 +215,125 @@ def update_ship_statuses():
     c.execute("SELECT mmsi, name FROM ship_infos WHERE mmsi IS NOT NULL AND mmsi != ''")
     db_ships = c.fetchall()
     
-    updated_count = 0
-    
-    # 预加载地理数据（只加载一次）
-    _ensure_geo_loaded()
-
+    # 3. 按位置指纹筛出有变化的船舶，只有这些船舶进入地理编码与写库
+    fingerprints = _load_fingerprints()
+    changed = []
     for (mmsi, ship_name_db) in db_ships:
         mmsi = str(mmsi)
         ship_info = fleet_data.get(mmsi)
-        
-        if ship_info:
-            try:
-                lat = float(ship_info.get("lat", 0))
-                lng = float(ship_info.get("lon", 0))
-                
-                # 如果经纬度为 0，跳过更新位置（避免显示在 0,0 坐标）
-                if abs(lat) < 0.01 and abs(lng) < 0.01:
-                    continue
-                    
-                speed = float(ship_info.get("speed", 0))
-                heading = float(ship_info.get("heading", 0))
-                status_raw = ship_info.get("status", "Unknown")
-                update_time = ship_info.get("updatetime")
-                
-                # Get vessel name from API or DB
-                vessel_name = ship_info.get("shipname") or ship_info.get("name") or ship_name_db
-                
-                # 地理反向编码
-                country_name = ""
-                continent = ""
-                province = ""
-                city = ""
-                
-                if lat != 0 and lng != 0:
-                    try:
-                        results = rg.search((lat, lng), mode=1)
-                        if results:
-                            info = results[0]
-                            cc = info.get('cc', '')
-                            province = info.get('admin1', '')
-                            city = info.get('name', '')
-                            
-                            if cc:
-                                c_obj = pycountry.countries.get(alpha_2=cc)
-                                country_name = c_obj.name if c_obj else cc
-                                continent = get_continent_name(cc)
-                    except Exception as geo_e:
-                        print(f"[Status] Geo Error for {mmsi}: {geo_e}")
-
-                # 更新 ships 表
-                # We update status here to ensure frontend sees the latest status from Fleet API
-                c.execute("""
-                    UPDATE ship_infos 
-                    SET location = ?, 
-                        updated_at = ?,
-                        country = ?,
-                        continent = ?,
-                        province = ?,
-                        city = ?,
-                        speed = ?,
-                        heading = ?,
-                        status = ?
-                    WHERE mmsi = ?
-                """, (f"{lat}, {lng}", datetime.now().isoformat(), 
-                      country_name, continent, province, city, speed, heading, status_raw, mmsi))
-                
-                c.execute('''INSERT INTO ship_tracks 
-                    (mmsi, lat, lng, speed, heading, status_raw, timestamp, created_at, vessel_name)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                    (mmsi, lat, lng, speed, heading, status_raw, update_time or datetime.now().isoformat(), datetime.now().isoformat(), vessel_name)
-                )
-                c.execute('''
-                    DELETE FROM ship_tracks 
-                    WHERE id NOT IN (
-                        SELECT id FROM ship_tracks 
-                        WHERE mmsi = ? 
-                        ORDER BY timestamp DESC 
-                        LIMIT 5000
-                    ) AND mmsi = ?
-                ''', (mmsi, mmsi))
-
-                updated_count += 1
-            except Exception as e:
-                print(f"[Status] 更新船舶 {mmsi} 失败: {e}")
+        if not ship_info:
+            continue
+        try:
+            position = _parse_position(ship_info)
+        except (TypeError, ValueError) as e:
+            print(f"[Status] 船舶 {mmsi} 位置数据无效: {e}")
+            continue
+        lat, lng = position[0], position[1]
+        # 如果经纬度为 0，跳过更新位置（避免显示在 0,0 坐标）
+        if abs(lat) < 0.01 and abs(lng) < 0.01:
+            continue
+        fingerprint = _fingerprint(*position)
+        if _unchanged(fingerprints.get(mmsi), fingerprint, _last_written.get(mmsi)):
+            continue
+        # Get vessel name from API or DB
+        vessel_name = ship_info.get("shipname") or ship_info.get("name") or ship_name_db
+        changed.append((mmsi, vessel_name, position, fingerprint))
+
+    print(f"[Status] Fleet API 返回 {len(fleet_data)} 艘船舶，位置有变化或需写入心跳 {len(changed)} 艘")
+    if not changed:
+        conn.close()
+        return 0
+
+    # 预加载地理数据（只加载一次）后批量地理反向编码
+    _ensure_geo_loaded()
+    geo_results = _reverse_geocode([(p[0], p[1]) for _, _, p, _ in changed])
+
+    updated_count = 0
+    deltas = []
+    written = {}
+    for (mmsi, vessel_name, position, fingerprint), geo in zip(changed, geo_results):
+        lat, lng, speed, heading, status_raw, update_time = position
+        country_name, continent, province, city = geo
+        try:
+            # 更新 ships 表
+            # We update status here to ensure frontend sees the latest status from Fleet API
+            c.execute("""
+                UPDATE ship_infos 
+                SET location = ?, 
+                    updated_at = ?,
+                    country = ?,
+                    continent = ?,
+                    province = ?,
+                    city = ?,
+                    speed = ?,
+                    heading = ?,
+                    status = ?
+                WHERE mmsi = ?
+            """, (f"{lat}, {lng}", datetime.now().isoformat(), 
+                  country_name, continent, province, city, speed, heading, status_raw, mmsi))
+            
+            c.execute('''INSERT INTO ship_tracks 
+                (mmsi, lat, lng, speed, heading, status_raw, timestamp, created_at, vessel_name)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                (mmsi, lat, lng, speed, heading, status_raw, update_time or datetime.now().isoformat(), datetime.now().isoformat(), vessel_name)
+            )
+            c.execute('''
+                DELETE FROM ship_tracks 
+                WHERE id NOT IN (
+                    SELECT id FROM ship_tracks 
+                    WHERE mmsi = ? 
+                    ORDER BY timestamp DESC 
+                    LIMIT 5000
+                ) AND mmsi = ?
+            ''', (mmsi, mmsi))
+
+            updated_count += 1
+            written[mmsi] = fingerprint
+            deltas.append({
+                "mmsi": mmsi,
+                "name": vessel_name,
+                "lat": lat,
+                "lng": lng,
+                "speed": speed,
+                "heading": heading,
+                "status": status_raw,
+                "timestamp": update_time,
+                "country": country_name,
+                "province": province,
+                "city": city,
+            })
+        except Exception as e:
+            print(f"[Status] 更新船舶 {mmsi} 失败: {e}")
                 
+    fence_events = []
+    if deltas:
+        # 本轮所有位置共用一个版本号，Dashboard 按版本号拉取增量
+        version = database.bump_data_version("ships", conn=conn)
+        for d in deltas:
+            database.upsert_latest_position(
+                conn, d["mmsi"], d["lat"], d["lng"], d["speed"], d["heading"],
+                d["status"], d["timestamp"] or datetime.now().isoformat(), d["name"], version
+            )
+        # 只对本轮位置有变化的船舶判断进出围栏
+        try:
+            started = time.perf_counter()
+            fence_events = geofence.detect_transitions(conn, deltas)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            print(f"[Status] 围栏判断 {len(deltas)} 艘船舶耗时 {elapsed_ms:.1f} ms，产生 {len(fence_events)} 个进出事件")
+        except Exception as e:
+            print(f"[Status] 围栏判断失败: {e}")
     conn.commit()
     conn.close()
+    # 提交成功后才记录指纹，写库失败的船舶下轮重试
+    fingerprints.update(written)
+    written_at = time.time()
+    _last_written.update((mmsi, written_at) for mmsi in written)
+    if deltas:
+        event_bus.publish("ships", {"version": version, "ships": deltas})
+    if fence_events:
+        event_bus.publish("geofence", {"events": fence_events})
     print(f"[Status] 更新完成，共更新 {updated_count} 艘船舶")
+    return updated_count
 
 
 if __name__ == "__main__":
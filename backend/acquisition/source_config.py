@@ -0,0 +1,97 @@
+"""
+采集源配置 (sources.json)
+
+解析结果缓存在进程内，文件修改时间变化后自动重新加载。
+SourceManager、微信公众号采集与 Dashboard /api/sources 共用同一份配置，
+调用方应把返回的配置视为只读。
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+
+# 两次检查文件修改时间之间的最短间隔 (秒)
+RELOAD_CHECK_INTERVAL = 2.0
+
+
+class SourceCatalog:
+    """一次解析得到的采集源配置"""
+
+    def __init__(self, path: str, sources: List[Dict[str, Any]], mtime: Optional[int]):
+        self.path = path
+        self.sources = sources
+        self.mtime = mtime
+        self.checked_at = time.monotonic()
+        # 供 Dashboard 复用的序列化结果 (reporting.response_cache.CachedBody)
+        self.response_body = None
+
+    def __len__(self):
+        return len(self.sources)
+
+    def by_type(self, source_type: str) -> List[Dict[str, Any]]:
+        """按类型筛选采集源"""
+        return [src for src in self.sources if src.get("type") == source_type]
+
+    def wechat_accounts(self) -> List[Dict[str, str]]:
+        """配置了 fakeid 的微信公众号列表 (按 fakeid 去重)"""
+        accounts = []
+        seen = set()
+        for src in self.by_type("wechat"):
+            fakeid = src.get("fakeid")
+            if not fakeid or fakeid in seen:
+                continue
+            seen.add(fakeid)
+            accounts.append({"name": src.get("name"), "fakeid": fakeid})
+        return accounts
+
+
+_catalogs: Dict[str, SourceCatalog] = {}
+_lock = threading.Lock()
+
+
+def _stat_mtime(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def get_source_catalog(path: Optional[str] = None) -> SourceCatalog:
+    """
+    获取采集源配置，文件未变化时直接返回缓存
+
+    Args:
+        path: sources.json 路径，默认 config.SOURCES_FILE
+
+    Raises:
+        json.JSONDecodeError: 配置文件格式错误
+    """
+    path = os.path.abspath(path or config.SOURCES_FILE)
+    with _lock:
+        cached = _catalogs.get(path)
+        if cached and time.monotonic() - cached.checked_at < RELOAD_CHECK_INTERVAL:
+            return cached
+        mtime = _stat_mtime(path)
+        if cached and cached.mtime == mtime:
+            cached.checked_at = time.monotonic()
+            return cached
+
+        if mtime is None:
+            catalog = SourceCatalog(path, [], None)
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                sources = json.load(f)
+            if not isinstance(sources, list):
+                sources = []
+            catalog = SourceCatalog(path, sources, mtime)
+            if cached:
+                print(f"[Sources] 配置已变化，重新加载: {path} ({len(sources)} 个采集源)")
+        _catalogs[path] = catalog
+        return catalog
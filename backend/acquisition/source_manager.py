@@ -5,11 +5,11 @@
 """
 
 import asyncio
-import json
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 from pathlib import Path
 
+from .source_config import get_source_catalog
 from .sources import SourceRegistry
 from .sources.base import BaseSource, RSSSource, WebSource
 
@@ -42,8 +42,7 @@ class SourceManager:
     def _load_config(self, config_path: str):
         """从配置文件加载采集源"""
         try:
-            with open(config_path, 'r', encoding='utf-8') as f:
-                configs = json.load(f)
+            configs = get_source_catalog(config_path).sources
 
             for config in configs:
                 source_type = config.get('type', 'web')
@@ -228,22 +227,16 @@ class SourceManager:
 
             screenshot_bytes = await page.screenshot(type='jpeg', quality=60, full_page=True)
 
-            # 保存截图
+            # 保存截图 (按内容哈希去重存储)
             import os
-            import hashlib
             import sys
             sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-            import config
+            import asset_store
 
-            base = "".join([c for c in item['link'] if c.isalnum()])[:40]
-            digest = hashlib.md5(item['link'].encode()).hexdigest()[:8]
-            filename = f"{base}_{digest}.jpg"
-
-            local_path = os.path.join(config.ASSETS_DIR, filename)
-            with open(local_path, 'wb') as f:
-                f.write(screenshot_bytes)
-
-            item['screenshot_path'] = f"assets/{filename}"
+            screenshot_path = asset_store.store_screenshot(screenshot_bytes)
+            if not screenshot_path:
+                return
+            item['screenshot_path'] = screenshot_path
             print(f"[RSS截图] 成功 {item.get('title', '')[:50]}...")
 
         except Exception as e:
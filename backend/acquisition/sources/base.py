@@ -109,11 +109,12 @@ class RSSSource(BaseSource):
             headers = {
                 "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
             }
-            response = requests.get(self.feed_url, headers=headers, timeout=20)
+            # 同步请求与解析放到线程中执行，避免阻塞调度器事件循环
+            response = await asyncio.to_thread(requests.get, self.feed_url, headers=headers, timeout=20)
             response.raise_for_status()
 
             # 解析RSS
-            d = feedparser.parse(response.content)
+            d = await asyncio.to_thread(feedparser.parse, response.content)
             items = []
             cutoff = datetime.now() - timedelta(hours=hours)
 
@@ -211,17 +212,16 @@ class WebSource(BaseSource):
 
         # Web源需要Playwright上下文，这里只返回基本结构
         # 详细内容在enrich阶段抓取
-        from playwright.async_api import async_playwright
+        import shared_resources
 
         items = []
         try:
-            async with async_playwright() as p:
-                browser = await self._launch_browser(p)
-                context = await browser.new_context(
-                    viewport={"width": 1280, "height": 800},
-                    user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-                )
-
+            browser = await shared_resources.get_browser()
+            context = await browser.new_context(
+                viewport={"width": 1280, "height": 800},
+                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+            )
+            try:
                 page = await context.new_page()
                 await self._goto_with_retry(page, self.index_url)
 
@@ -236,8 +236,8 @@ class WebSource(BaseSource):
                             'pub_date': '',  # Web源需要在详情页抓取时间
                             'summary_raw': '',  # Web源需要在详情页抓取内容
                         }))
-
-                await browser.close()
+            finally:
+                await context.close()
 
             self.stats['fetched'] = len(items)
             self.stats['success'] = len(items)
@@ -249,15 +249,6 @@ class WebSource(BaseSource):
             self.stats['failed'] += 1
             return []
 
-    async def _launch_browser(self, p):
-        """启动浏览器"""
-        for channel in ["chrome", "msedge", "chromium"]:
-            try:
-                return await p.chromium.launch(channel=channel, headless=True)
-            except:
-                pass
-        return await p.chromium.launch(headless=True)
-
     async def _goto_with_retry(self, page, url: str):
         """带重试的页面导航"""
         from playwright.async_api import TimeoutError as PlaywrightTimeout
@@ -412,23 +403,14 @@ class WebSource(BaseSource):
     async def _take_screenshot(self, page, url: str) -> str:
         """截取网页截图"""
         import os
-        import hashlib
         import sys
         sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-        import config
+        import asset_store
 
         try:
             screenshot_bytes = await page.screenshot(type='jpeg', quality=60, full_page=True)
 
-            # 生成文件名
-            base = "".join([c for c in url if c.isalnum()])[:40]
-            digest = hashlib.md5(url.encode()).hexdigest()[:8]
-            filename = f"{base}_{digest}.jpg"
-
-            local_path = os.path.join(config.ASSETS_DIR, filename)
-            with open(local_path, 'wb') as f:
-                f.write(screenshot_bytes)
-
-            return f"assets/{filename}"
+            # 按内容哈希去重存储
+            return asset_store.store_screenshot(screenshot_bytes)
         except:
             return ''
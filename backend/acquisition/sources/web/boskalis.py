@@ -26,18 +26,17 @@ class BoskalisSource(WebSource):
 
     async def fetch(self, hours: int = 24) -> List[Dict[str, Any]]:
         """获取新闻，增加等待时间让JavaScript渲染"""
-        from playwright.async_api import async_playwright
+        import shared_resources
 
         print(f"[Web:{self.name}] 正在扫描: {self.index_url}")
 
         try:
-            async with async_playwright() as p:
-                browser = await self._launch_browser(p)
-                context = await browser.new_context(
-                    viewport={"width": 1280, "height": 800},
-                    user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-                )
-
+            browser = await shared_resources.get_browser()
+            context = await browser.new_context(
+                viewport={"width": 1280, "height": 800},
+                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+            )
+            try:
                 page = await context.new_page()
                 await self._goto_with_retry(page, self.index_url)
 
@@ -52,24 +51,24 @@ class BoskalisSource(WebSource):
 
                 # 提取链接
                 links = await self._extract_links(page)
-
-                await browser.close()
-
-                # 过滤有效链接
-                items = []
-                for link in links[:self.max_links]:
-                    if self._is_valid_link(link['url'], link['title']):
-                        items.append(self.normalize_item({
-                            'title': link['title'],
-                            'link': link['url'],
-                            'pub_date': '',
-                            'summary_raw': '',
-                        }))
-
-                self.stats['fetched'] = len(items)
-                self.stats['success'] = len(items)
-                print(f"[Web:{self.name}] 成功获取 {len(items)} 条新闻链接")
-                return items
+            finally:
+                await context.close()
+
+            # 过滤有效链接
+            items = []
+            for link in links[:self.max_links]:
+                if self._is_valid_link(link['url'], link['title']):
+                    items.append(self.normalize_item({
+                        'title': link['title'],
+                        'link': link['url'],
+                        'pub_date': '',
+                        'summary_raw': '',
+                    }))
+
+            self.stats['fetched'] = len(items)
+            self.stats['success'] = len(items)
+            print(f"[Web:{self.name}] 成功获取 {len(items)} 条新闻链接")
+            return items
 
         except Exception as e:
             self.log_error(e, "Web抓取失败")
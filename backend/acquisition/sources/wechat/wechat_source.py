@@ -18,6 +18,7 @@ from datetime import datetime
 import requests
 
 from ..base import BaseSource
+from ...source_config import get_source_catalog
 
 
 class WeChatSource(BaseSource):
@@ -98,14 +99,7 @@ class WeChatSource(BaseSource):
 
         wechat_biz_list = []
         try:
-            with open(config_path, 'r', encoding='utf-8') as f:
-                sources = json.load(f)
-                for src in sources:
-                    if src.get("type") == "wechat" and src.get("fakeid"):
-                        wechat_biz_list.append({
-                            "name": src.get("name"),
-                            "fakeid": src.get("fakeid")
-                        })
+            wechat_biz_list = get_source_catalog(config_path).wechat_accounts()
         except Exception as e:
             print(f"[WeChat] 加载配置失败: {e}")
             return []
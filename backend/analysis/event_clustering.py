@@ -0,0 +1,379 @@
+"""
+跨文章事件聚类
+
+同一个项目、同一艘船的动态往往有多篇报道 (不同来源、不同阶段)，日报与推送应按事件汇总。
+每篇保留文章在分析完成后计算一次特征:
+- 文本签名: 中文标题 + 中文摘要 (缺失时用原标题 + 正文开头) 的 3-gram MinHash
+- 实体: 英文专有名词短语、中文书名号/引号内容、以港/航道/项目/工程等结尾的地名项目名，
+  以及船舶库 (ship_infos) 中出现的船名
+
+增量归类: 文章签名按 LSH 分桶 (article_event_lsh)，只与 WINDOW_DAYS 天内同桶的已归类文章比较，
+文本相似度 >= TEXT_THRESHOLD，或相似度 >= ENTITY_TEXT_THRESHOLD 且共享实体 >= MIN_SHARED_ENTITIES 时
+并入对方所在事件，否则新建事件。已归类文章不会被重新聚类，耗时只与新文章数量和窗口内同桶文章数有关。
+"""
+
+import argparse
+import functools
+import json
+import os
+import re
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cpu_pool
+import database
+from analysis import near_duplicate
+from static.keyword_matcher import KeywordMatcher
+
+SHINGLE_SIZE = 3
+BANDS = 32
+BODY_CHARS = 500
+WINDOW_DAYS = 14
+TEXT_THRESHOLD = 0.45
+ENTITY_TEXT_THRESHOLD = 0.2
+MIN_SHARED_ENTITIES = 2
+MIN_VESSEL_NAME_LEN = 4
+MAX_EVENT_ENTITIES = 50
+
+_EN_PHRASE = re.compile(r"\b[A-Z][\w&'\-]*(?:\s+(?:of|de|van|der|la|and|&)?\s*[A-Z][\w&'\-]*)+")
+_EN_LEADING = {"the", "a", "an", "in", "on", "at", "for", "with", "from", "by", "to", "and", "as", "after"}
+_CN_QUOTED = re.compile(r"[《“「]([^》”」]{2,20})[》”」]")
+_CN_PLACE = re.compile(r"[\u4e00-\u9fff]{2,4}(?:港区|港|航道|项目|工程|码头|运河|船闸)")
+_SPACES = re.compile(r"\s+")
+
+
+def _normalize_entity(text: str) -> str:
+    return _SPACES.sub(" ", text).strip().lower()
+
+
+@functools.lru_cache(maxsize=4)
+def _vessel_matcher(vessel_names: Tuple[str, ...]) -> Optional[KeywordMatcher]:
+    return KeywordMatcher(vessel_names) if vessel_names else None
+
+
+def extract_entities(text: str, vessel_names: Tuple[str, ...] = (), exclude: Sequence[str] = ()) -> List[str]:
+    """从文本中提取实体 (小写、去重、排序)"""
+    if not text:
+        return []
+    entities = set()
+    for match in _EN_PHRASE.finditer(text):
+        words = match.group(0).split()
+        while words and words[0].lower() in _EN_LEADING:
+            words = words[1:]
+        if len(words) >= 2:
+            entities.add(_normalize_entity(" ".join(words)))
+    entities.update(_normalize_entity(m.group(1)) for m in _CN_QUOTED.finditer(text))
+    entities.update(m.group(0) for m in _CN_PLACE.finditer(text))
+    matcher = _vessel_matcher(vessel_names)
+    if matcher is not None:
+        entities.update(matcher.find_all(text))
+    entities.difference_update(_normalize_entity(e) for e in exclude if e)
+    return sorted(e for e in entities if e)
+
+
+def event_text(article: Dict) -> str:
+    """用于事件相似度的文本: 优先中文标题 + 摘要，使不同语言的报道可以比较"""
+    title_cn = (article.get("title_cn") or "").strip()
+    summary_cn = (article.get("summary_cn") or "").strip()
+    if title_cn or summary_cn:
+        return f"{title_cn} {summary_cn}".strip()
+    return f"{article.get('title') or ''} {(article.get('content') or '')[:BODY_CHARS]}".strip()
+
+
+def compute_features(articles: Sequence[Dict], vessel_names: Tuple[str, ...] = ()) -> List[Tuple[Optional[bytes], List[str]]]:
+    """[文章] -> [(签名, 实体)] (供进程池分块调用)"""
+    result = []
+    for article in articles:
+        text = event_text(article)
+        sig = near_duplicate.minhash(text, shingle_size=SHINGLE_SIZE)
+        entity_text = " ".join(str(article.get(k) or "") for k in ("title", "title_cn", "summary_cn"))
+        entity_text += " " + (article.get("content") or "")[:BODY_CHARS]
+        entities = extract_entities(entity_text, vessel_names, exclude=[article.get("source_name")])
+        result.append((sig.tobytes() if sig is not None else None, entities))
+    return result
+
+
+def load_vessel_names() -> Tuple[str, ...]:
+    """船舶库中的船名 (过短的船名容易误命中，忽略)"""
+    if not os.path.exists(database.TRACK_DB_PATH):
+        return ()
+    conn = sqlite3.connect(database.TRACK_DB_PATH)
+    try:
+        rows = conn.execute("SELECT DISTINCT name FROM ship_infos WHERE name IS NOT NULL").fetchall()
+    except sqlite3.OperationalError:
+        return ()
+    finally:
+        conn.close()
+    names = {_normalize_entity(str(r[0])) for r in rows}
+    return tuple(sorted(n for n in names if len(n) >= MIN_VESSEL_NAME_LEN))
+
+
+def _candidates(conn, article_id, sig, start, end) -> List[Dict]:
+    ids = set()
+    for band, bucket in near_duplicate.band_buckets(sig, bands=BANDS):
+        ids.update(row[0] for row in conn.execute(
+            "SELECT article_id FROM article_event_lsh WHERE band = ? AND bucket = ?", (band, bucket)
+        ))
+    ids.discard(article_id)
+    if not ids:
+        return []
+    placeholders = ",".join("?" * len(ids))
+    rows = conn.execute(
+        f"""
+        SELECT f.article_id, f.signature, f.entities, a.event_id
+        FROM article_event_features f JOIN articles a ON a.id = f.article_id
+        WHERE f.article_id IN ({placeholders}) AND f.created_at >= ? AND f.created_at <= ?
+          AND a.event_id IS NOT NULL
+        """,
+        list(ids) + [start, end]
+    ).fetchall()
+    return [{"id": r[0], "signature": r[1], "entities": set(json.loads(r[2] or "[]")), "event_id": r[3]} for r in rows]
+
+
+def _best_event(sig, entities, candidates) -> Optional[Tuple[int, float, int]]:
+    """返回 (事件 id, 文本相似度, 共享实体数)，没有足够接近的候选时返回 None"""
+    best = None
+    for cand in candidates:
+        score = near_duplicate.similarity(sig, cand["signature"])
+        shared = len(entities & cand["entities"])
+        if score < TEXT_THRESHOLD and not (score >= ENTITY_TEXT_THRESHOLD and shared >= MIN_SHARED_ENTITIES):
+            continue
+        key = (score + 0.05 * shared, -cand["event_id"])
+        if best is None or key > best[0]:
+            best = (key, cand["event_id"], score, shared)
+    return best[1:] if best else None
+
+
+def _create_event(conn, article, entities) -> int:
+    seen = article.get("created_at") or datetime.now().isoformat()
+    cur = conn.execute(
+        """
+        INSERT INTO event_clusters (title, category, article_count, first_seen, last_seen, entities, updated_at)
+        VALUES (?, ?, 1, ?, ?, ?, ?)
+        """,
+        (article.get("title_cn") or article.get("title"), article.get("category"), seen, seen,
+         json.dumps(entities[:MAX_EVENT_ENTITIES], ensure_ascii=False), datetime.now().isoformat())
+    )
+    return cur.lastrowid
+
+
+def _extend_event(conn, event_id, article, entities):
+    row = conn.execute("SELECT first_seen, last_seen, entities FROM event_clusters WHERE id = ?", (event_id,)).fetchone()
+    if not row:
+        return
+    seen = article.get("created_at") or datetime.now().isoformat()
+    merged = list(json.loads(row[2] or "[]"))
+    merged.extend(e for e in entities if e not in merged)
+    conn.execute(
+        """
+        UPDATE event_clusters
+        SET article_count = article_count + 1, first_seen = ?, last_seen = ?, entities = ?, updated_at = ?
+        WHERE id = ?
+        """,
+        (min(row[0] or seen, seen), max(row[1] or seen, seen),
+         json.dumps(merged[:MAX_EVENT_ENTITIES], ensure_ascii=False), datetime.now().isoformat(), event_id)
+    )
+
+
+def _index_features(conn, article_id, sig, entities, created_at):
+    conn.execute(
+        "INSERT OR REPLACE INTO article_event_features (article_id, signature, entities, created_at) VALUES (?, ?, ?, ?)",
+        (article_id, sig, json.dumps(entities, ensure_ascii=False), created_at)
+    )
+    conn.execute("DELETE FROM article_event_lsh WHERE article_id = ?", (article_id,))
+    conn.executemany(
+        "INSERT OR IGNORE INTO article_event_lsh (band, bucket, article_id) VALUES (?, ?, ?)",
+        [(band, bucket, article_id) for band, bucket in near_duplicate.band_buckets(sig, bands=BANDS)]
+    )
+
+
+def link_events(rows: Sequence[Dict], features: Sequence[Tuple], conn=None) -> Dict[str, int]:
+    """
+    按入库时间顺序把文章归入已有事件或新建事件 (随本函数事务提交)
+
+    Args:
+        rows: [{id, title, title_cn, category, created_at}]
+        features: 与 rows 对应的 (签名, 实体)
+
+    Returns:
+        {"assigned": 并入已有事件数, "created": 新建事件数}
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(database.DB_PATH, timeout=30)
+    stats = {"assigned": 0, "created": 0}
+    try:
+        ordered = sorted(zip(rows, features), key=lambda pair: (pair[0].get("created_at") or "", pair[0]["id"]))
+        for row, (sig, entities) in ordered:
+            created_at = row.get("created_at") or datetime.now().isoformat()
+            match = None
+            if sig:
+                try:
+                    base = datetime.fromisoformat(created_at.replace(" ", "T"))
+                except ValueError:
+                    base = datetime.now()
+                start = (base - timedelta(days=WINDOW_DAYS)).isoformat()
+                end = (base + timedelta(days=WINDOW_DAYS)).isoformat()
+                match = _best_event(sig, set(entities), _candidates(conn, row["id"], sig, start, end))
+            if match:
+                event_id = match[0]
+                _extend_event(conn, event_id, row, entities)
+                stats["assigned"] += 1
+            else:
+                event_id = _create_event(conn, row, entities)
+                stats["created"] += 1
+            conn.execute("UPDATE articles SET event_id = ? WHERE id = ?", (event_id, row["id"]))
+            if sig:
+                _index_features(conn, row["id"], sig, entities, created_at)
+        if ordered:
+            database.bump_data_version("articles", conn=conn)
+        conn.commit()
+        return stats
+    except Exception as e:
+        print(f"[Event] 事件聚类失败: {e}")
+        conn.rollback()
+        return {"assigned": 0, "created": 0}
+    finally:
+        if own_conn:
+            conn.close()
+
+
+EVENT_ARTICLE_COLUMNS = ["id", "title", "title_cn", "summary_cn", "category", "source_name", "created_at"]
+
+
+def _load_unassigned(ids=None, conn=None) -> List[Dict]:
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(database.DB_PATH)
+    try:
+        base = f"""
+            SELECT {", ".join(EVENT_ARTICLE_COLUMNS)} FROM articles
+            WHERE event_id IS NULL AND is_retained = 1 AND duplicate_of IS NULL
+              AND (valid = 1 OR valid IS NULL)
+        """
+        if ids is None:
+            rows = conn.execute(base + " ORDER BY created_at, id").fetchall()
+        else:
+            rows = []
+            ids = list(ids)
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows.extend(conn.execute(base + f" AND id IN ({placeholders})", chunk).fetchall())
+        items = [dict(zip(EVENT_ARTICLE_COLUMNS, row)) for row in rows]
+        return database.attach_article_texts(items, ("content",), conn)
+    finally:
+        if own_conn:
+            conn.close()
+
+
+async def assign_events(ids=None, batch_size=2000) -> Dict[str, int]:
+    """把尚未归类的保留文章归入事件 (特征在进程池中计算)；ids 为空时处理全部未归类文章"""
+    rows = _load_unassigned(ids)
+    stats = {"assigned": 0, "created": 0}
+    if not rows:
+        return stats
+    batch_func = functools.partial(compute_features, vessel_names=load_vessel_names())
+    rows.sort(key=lambda r: (r.get("created_at") or "", r["id"]))
+    for i in range(0, len(rows), batch_size):
+        batch = rows[i:i + batch_size]
+        features = await cpu_pool.map_chunked(batch_func, batch)
+        batch_stats = link_events(batch, features)
+        for key in stats:
+            stats[key] += batch_stats[key]
+    return stats
+
+
+def reset_events(conn=None):
+    """清空事件聚类结果 (重建前调用)"""
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(database.DB_PATH, timeout=30)
+    try:
+        conn.execute("UPDATE articles SET event_id = NULL WHERE event_id IS NOT NULL")
+        conn.execute("DELETE FROM event_clusters")
+        conn.execute("DELETE FROM article_event_features")
+        conn.execute("DELETE FROM article_event_lsh")
+        database.bump_data_version("articles", conn=conn)
+        conn.commit()
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def attach_event_ids(articles: Sequence[Dict], conn=None) -> Sequence[Dict]:
+    """为缺少 event_id 的文章 (如分析流程中的结果) 从数据库补充 event_id"""
+    ids = [a["id"] for a in articles if a.get("id") and a.get("event_id") is None]
+    if not ids:
+        return articles
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(database.DB_PATH)
+    try:
+        mapping = {}
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            mapping.update(conn.execute(
+                f"SELECT id, event_id FROM articles WHERE id IN ({placeholders}) AND event_id IS NOT NULL", chunk
+            ).fetchall())
+    finally:
+        if own_conn:
+            conn.close()
+    for article in articles:
+        if article.get("event_id") is None and article.get("id") in mapping:
+            article["event_id"] = mapping[article["id"]]
+    return articles
+
+
+def group_by_event(articles: Sequence[Dict]) -> List[Dict]:
+    """
+    按 event_id 合并文章，每个事件保留第一篇作为代表 (保持原顺序)
+
+    代表文章增加 event_size (事件内文章数) 与 related (其余报道的 id/标题/链接/来源)；
+    未归类的文章各自成为一个事件。
+    """
+    groups = []
+    by_event = {}
+    for article in articles:
+        event_id = article.get("event_id")
+        if event_id is not None and event_id in by_event:
+            rep = by_event[event_id]
+            rep["event_size"] += 1
+            rep["related"].append({
+                "id": article.get("id"),
+                "title": article.get("title_cn") or article.get("title"),
+                "url": article.get("url"),
+                "source_name": article.get("source_name"),
+            })
+            continue
+        rep = dict(article)
+        rep["event_size"] = 1
+        rep["related"] = []
+        if event_id is not None:
+            by_event[event_id] = rep
+        groups.append(rep)
+    return groups
+
+
+if __name__ == "__main__":
+    import asyncio
+    import time
+
+    parser = argparse.ArgumentParser(description="跨文章事件聚类")
+    parser.add_argument("action", choices=["update", "rebuild"],
+                        help="update: 归类尚未归类的文章; rebuild: 清空后按时间顺序重新聚类全部文章")
+    args = parser.parse_args()
+
+    database.init_db()
+    if args.action == "rebuild":
+        reset_events()
+    started = time.time()
+    result = asyncio.run(assign_events())
+    cpu_pool.shutdown()
+    print(f"[Event] 并入已有事件 {result['assigned']} 篇，新建事件 {result['created']} 个，"
+          f"耗时 {time.time() - started:.1f}s")
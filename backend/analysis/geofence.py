@@ -0,0 +1,294 @@
+"""
+电子围栏
+
+从 config.GEOFENCES_FILE (GeoJSON FeatureCollection) 加载港口、疏浚作业区、项目区域等围栏:
+- Polygon / MultiPolygon 要素按多边形判断 (支持内环)
+- Point 要素需在 properties.radius_m 中给出半径 (米)，按圆形围栏判断
+- properties.id 为围栏标识 (缺省为 name)，properties.type 为围栏类别
+
+船舶位置查询走 ship_positions_rtree 空间索引；围栏本身按 1° 网格建立索引，
+追踪任务每轮只对位置有变化的船舶做进出判断。
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import config
+import database
+from analysis.ships_status import haversine_meters
+
+RELOAD_CHECK_INTERVAL = 2.0
+GRID_SIZE_DEG = 1.0
+METERS_PER_DEG_LAT = 111320.0
+
+
+class Geofence:
+    """单个围栏"""
+
+    __slots__ = ("id", "name", "type", "properties", "polygons", "center", "radius_m", "bbox", "geometry")
+
+    def __init__(self, fence_id, name, fence_type, properties, geometry, polygons=None, center=None, radius_m=None):
+        self.id = fence_id
+        self.name = name
+        self.type = fence_type
+        self.properties = properties
+        self.geometry = geometry
+        self.polygons = polygons or []  # [[外环, 内环...], ...]，环为 [(lng, lat), ...]
+        self.center = center            # (lat, lng)，圆形围栏
+        self.radius_m = radius_m
+        self.bbox = self._compute_bbox()  # (min_lat, min_lng, max_lat, max_lng)
+
+    def _compute_bbox(self):
+        if self.center is not None:
+            lat, lng = self.center
+            dlat = self.radius_m / METERS_PER_DEG_LAT
+            dlng = self.radius_m / (METERS_PER_DEG_LAT * max(math.cos(math.radians(lat)), 1e-6))
+            return (lat - dlat, lng - dlng, lat + dlat, lng + dlng)
+        lats = [pt[1] for polygon in self.polygons for pt in polygon[0]]
+        lngs = [pt[0] for polygon in self.polygons for pt in polygon[0]]
+        return (min(lats), min(lngs), max(lats), max(lngs))
+
+    def contains(self, lat: float, lng: float) -> bool:
+        min_lat, min_lng, max_lat, max_lng = self.bbox
+        if not (min_lat <= lat <= max_lat and min_lng <= lng <= max_lng):
+            return False
+        if self.center is not None:
+            return haversine_meters(lat, lng, self.center[0], self.center[1]) <= self.radius_m
+        for polygon in self.polygons:
+            if _point_in_ring(lng, lat, polygon[0]) and not any(_point_in_ring(lng, lat, hole) for hole in polygon[1:]):
+                return True
+        return False
+
+    def to_dict(self, with_geometry=False) -> Dict:
+        data = {
+            "id": self.id,
+            "name": self.name,
+            "type": self.type,
+            "bbox": list(self.bbox),
+        }
+        if with_geometry:
+            data["geometry"] = self.geometry
+            data["properties"] = self.properties
+        return data
+
+
+def _point_in_ring(x: float, y: float, ring: Sequence[Sequence[float]]) -> bool:
+    """射线法判断点是否在环内"""
+    inside = False
+    n = len(ring)
+    j = n - 1
+    for i in range(n):
+        xi, yi = ring[i][0], ring[i][1]
+        xj, yj = ring[j][0], ring[j][1]
+        if (yi > y) != (yj > y) and x < (xj - xi) * (y - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+
+def _parse_feature(feature: Dict, index: int) -> Optional[Geofence]:
+    geometry = feature.get("geometry") or {}
+    properties = feature.get("properties") or {}
+    name = properties.get("name") or f"fence-{index}"
+    fence_id = str(properties.get("id") or name)
+    fence_type = properties.get("type") or "area"
+    geom_type = geometry.get("type")
+    coords = geometry.get("coordinates")
+    if geom_type == "Polygon" and coords:
+        return Geofence(fence_id, name, fence_type, properties, geometry, polygons=[coords])
+    if geom_type == "MultiPolygon" and coords:
+        return Geofence(fence_id, name, fence_type, properties, geometry, polygons=list(coords))
+    if geom_type == "Point" and coords and properties.get("radius_m"):
+        center = (float(coords[1]), float(coords[0]))
+        return Geofence(fence_id, name, fence_type, properties, geometry, center=center, radius_m=float(properties["radius_m"]))
+    print(f"[Geofence] 忽略不支持的围栏要素: {name} ({geom_type})")
+    return None
+
+
+class GeofenceRegistry:
+    """一次加载得到的全部围栏及其网格索引"""
+
+    def __init__(self, fences: List[Geofence], mtime: Optional[int]):
+        self.fences = fences
+        self.by_id = {f.id: f for f in fences}
+        self.mtime = mtime
+        self.checked_at = time.monotonic()
+        self._grid: Dict[Tuple[int, int], List[Geofence]] = {}
+        for fence in fences:
+            min_lat, min_lng, max_lat, max_lng = fence.bbox
+            for gy in range(_cell(min_lat), _cell(max_lat) + 1):
+                for gx in range(_cell(min_lng), _cell(max_lng) + 1):
+                    self._grid.setdefault((gy, gx), []).append(fence)
+
+    def __len__(self):
+        return len(self.fences)
+
+    def fences_containing(self, lat: float, lng: float) -> List[Geofence]:
+        candidates = self._grid.get((_cell(lat), _cell(lng)), [])
+        return [fence for fence in candidates if fence.contains(lat, lng)]
+
+
+def _cell(value: float) -> int:
+    return int(math.floor(value / GRID_SIZE_DEG))
+
+
+_registry: Optional[GeofenceRegistry] = None
+_lock = threading.Lock()
+
+
+def get_registry(path: Optional[str] = None) -> GeofenceRegistry:
+    """获取围栏注册表，文件修改时间变化后自动重新加载"""
+    global _registry
+    path = path or config.GEOFENCES_FILE
+    with _lock:
+        cached = _registry
+        if cached is not None and time.monotonic() - cached.checked_at < RELOAD_CHECK_INTERVAL:
+            return cached
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if cached is not None and cached.mtime == mtime:
+            cached.checked_at = time.monotonic()
+            return cached
+
+        fences = []
+        if mtime is not None:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                for i, feature in enumerate(data.get("features", [])):
+                    fence = _parse_feature(feature, i)
+                    if fence:
+                        fences.append(fence)
+                print(f"[Geofence] 已加载 {len(fences)} 个围栏: {path}")
+            except Exception as e:
+                print(f"[Geofence] 加载围栏失败: {e}")
+                if cached is not None:
+                    return cached
+        _registry = GeofenceRegistry(fences, mtime)
+        return _registry
+
+
+def _position_dict(row) -> Dict:
+    return dict(zip(database.LATEST_POSITION_COLUMNS, row))
+
+
+def vessels_in_bbox(min_lat, min_lng, max_lat, max_lng, conn=None) -> List[Dict]:
+    """经纬度范围内的船舶最新位置"""
+    return [_position_dict(row) for row in database.query_positions_in_bbox(min_lat, min_lng, max_lat, max_lng, conn=conn)]
+
+
+def vessels_in_fence(fence: Geofence, conn=None) -> List[Dict]:
+    """位于围栏内的船舶最新位置"""
+    return [v for v in vessels_in_bbox(*fence.bbox, conn=conn) if fence.contains(v["lat"], v["lng"])]
+
+
+def vessels_near(lat: float, lng: float, radius_m: float, conn=None) -> List[Dict]:
+    """距离指定点 radius_m 米以内的船舶，按距离升序并附带 distance_m"""
+    dlat = radius_m / METERS_PER_DEG_LAT
+    dlng = radius_m / (METERS_PER_DEG_LAT * max(math.cos(math.radians(lat)), 1e-6))
+    result = []
+    for v in vessels_in_bbox(lat - dlat, lng - dlng, lat + dlat, lng + dlng, conn=conn):
+        distance = haversine_meters(lat, lng, v["lat"], v["lng"])
+        if distance <= radius_m:
+            v["distance_m"] = round(distance, 1)
+            result.append(v)
+    result.sort(key=lambda v: v["distance_m"])
+    return result
+
+
+def detect_transitions(conn, positions: Iterable[Dict]) -> List[Dict]:
+    """
+    判断船舶进出围栏，更新 geofence_states 并写入 geofence_events (随调用方事务提交)
+
+    Args:
+        conn: 轨迹库连接
+        positions: 本轮位置 [{mmsi, lat, lng, timestamp}]
+
+    Returns:
+        本轮产生的进出事件列表
+    """
+    registry = get_registry()
+    if not len(registry):
+        return []
+    states: Dict[str, set] = {}
+    for mmsi, fence_id in conn.execute("SELECT mmsi, fence_id FROM geofence_states"):
+        states.setdefault(mmsi, set()).add(fence_id)
+
+    now = datetime.now().isoformat()
+    events = []
+    for pos in positions:
+        lat, lng = pos.get("lat"), pos.get("lng")
+        if lat is None or lng is None:
+            continue
+        mmsi = str(pos["mmsi"])
+        timestamp = pos.get("timestamp") or now
+        inside = {fence.id for fence in registry.fences_containing(lat, lng)}
+        previous = states.get(mmsi, set())
+        changes = [(fence_id, "enter") for fence_id in sorted(inside - previous)]
+        changes += [(fence_id, "exit") for fence_id in sorted(previous - inside)]
+        for fence_id, kind in changes:
+            if kind == "enter":
+                conn.execute(
+                    "INSERT OR REPLACE INTO geofence_states (mmsi, fence_id, entered_at) VALUES (?, ?, ?)",
+                    (mmsi, fence_id, timestamp)
+                )
+            else:
+                conn.execute("DELETE FROM geofence_states WHERE mmsi = ? AND fence_id = ?", (mmsi, fence_id))
+            fence = registry.by_id.get(fence_id)
+            events.append({
+                "mmsi": mmsi,
+                "fence_id": fence_id,
+                "fence_name": fence.name if fence else fence_id,
+                "event": kind,
+                "lat": lat,
+                "lng": lng,
+                "timestamp": timestamp,
+            })
+
+    if events:
+        conn.executemany(
+            """
+            INSERT INTO geofence_events (mmsi, fence_id, fence_name, event, lat, lng, timestamp, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            [(e["mmsi"], e["fence_id"], e["fence_name"], e["event"], e["lat"], e["lng"], e["timestamp"], now) for e in events]
+        )
+    return events
+
+
+def get_geofence_events(fence_id=None, mmsi=None, limit=100, conn=None) -> List[Dict]:
+    """最近的进出围栏事件"""
+    own_conn = conn is None
+    if own_conn:
+        conn = database.sqlite3.connect(database.TRACK_DB_PATH)
+    try:
+        where = []
+        params = []
+        if fence_id:
+            where.append("fence_id = ?")
+            params.append(fence_id)
+        if mmsi:
+            where.append("mmsi = ?")
+            params.append(str(mmsi))
+        where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+        rows = conn.execute(
+            f"""
+            SELECT id, mmsi, fence_id, fence_name, event, lat, lng, timestamp, created_at
+            FROM geofence_events {where_sql}
+            ORDER BY id DESC
+            LIMIT ?
+            """,
+            params + [limit]
+        ).fetchall()
+        keys = ["id", "mmsi", "fence_id", "fence_name", "event", "lat", "lng", "timestamp", "created_at"]
+        return [dict(zip(keys, row)) for row in rows]
+    finally:
+        if own_conn:
+            conn.close()
@@ -1,31 +1,73 @@
 import asyncio
 import json
 import base64
+import mimetypes
 import os
 import sys
 # Add backend directory to sys.path to allow importing database
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import database
-from openai import AsyncOpenAI
+import event_bus
+import shared_resources
 import config
 from static.constants import (
     DEFAULT_CATEGORY,
     ALLOWED_CATEGORIES,
     normalize_category
 )
+from static.keyword_matcher import KeywordMatcher
+
+RELEVANT_SOURCE_MATCHER = KeywordMatcher(["疏浚", "航道", "港航", "港口", "港务", "航务", "水道", "水运", "海工", "中交", "dredg", "dredging", "waterway", "harbor", "harbour", "port"])
+RELEVANT_URL_MATCHER = KeywordMatcher(["dredg", "dredging", "waterway", "harbor", "harbour", "port", "channel"])
+# 正文相关性: strong 命中任一即相关，secondary 需命中至少两个不同关键词
+RELEVANT_STRONG_MATCHER = KeywordMatcher([
+    "dredg", "dredger", "dredging", "dredged",
+    "疏浚", "清淤", "吹填", "挖泥", "补砂", "海滩补砂", "航道疏浚", "港池疏浚"
+])
+RELEVANT_SECONDARY_MATCHER = KeywordMatcher([
+    "port", "harbor", "harbour", "channel", "waterway", "navigation",
+    "sediment", "reclamation", "coastal", "estuary", "river",
+    "terminal", "berth", "quay", "dock", "maritime", "seabed", "offshore",
+    "航道", "港口", "港航", "码头", "航运", "河道", "运河",
+    "海岸", "海工", "海洋工程", "船坞", "泊位", "航道维护",
+    "疏港", "港池", "填海", "围填海", "河口"
+])
+NAV_LINE_MATCHER = KeywordMatcher([
+    "skip to main content",
+    "about",
+    "what we do",
+    "home",
+    "menu",
+    "search",
+    "privacy policy",
+    "terms of use",
+    "cookie",
+    "contact",
+    "subscribe",
+    "sign in",
+    "register",
+    "login",
+    "language"
+])
+JUNK_TITLE_MATCHER = KeywordMatcher([
+    "skip to", "back to", "return to", "go to",
+    "home", "homepage", "frontpage", "main menu",
+    "previous", "next", "read more", "learn more",
+    "cookie", "accept", "agree", "privacy policy",
+    "terms of", "contact us", "about us",
+    "sitemap", "accessibility", "subscribe",
+    "board of directors", "management team", "executive team",
+    "investor relations", "financial reports",
+    "career", "job", "vacancy", "vacancies",
+    "mailchimp", "email service", "correcting the record",
+    "unsubscribe", "view in browser", "update your preferences"
+])
 
 def is_relevant_news(item, text_content, final_result):
-    source_name = str(item.get("source_name") or "")
-    if source_name:
-        source_lower = source_name.lower()
-        source_keywords = ["疏浚", "航道", "港航", "港口", "港务", "航务", "水道", "水运", "海工", "中交", "dredg", "dredging", "waterway", "harbor", "harbour", "port"]
-        if any(k in source_lower for k in source_keywords):
-            return True
-    url = str(item.get("link") or item.get("url") or "")
-    if url:
-        url_lower = url.lower()
-        if any(k in url_lower for k in ["dredg", "dredging", "waterway", "harbor", "harbour", "port", "channel"]):
-            return True
+    if RELEVANT_SOURCE_MATCHER.contains_any(item.get("source_name")):
+        return True
+    if RELEVANT_URL_MATCHER.contains_any(item.get("link") or item.get("url")):
+        return True
     category = normalize_category(final_result.get("category")) if isinstance(final_result, dict) else None
     if category and category != "Other":
         return True
@@ -38,24 +80,11 @@ def is_relevant_news(item, text_content, final_result):
     ]
     combined = " ".join([str(f) for f in fields if f])
     lower = combined.lower()
-    strong_keywords = [
-        "dredg", "dredger", "dredging", "dredged",
-        "疏浚", "清淤", "吹填", "挖泥", "补砂", "海滩补砂", "航道疏浚", "港池疏浚"
-    ]
-    if any(k in lower for k in strong_keywords):
+    if RELEVANT_STRONG_MATCHER.contains_any(lower, lowered=True):
         return True
-    secondary_keywords = [
-        "port", "harbor", "harbour", "channel", "waterway", "navigation",
-        "sediment", "reclamation", "coastal", "estuary", "river",
-        "terminal", "berth", "quay", "dock", "maritime", "seabed", "offshore",
-        "航道", "港口", "港航", "码头", "航运", "河道", "运河",
-        "海岸", "海工", "海洋工程", "船坞", "泊位", "航道维护",
-        "疏港", "港池", "填海", "围填海", "河口"
-    ]
-    hit_count = sum(1 for k in secondary_keywords if k in lower)
-    return hit_count >= 2
+    return RELEVANT_SECONDARY_MATCHER.count(lower, limit=2, lowered=True) >= 2
 
-async def analyze_with_vl(client, item, b64_img):
+async def analyze_with_vl(client, item, b64_img, mime_type="image/jpeg"):
     """
     使用视觉模型进行首要分析
     """
@@ -106,7 +135,7 @@ URL：{item.get('url', '')}
                 {
                     "role": "user", 
                     "content": [
-                        {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{b64_img}"}},
+                        {"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{b64_img}"}},
                         {"type": "text", "text": vl_prompt}
                     ]
                 }
@@ -239,30 +268,12 @@ def is_security_interstitial(page_title, page_url):
 def clean_article_text(text_content):
     normalized = text_content.replace("\r", "\n")
     lines = [line.strip() for line in normalized.split("\n")]
-    keywords = [
-        "skip to main content",
-        "about",
-        "what we do",
-        "home",
-        "menu",
-        "search",
-        "privacy policy",
-        "terms of use",
-        "cookie",
-        "contact",
-        "subscribe",
-        "sign in",
-        "register",
-        "login",
-        "language"
-    ]
     cleaned = []
     for line in lines:
         if not line:
             continue
-        lower = line.lower()
         short_line = len(line) <= 50 and len(line.split()) <= 6
-        if short_line and any(k in lower for k in keywords):
+        if short_line and NAV_LINE_MATCHER.contains_any(line):
             continue
         cleaned.append(line)
     return "\n".join(cleaned)
@@ -272,26 +283,9 @@ def is_obvious_junk(title):
     if not title:
         return True
     
-    title_lower = title.lower()
-    
     # 垃圾关键词
-    junk_patterns = [
-        "skip to", "back to", "return to", "go to",
-        "home", "homepage", "frontpage", "main menu",
-        "previous", "next", "read more", "learn more",
-        "cookie", "accept", "agree", "privacy policy",
-        "terms of", "contact us", "about us",
-        "sitemap", "accessibility", "subscribe",
-        "board of directors", "management team", "executive team",
-        "investor relations", "financial reports",
-        "career", "job", "vacancy", "vacancies",
-        "mailchimp", "email service", "correcting the record",
-        "unsubscribe", "view in browser", "update your preferences"
-    ]
-    
-    for pattern in junk_patterns:
-        if pattern in title_lower:
-            return True
+    if JUNK_TITLE_MATCHER.contains_any(title):
+        return True
             
     # 极短且无意义的标题
     if len(title.strip()) < 5:
@@ -299,6 +293,10 @@ def is_obvious_junk(title):
         
     return False
 
+def junk_title_flags(titles):
+    """批量标题垃圾预检"""
+    return [is_obvious_junk(title) for title in titles]
+
 def _normalize_llm_result(result, item):
     if isinstance(result, list):
         if len(result) == 1 and isinstance(result[0], dict):
@@ -320,7 +318,26 @@ def _resolve_screenshot_path(screenshot_path, screenshot_filename):
         return f"assets/{screenshot_filename}"
     return ""
 
-def _build_final_result(item, url, text_content, screenshot_path, screenshot_filename, analysis_log, text_res, vl_res):
+def relevance_input(draft):
+    """相关性判断用到的字段 (提交到进程池时不传递截图路径、分析日志等无关数据)"""
+    item = draft["item"]
+    final_result = draft["final_result"]
+    return (
+        {
+            "source_name": item.get("source_name"),
+            "link": item.get("link") or item.get("url"),
+            "title": item.get("title"),
+        },
+        draft["text_content"],
+        {key: final_result.get(key) for key in ("category", "title_cn", "summary_cn", "full_text_cn")},
+    )
+
+def relevance_flags(entries):
+    """批量相关性判断 (可提交到 cpu_pool)，entries 为 relevance_input 的结果"""
+    return [is_relevant_news(item, text_content, final_result) for item, text_content, final_result in entries]
+
+def _merge_model_results(item, url, text_content, screenshot_path, screenshot_filename, analysis_log, text_res, vl_res):
+    """合并 Text / VL 结果，返回 (结果, None)；需要相关性判断时返回 (None, 草稿)"""
     final_result = {}
     
     # 强制检查：如果标题是明显垃圾，直接判定为无效
@@ -344,7 +361,7 @@ def _build_final_result(item, url, text_content, screenshot_path, screenshot_fil
             "source_type": item.get("source_type", "unknown"),
             "source_name": item.get("source_name", ""),
             "id": item.get("id")
-        }
+        }, None
 
     # 优先级策略：Text (文本) 优先，VLM (视觉) 作为补充或兜底
     # 因为文本模型通常在分类和摘要生成上更稳定，且成本更低
@@ -402,15 +419,29 @@ def _build_final_result(item, url, text_content, screenshot_path, screenshot_fil
             "source_type": item.get("source_type", "unknown"),
             "source_name": item.get("source_name", ""),
             "id": item.get("id")
-        }
+        }, None
+
+    return None, {
+        "item": item,
+        "url": url,
+        "text_content": text_content,
+        "screenshot_path": screenshot_path,
+        "screenshot_filename": screenshot_filename,
+        "analysis_log": analysis_log,
+        "final_result": final_result,
+    }
 
-    # 最终字段整理
+def finalize_draft(draft, relevant):
+    """根据相关性判断结果整理最终字段"""
+    item = draft["item"]
+    final_result = draft["final_result"]
+    analysis_log = draft["analysis_log"]
     article_category = normalize_category(final_result.get("category"))
     if not article_category:
         article_category = DEFAULT_CATEGORY
 
     is_valid = 1
-    if not is_relevant_news(item, text_content, final_result):
+    if not relevant:
         analysis_log.append("4.2. **相关性判断**: 非疏浚主题，标记为无效并归入'其他'")
         article_category = "Other"
         is_valid = 0
@@ -432,17 +463,17 @@ def _build_final_result(item, url, text_content, screenshot_path, screenshot_fil
     return {
         "title": item.get('title', ''),
         "title_cn": final_result.get("title_cn", item.get('title', '')),
-        "url": url,
+        "url": draft["url"],
         "pub_date": pub_date,
         "summary_cn": final_result.get("summary_cn", "暂无摘要"),
         "full_text_cn": final_result.get("full_text_cn", ""),
-        "content": text_content,
+        "content": draft["text_content"],
         "category": article_category,
         "valid": is_valid,
         "is_retained": is_retained,
         "remark": remark,
         "image_desc": final_result.get("image_desc", ""),
-        "screenshot_path": _resolve_screenshot_path(screenshot_path, screenshot_filename),
+        "screenshot_path": _resolve_screenshot_path(draft["screenshot_path"], draft["screenshot_filename"]),
         "analysis_log": analysis_log,
         "source_type": item.get("source_type", "unknown"),
         "source_name": item.get("source_name", ""),
@@ -450,7 +481,14 @@ def _build_final_result(item, url, text_content, screenshot_path, screenshot_fil
     }
 
 
-async def analyze_item_from_db(client, item):
+async def analyze_item_from_db(client, item, junk_title=False):
+    result, draft = await collect_item_analysis(client, item, junk_title)
+    if result is not None:
+        return result
+    return finalize_draft(draft, is_relevant_news(item, draft["text_content"], draft["final_result"]))
+
+async def collect_item_analysis(client, item, junk_title=False):
+    """调用模型并合并结果，返回 (结果, None)；需要相关性判断时返回 (None, 草稿)，由调用方按批判断后 finalize_draft"""
     url = item.get("url") or item.get("link") or ""
     analysis_log = []
     if url:
@@ -458,6 +496,9 @@ async def analyze_item_from_db(client, item):
     text_content = item.get("content") or ""
     screenshot_path = item.get("screenshot_path") or ""
     screenshot_filename = os.path.basename(screenshot_path) if screenshot_path else ""
+    if junk_title:
+        # 标题已判定为垃圾时结果与模型输出无关，不再调用模型
+        return _merge_model_results(item, url, text_content, screenshot_path, screenshot_filename, analysis_log, None, None)
     screenshot_bytes = None
     if screenshot_path:
         img_path = screenshot_path
@@ -485,15 +526,16 @@ async def analyze_item_from_db(client, item):
             analysis_log.append("4. **VL分析**: 失败 (API Key 未配置)")
             print("[VL] Error: VL_LLM_API_KEY is not set in config.")
         else:
-            vl_client = AsyncOpenAI(api_key=config.VL_LLM_API_KEY, base_url=config.VL_LLM_API_BASE)
+            vl_client = shared_resources.get_vl_client()
             b64_img = base64.b64encode(screenshot_bytes).decode('utf-8')
-            vl_res = await analyze_with_vl(vl_client, item, b64_img)
+            mime_type = mimetypes.guess_type(screenshot_filename)[0] or "image/jpeg"
+            vl_res = await analyze_with_vl(vl_client, item, b64_img, mime_type)
             if isinstance(vl_res, Exception):
                 print(f"[VL] Error: {vl_res}")
                 vl_res = None
             vl_res = _normalize_llm_result(vl_res, item)
 
-    return _build_final_result(item, url, text_content, screenshot_path, screenshot_filename, analysis_log, text_res, vl_res)
+    return _merge_model_results(item, url, text_content, screenshot_path, screenshot_filename, analysis_log, text_res, vl_res)
 
 async def process_items_from_db(items):
     if not items:
@@ -503,18 +545,29 @@ async def process_items_from_db(items):
         print("[Text] Error: TEXT_LLM_API_KEY is not set in config.")
         return []
         
-    client = AsyncOpenAI(api_key=config.TEXT_LLM_API_KEY, base_url=config.TEXT_LLM_API_BASE)
+    client = shared_resources.get_text_client()
     results = []
     sem = asyncio.Semaphore(3)
+    junk_flags = junk_title_flags([item.get("title") for item in items])
 
-    async def runner(item):
+    async def runner(item, junk_title):
         async with sem:
-            res = await analyze_item_from_db(client, item)
+            res = await analyze_item_from_db(client, item, junk_title)
             if res:
-                # 分析完成后立即保存回数据库
-                database.save_article(res)
+                # 分析完成后立即保存回数据库，并通知 Dashboard
+                if await asyncio.to_thread(database.save_article, res):
+                    event_bus.publish("article", {
+                        "url": res.get("url"),
+                        "title": res.get("title"),
+                        "title_cn": res.get("title_cn"),
+                        "category": res.get("category"),
+                        "source_name": res.get("source_name"),
+                        "pub_date": res.get("pub_date"),
+                        "valid": res.get("valid"),
+                        "is_retained": res.get("is_retained"),
+                    })
                 results.append(res)
 
-    tasks = [runner(item) for item in items]
+    tasks = [runner(item, junk_title) for item, junk_title in zip(items, junk_flags)]
     await asyncio.gather(*tasks)
     return results
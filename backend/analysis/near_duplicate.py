@@ -0,0 +1,364 @@
+"""
+近似重复文章检测
+
+同一条疏浚新闻常同时出现在承包商官网、Dredging Today、DredgeWire 与公众号，URL 各不相同。
+对标题与正文开头计算 MinHash 签名，按 LSH 分桶 (article_lsh) 查找候选，只与同桶文章比较:
+- 双方都有正文时，正文签名相似度 >= BODY_THRESHOLD 判为重复
+- 否则标题签名相似度 >= TITLE_THRESHOLD 判为重复
+- 只与 WINDOW_DAYS 天内入库的文章比较
+
+重复文章写入 duplicate_of 指向最早的原始文章 (链上只有一层)，并标记为无效，
+不再补充采集、也不再调用模型分析。采集流程在补充采集前、模型分析前各检查一次
+(补充采集后正文才完整)。
+
+只有有效且未被分析否决 (已保留或尚未分析) 的文章可以作为原始文章；原始文章
+分析后未保留时，release_duplicates 解除其重复文章的标记，交给下一轮重新分析。
+较早的文章晚于较新的文章参与检测时 (如上一轮遗留的待分析文章)，改为把较新的
+原始文章标记为较早文章的重复，保证 duplicate_of 始终指向 id 最小的文章。
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cpu_pool
+import database
+
+NUM_PERM = 64
+BANDS = 16
+SHINGLE_SIZE = 5
+BODY_CHARS = 1000
+MIN_BODY_CHARS = 200
+BODY_THRESHOLD = 0.6
+TITLE_THRESHOLD = 0.85
+WINDOW_DAYS = 30
+
+# multiply-shift 哈希族: h(x) = ((a * x + b) mod 2^64) >> 32，a 为奇数
+_rng = np.random.RandomState(20240601)
+_PERM_A = _rng.randint(0, 2 ** 63, size=NUM_PERM, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_PERM_B = _rng.randint(0, 2 ** 63, size=NUM_PERM, dtype=np.uint64)
+_SHIFT = np.uint64(32)
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def _shingles(text: str, size: int = SHINGLE_SIZE) -> set:
+    normalized = _NON_WORD.sub(" ", str(text or "").lower()).strip()
+    if not normalized:
+        return set()
+    if len(normalized) <= size:
+        return {normalized}
+    return {normalized[i:i + size] for i in range(len(normalized) - size + 1)}
+
+
+def minhash(text: str, shingle_size: int = SHINGLE_SIZE) -> Optional[np.ndarray]:
+    """字符 n-gram (默认 5-gram) 的 MinHash 签名 (uint32 x NUM_PERM)，文本为空时返回 None"""
+    shingles = _shingles(text, shingle_size)
+    if not shingles:
+        return None
+    x = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+    with np.errstate(over="ignore"):
+        hashed = (np.outer(x, _PERM_A) + _PERM_B) >> _SHIFT
+    return hashed.min(axis=0).astype(np.uint32)
+
+
+def compute_signatures(pairs: Sequence[Tuple[str, str]]) -> List[Tuple[Optional[bytes], Optional[bytes]]]:
+    """[(标题, 正文)] -> [(标题签名, 正文签名)]，正文不足 MIN_BODY_CHARS 时正文签名为空 (供进程池分块调用)"""
+    result = []
+    for title, body in pairs:
+        title_sig = minhash(title)
+        body = (body or "").strip()
+        body_sig = minhash(body[:BODY_CHARS]) if len(body) >= MIN_BODY_CHARS else None
+        result.append((
+            title_sig.tobytes() if title_sig is not None else None,
+            body_sig.tobytes() if body_sig is not None else None,
+        ))
+    return result
+
+
+def similarity(sig_a: Optional[bytes], sig_b: Optional[bytes]) -> float:
+    """两个签名的 Jaccard 相似度估计"""
+    if not sig_a or not sig_b:
+        return 0.0
+    a = np.frombuffer(sig_a, dtype=np.uint32)
+    b = np.frombuffer(sig_b, dtype=np.uint32)
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+
+def band_buckets(sig: bytes, bands: int = BANDS) -> List[Tuple[int, int]]:
+    """签名按 bands 段切分后各段的桶号 (LSH)"""
+    width = NUM_PERM // bands * 4
+    buckets = []
+    for band in range(bands):
+        digest = hashlib.blake2b(sig[band * width:(band + 1) * width], digest_size=8).digest()
+        buckets.append((band, int.from_bytes(digest, "little", signed=True)))
+    return buckets
+
+
+# 原始文章 (r) 可作为规范文章: 有效，且已保留或尚未分析 (summary_cn 为空)
+_ROOT_ELIGIBLE_SQL = (
+    "(COALESCE(r.valid, 1) = 1 AND (r.is_retained = 1 OR COALESCE(r.summary_cn, '') = ''))"
+)
+
+
+def _candidates(conn, article_id, title_sig, body_sig, since) -> List[Dict]:
+    ids = set()
+    for kind, sig in (("title", title_sig), ("body", body_sig)):
+        if not sig:
+            continue
+        for band, bucket in band_buckets(sig):
+            ids.update(row[0] for row in conn.execute(
+                "SELECT article_id FROM article_lsh WHERE kind = ? AND band = ? AND bucket = ?",
+                (kind, band, bucket)
+            ))
+    ids.discard(article_id)
+    if not ids:
+        return []
+    placeholders = ",".join("?" * len(ids))
+    rows = conn.execute(
+        f"""
+        SELECT s.article_id, s.title_sig, s.body_sig, a.duplicate_of, {_ROOT_ELIGIBLE_SQL}, r.url
+        FROM article_signatures s
+        JOIN articles a ON a.id = s.article_id
+        JOIN articles r ON r.id = COALESCE(a.duplicate_of, a.id)
+        WHERE s.article_id IN ({placeholders}) AND s.created_at >= ?
+        """,
+        list(ids) + [since]
+    ).fetchall()
+    return [{"id": r[0], "title_sig": r[1], "body_sig": r[2], "duplicate_of": r[3], "eligible": bool(r[4]),
+             "root_url": r[5]} for r in rows]
+
+
+def _match_score(title_sig, body_sig, cand) -> Optional[float]:
+    """与候选的相似度，未达到阈值时返回 None"""
+    if body_sig and cand["body_sig"]:
+        score = similarity(body_sig, cand["body_sig"])
+        return score if score >= BODY_THRESHOLD else None
+    score = similarity(title_sig, cand["title_sig"])
+    return score if score >= TITLE_THRESHOLD else None
+
+
+def _best_match(article_id, title_sig, body_sig, candidates) -> Optional[Tuple[int, float]]:
+    """返回 (较早的原始文章 id, 相似度)，没有足够相似的候选时返回 None"""
+    best = None
+    for cand in candidates:
+        root = cand["duplicate_of"] or cand["id"]
+        if not cand.get("eligible", True) or root >= article_id:
+            continue
+        score = _match_score(title_sig, body_sig, cand)
+        if score is None:
+            continue
+        if best is None or score > best[1] or (score == best[1] and root < best[0]):
+            best = (root, score)
+    return best
+
+
+def _newer_roots(article_id, title_sig, body_sig, candidates) -> Dict[int, Tuple[str, float]]:
+    """与本文相似、但 id 更大的原始文章 {id: (url, 相似度)}，这些文章应改为本文的重复"""
+    roots = {}
+    for cand in candidates:
+        root = cand["duplicate_of"] or cand["id"]
+        if not cand.get("eligible", True) or root <= article_id:
+            continue
+        score = _match_score(title_sig, body_sig, cand)
+        if score is not None and score > roots.get(root, (None, -1.0))[1]:
+            roots[root] = (cand["root_url"], score)
+    return roots
+
+
+def _is_root_eligible(conn, article_id) -> bool:
+    row = conn.execute(f"SELECT {_ROOT_ELIGIBLE_SQL} FROM articles r WHERE r.id = ?", (article_id,)).fetchone()
+    return bool(row and row[0])
+
+
+def _mark_duplicate(conn, article_id, canonical_id):
+    conn.execute(
+        "UPDATE articles SET duplicate_of = ?, valid = 0, is_retained = 0, remark = ? WHERE id = ?",
+        (canonical_id, f"近似重复(#{canonical_id})", article_id)
+    )
+    # 原先指向本文的重复文章改为指向新的原始文章，保持链上只有一层
+    conn.execute("UPDATE articles SET duplicate_of = ? WHERE duplicate_of = ?", (canonical_id, article_id))
+
+
+def _index_signature(conn, article_id, title_sig, body_sig, created_at):
+    conn.execute(
+        "INSERT OR REPLACE INTO article_signatures (article_id, title_sig, body_sig, created_at) VALUES (?, ?, ?, ?)",
+        (article_id, title_sig, body_sig, created_at)
+    )
+    conn.execute("DELETE FROM article_lsh WHERE article_id = ?", (article_id,))
+    rows = []
+    for kind, sig in (("title", title_sig), ("body", body_sig)):
+        if sig:
+            rows.extend((kind, band, bucket, article_id) for band, bucket in band_buckets(sig))
+    conn.executemany("INSERT OR IGNORE INTO article_lsh (kind, band, bucket, article_id) VALUES (?, ?, ?, ?)", rows)
+
+
+def link_duplicates(rows: Sequence[Dict], signatures: Sequence[Tuple], conn=None, mark=True) -> List[Dict]:
+    """
+    为文章建立签名索引，并把与已有文章近似重复的标记为重复 (随本函数事务提交)
+
+    Args:
+        rows: [{id, url, created_at}]，按 id 升序处理，同一批内先入库的作为原始文章
+        signatures: 与 rows 对应的 (标题签名, 正文签名)
+        mark: False 时只建索引不标记 (历史回填)
+
+    Returns:
+        [{id, url, canonical_id, similarity}]
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(database.DB_PATH, timeout=30)
+    duplicates = []
+    try:
+        since = (datetime.now() - timedelta(days=WINDOW_DAYS)).isoformat()
+        demoted = set()
+        for row, (title_sig, body_sig) in sorted(zip(rows, signatures), key=lambda pair: pair[0]["id"]):
+            article_id = row["id"]
+            if (not title_sig and not body_sig) or article_id in demoted:
+                continue
+            match = None
+            newer = {}
+            if mark:
+                candidates = _candidates(conn, article_id, title_sig, body_sig, since)
+                match = _best_match(article_id, title_sig, body_sig, candidates)
+                if not match and _is_root_eligible(conn, article_id):
+                    newer = _newer_roots(article_id, title_sig, body_sig, candidates)
+            _index_signature(conn, article_id, title_sig, body_sig, row.get("created_at") or datetime.now().isoformat())
+            if match:
+                canonical_id, score = match
+                _mark_duplicate(conn, article_id, canonical_id)
+                duplicates.append({"id": article_id, "url": row.get("url"), "canonical_id": canonical_id,
+                                   "similarity": round(score, 3)})
+            # 本文比已检测过的相似文章更早: 本文作为原始文章，较新的改为重复
+            for root_id, (root_url, score) in sorted(newer.items()):
+                _mark_duplicate(conn, root_id, article_id)
+                demoted.add(root_id)
+                duplicates.append({"id": root_id, "url": root_url, "canonical_id": article_id,
+                                   "similarity": round(score, 3)})
+        if duplicates:
+            database.bump_data_version("articles", conn=conn)
+        conn.commit()
+        return duplicates
+    except Exception as e:
+        print(f"[Dedup] 近似重复检测失败: {e}")
+        conn.rollback()
+        return []
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def _load_articles(ids, conn=None) -> List[Dict]:
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(database.DB_PATH)
+    try:
+        rows = []
+        ids = list(ids)
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows.extend(conn.execute(
+                f"SELECT id, url, title, created_at FROM articles WHERE id IN ({placeholders}) AND duplicate_of IS NULL",
+                chunk
+            ).fetchall())
+        items = [dict(zip(["id", "url", "title", "created_at"], row)) for row in rows]
+        return database.attach_article_texts(items, ("content",), conn)
+    finally:
+        if own_conn:
+            conn.close()
+
+
+async def dedupe_articles(ids, mark=True) -> List[Dict]:
+    """对指定文章做近似重复检测 (签名在进程池中计算)，返回新标记的重复文章"""
+    rows = await asyncio.to_thread(_load_articles, ids)
+    if not rows:
+        return []
+    signatures = await cpu_pool.map_chunked(compute_signatures, [(r["title"], r["content"]) for r in rows])
+    # 候选查询与标记写库在线程中执行，不阻塞事件循环
+    return await asyncio.to_thread(link_duplicates, rows, signatures, None, mark)
+
+
+def release_duplicates(canonical_ids, conn=None) -> List[int]:
+    """原始文章分析后未保留时，解除其重复文章的标记 (恢复为有效、待分析)，返回被解除的文章 id"""
+    canonical_ids = [i for i in canonical_ids if i]
+    if not canonical_ids:
+        return []
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(database.DB_PATH, timeout=30)
+    try:
+        released = []
+        for i in range(0, len(canonical_ids), 500):
+            chunk = canonical_ids[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            released.extend(row[0] for row in conn.execute(
+                f"""
+                SELECT d.id FROM articles d JOIN articles r ON r.id = d.duplicate_of
+                WHERE d.duplicate_of IN ({placeholders}) AND NOT {_ROOT_ELIGIBLE_SQL}
+                """,
+                chunk
+            ))
+        if released:
+            conn.executemany(
+                "UPDATE articles SET duplicate_of = NULL, valid = 1, summary_cn = NULL, remark = NULL WHERE id = ?",
+                [(article_id,) for article_id in released]
+            )
+            database.bump_data_version("articles", conn=conn)
+        conn.commit()
+        return released
+    except Exception as e:
+        print(f"[Dedup] 解除重复标记失败: {e}")
+        conn.rollback()
+        return []
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def get_duplicates(canonical_id, conn=None) -> List[Dict]:
+    """指向某篇原始文章的全部重复文章"""
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(database.DB_PATH)
+    try:
+        rows = conn.execute(
+            "SELECT id, url, title, source_name, pub_date FROM articles WHERE duplicate_of = ? ORDER BY id",
+            (canonical_id,)
+        ).fetchall()
+        return [dict(zip(["id", "url", "title", "source_name", "pub_date"], row)) for row in rows]
+    finally:
+        if own_conn:
+            conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="近似重复文章检测")
+    parser.add_argument("action", choices=["backfill", "check"],
+                        help="backfill: 为历史文章建立签名索引 (不标记); check: 检测并标记近期文章")
+    parser.add_argument("--days", type=int, default=WINDOW_DAYS, help="处理最近多少天入库的文章")
+    args = parser.parse_args()
+
+    database.init_db()
+    conn = sqlite3.connect(database.DB_PATH)
+    try:
+        since = (datetime.now() - timedelta(days=args.days)).isoformat()
+        target_ids = [r[0] for r in conn.execute(
+            "SELECT id FROM articles WHERE created_at >= ? AND duplicate_of IS NULL ORDER BY id", (since,)
+        )]
+    finally:
+        conn.close()
+    found = asyncio.run(dedupe_articles(target_ids, mark=args.action == "check"))
+    print(f"[Dedup] 处理 {len(target_ids)} 篇，标记重复 {len(found)} 篇")
+    for d in found:
+        print(f"  #{d['id']} -> #{d['canonical_id']} ({d['similarity']})  {d['url']}")
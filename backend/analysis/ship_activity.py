@@ -0,0 +1,407 @@
+"""
+船舶作业分段
+
+把轨迹切分为航行 (voyage)、疏浚作业 (dredging)、停泊 (idle) 三类连续时段，
+记录起止时间、时长、航行距离、作业扫测面积等，写入 ship_activity_segments 供船队利用率报表使用。
+
+- 相邻两点间的速度按 classify_status 的阈值分类，同类区间合并为一段
+- 两点间隔超过 GAP_HOURS 视为离线，分段在此断开
+- 短于 MIN_SEGMENT_MINUTES 的分段并入前一段 (抑制 GPS 抖动与短暂变速)
+- 每船最后一段标记为未结束 (is_open)，增量更新时从该段起点重新计算
+"""
+
+import argparse
+import math
+import os
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import track_archive
+from analysis.ships_status import KNOTS_TO_MS, classify_status, haversine_meters, parse_timestamp
+
+GAP_HOURS = 2
+MIN_SEGMENT_MINUTES = 20
+# 首次增量计算时回看的天数 (与热表保留天数一致)，更早的历史用 rebuild 批量计算
+INITIAL_LOOKBACK_DAYS = track_archive.TRACK_HOT_DAYS
+# 计算扫测面积的网格边长 (米)
+COVERAGE_CELL_M = 100.0
+MAX_SPEED_MS = 15.0
+
+ACTIVITY_BY_STATUS = {"moored": "idle", "dredging": "dredging", "underway": "voyage"}
+ACTIVITIES = ("voyage", "dredging", "idle")
+
+SEGMENT_COLUMNS = [
+    "mmsi", "activity", "start_time", "end_time", "duration_s", "distance_m", "area_km2", "avg_speed_kn",
+    "point_count", "start_lat", "start_lng", "end_lat", "end_lng", "min_lat", "min_lng", "max_lat", "max_lng",
+    "is_open", "updated_at",
+]
+
+
+def _to_naive(value) -> Optional[datetime]:
+    dt = value if isinstance(value, datetime) else parse_timestamp(value)
+    if dt is None:
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone().replace(tzinfo=None)
+    return dt
+
+
+def _prepare_points(tracks: Sequence[Dict]) -> List[tuple]:
+    """轨迹点转为按时间排序、去重的 (时间, 纬度, 经度, 航速节)"""
+    points = {}
+    for item in tracks:
+        ts = _to_naive(item.get("timestamp"))
+        lat, lng = item.get("lat"), item.get("lng")
+        if ts is None or lat is None or lng is None:
+            continue
+        points[ts] = (ts, float(lat), float(lng), item.get("speed"))
+    return [points[ts] for ts in sorted(points)]
+
+
+def _interval_activity(p1, p2) -> str:
+    dt = (p2[0] - p1[0]).total_seconds()
+    speed_ms = haversine_meters(p1[1], p1[2], p2[1], p2[2]) / dt
+    if speed_ms > MAX_SPEED_MS:
+        # 位置跳变，退回使用上报航速
+        reported = p2[3] if p2[3] is not None else p1[3]
+        speed_ms = float(reported) * KNOTS_TO_MS if reported is not None else None
+    return ACTIVITY_BY_STATUS.get(classify_status(speed_ms), "idle")
+
+
+def _coverage_km2(points: Sequence[tuple]) -> float:
+    """按 COVERAGE_CELL_M 网格统计轨迹经过的格子数估算扫测面积"""
+    if not points:
+        return 0.0
+    lat0 = math.radians(sum(p[1] for p in points) / len(points))
+    ky = 111320.0 / COVERAGE_CELL_M
+    kx = 111320.0 * math.cos(lat0) / COVERAGE_CELL_M
+    cells = set()
+    prev = None
+    for _, lat, lng, _ in points:
+        x, y = lng * kx, lat * ky
+        if prev is None:
+            cells.add((int(math.floor(x)), int(math.floor(y))))
+        else:
+            # 相邻点之间按格子边长插值，避免稀疏采样低估面积
+            steps = max(1, int(math.ceil(math.hypot(x - prev[0], y - prev[1]))))
+            for k in range(1, steps + 1):
+                t = k / steps
+                cells.add((int(math.floor(prev[0] + (x - prev[0]) * t)), int(math.floor(prev[1] + (y - prev[1]) * t))))
+        prev = (x, y)
+    return len(cells) * (COVERAGE_CELL_M / 1000.0) ** 2
+
+
+def _merge_runs(runs: List[list]) -> List[list]:
+    merged = []
+    for run in runs:
+        if merged and merged[-1][0] == run[0] and merged[-1][2] == run[1]:
+            merged[-1][2] = run[2]
+        else:
+            merged.append(list(run))
+    return merged
+
+
+def segment_track(tracks: Sequence[Dict]) -> List[Dict]:
+    """
+    将单船轨迹切分为作业分段
+
+    Args:
+        tracks: 轨迹点 (含 lat / lng / speed / timestamp)，顺序不限
+
+    Returns:
+        分段列表 (时间升序)，字段见 SEGMENT_COLUMNS (不含 mmsi / is_open / updated_at)
+    """
+    points = _prepare_points(tracks)
+    if len(points) < 2:
+        return []
+
+    gap = timedelta(hours=GAP_HOURS)
+    min_seconds = MIN_SEGMENT_MINUTES * 60
+    # runs: [activity, 起点下标, 终点下标]；离线间隔两侧属于不同的连续轨迹
+    tracks_runs = [[]]
+    for i in range(1, len(points)):
+        if points[i][0] - points[i - 1][0] > gap:
+            tracks_runs.append([])
+            continue
+        tracks_runs[-1].append([_interval_activity(points[i - 1], points[i]), i - 1, i])
+
+    segments = []
+    for runs in tracks_runs:
+        runs = _merge_runs(runs)
+        if len(runs) > 1:
+            for k, run in enumerate(runs):
+                duration = (points[run[2]][0] - points[run[1]][0]).total_seconds()
+                if duration < min_seconds:
+                    run[0] = runs[k - 1][0] if k > 0 else runs[k + 1][0]
+            runs = _merge_runs(runs)
+        for activity, start, end in runs:
+            segments.append(_segment_stats(activity, points[start:end + 1]))
+    return segments
+
+
+def _segment_stats(activity: str, points: Sequence[tuple]) -> Dict:
+    distance = sum(
+        haversine_meters(points[i - 1][1], points[i - 1][2], points[i][1], points[i][2])
+        for i in range(1, len(points))
+    )
+    duration = (points[-1][0] - points[0][0]).total_seconds()
+    lats = [p[1] for p in points]
+    lngs = [p[2] for p in points]
+    return {
+        "activity": activity,
+        "start_time": points[0][0].isoformat(),
+        "end_time": points[-1][0].isoformat(),
+        "duration_s": duration,
+        "distance_m": round(distance, 1),
+        "area_km2": round(_coverage_km2(points), 4) if activity == "dredging" else 0.0,
+        "avg_speed_kn": round(distance / duration / KNOTS_TO_MS, 2) if duration > 0 else 0.0,
+        "point_count": len(points),
+        "start_lat": points[0][1],
+        "start_lng": points[0][2],
+        "end_lat": points[-1][1],
+        "end_lng": points[-1][2],
+        "min_lat": min(lats),
+        "min_lng": min(lngs),
+        "max_lat": max(lats),
+        "max_lng": max(lngs),
+    }
+
+
+def _save_segments(conn, mmsi: str, segments: List[Dict], mark_open: bool) -> None:
+    now = datetime.now().isoformat()
+    rows = []
+    for i, seg in enumerate(segments):
+        row = dict(seg, mmsi=mmsi, is_open=1 if mark_open and i == len(segments) - 1 else 0, updated_at=now)
+        rows.append(tuple(row[col] for col in SEGMENT_COLUMNS))
+    conn.executemany(
+        f"INSERT OR REPLACE INTO ship_activity_segments ({', '.join(SEGMENT_COLUMNS)}) "
+        f"VALUES ({', '.join('?' * len(SEGMENT_COLUMNS))})",
+        rows
+    )
+
+
+def _load_hot_tracks(conn, mmsi: str, since: datetime) -> List[Dict]:
+    # 热表时间格式不统一 (T / 空格分隔)，先按日期粗筛再精确过滤
+    rows = conn.execute(
+        "SELECT lat, lng, speed, timestamp FROM ship_tracks WHERE mmsi = ? AND timestamp >= ?",
+        (mmsi, since.date().isoformat())
+    ).fetchall()
+    tracks = []
+    for lat, lng, speed, timestamp in rows:
+        ts = _to_naive(timestamp)
+        if ts is not None and ts >= since:
+            tracks.append({"lat": lat, "lng": lng, "speed": speed, "timestamp": ts})
+    return tracks
+
+
+def update_activity_segments(conn=None) -> int:
+    """
+    增量更新作业分段: 只处理最新位置晚于其未结束分段的船舶，从该分段起点重新切分
+
+    Returns:
+        本轮重新计算的船舶数
+    """
+    own_conn = conn is None
+    if own_conn:
+        database.init_track_db()
+        conn = sqlite3.connect(database.TRACK_DB_PATH, timeout=30)
+    try:
+        latest = {
+            str(mmsi): _to_naive(ts)
+            for mmsi, ts in conn.execute("SELECT mmsi, timestamp FROM ship_latest_positions")
+        }
+        resume_points = {}
+        for mmsi, start_time, end_time, is_open in conn.execute(
+            """
+            SELECT s.mmsi, s.start_time, s.end_time, s.is_open
+            FROM ship_activity_segments s
+            JOIN (SELECT mmsi, MAX(start_time) AS start_time FROM ship_activity_segments GROUP BY mmsi) last
+              ON s.mmsi = last.mmsi AND s.start_time = last.start_time
+            """
+        ):
+            resume_points[mmsi] = (_to_naive(start_time if is_open else end_time), _to_naive(end_time))
+
+        default_since = datetime.now() - timedelta(days=INITIAL_LOOKBACK_DAYS)
+        processed = 0
+        for mmsi, latest_ts in latest.items():
+            since, last_end = resume_points.get(mmsi, (default_since, None))
+            if latest_ts is None or (last_end is not None and latest_ts <= last_end):
+                continue
+            segments = segment_track(_load_hot_tracks(conn, mmsi, since))
+            if not segments:
+                continue
+            conn.execute(
+                "DELETE FROM ship_activity_segments WHERE mmsi = ? AND start_time >= ?",
+                (mmsi, since.isoformat())
+            )
+            _save_segments(conn, mmsi, segments, mark_open=True)
+            processed += 1
+
+        if processed:
+            database.bump_data_version("ships", conn=conn)
+        conn.commit()
+        return processed
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def rebuild_activity_segments(start, end=None, mmsi=None) -> Dict:
+    """
+    批量重算时间范围内的作业分段 (读取归档 + 热表)
+
+    Args:
+        start: 起始时间 (ISO 字符串或 datetime)
+        end: 结束时间，None 表示到当前 (最后一段标记为未结束)
+        mmsi: 只处理该船，None 表示全部有 MMSI 的船舶
+    """
+    database.init_track_db()
+    start_dt = _to_naive(start)
+    end_dt = _to_naive(end) if end else datetime.now()
+    if start_dt is None or end_dt is None or start_dt >= end_dt:
+        raise ValueError("invalid time range")
+
+    conn = sqlite3.connect(database.TRACK_DB_PATH, timeout=30)
+    stats = {"vessels": 0, "segments": 0}
+    try:
+        if mmsi:
+            mmsi_list = [str(mmsi)]
+        else:
+            mmsi_list = [
+                str(row[0]) for row in conn.execute("SELECT DISTINCT mmsi FROM ship_infos WHERE mmsi IS NOT NULL AND mmsi != ''")
+            ]
+        for vessel in mmsi_list:
+            tracks = track_archive.get_track_history(vessel, start_dt.isoformat(), end_dt.isoformat(), conn=conn)
+            segments = segment_track(tracks)
+            conn.execute(
+                "DELETE FROM ship_activity_segments WHERE mmsi = ? AND start_time >= ? AND start_time <= ?",
+                (vessel, start_dt.isoformat(), end_dt.isoformat())
+            )
+            if segments:
+                _save_segments(conn, vessel, segments, mark_open=end is None)
+                stats["vessels"] += 1
+                stats["segments"] += len(segments)
+            conn.commit()
+        database.bump_data_version("ships", conn=conn)
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"[Activity] 重算完成: {stats['vessels']} 艘船舶, {stats['segments']} 个分段")
+    return stats
+
+
+def get_activity_segments(mmsi=None, start=None, end=None, activity=None, limit=500, conn=None) -> List[Dict]:
+    """查询与时间范围重叠的作业分段"""
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(database.TRACK_DB_PATH)
+    try:
+        where = []
+        params = []
+        if mmsi:
+            where.append("mmsi = ?")
+            params.append(str(mmsi))
+        if activity:
+            where.append("activity = ?")
+            params.append(activity)
+        if start:
+            where.append("end_time > ?")
+            params.append(start)
+        if end:
+            where.append("start_time < ?")
+            params.append(end)
+        where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+        rows = conn.execute(
+            f"SELECT id, {', '.join(SEGMENT_COLUMNS)} FROM ship_activity_segments {where_sql} "
+            f"ORDER BY start_time DESC LIMIT ?",
+            params + [limit]
+        ).fetchall()
+        return [dict(zip(["id"] + SEGMENT_COLUMNS, row)) for row in rows]
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def get_fleet_utilization(start: str, end: str, conn=None) -> Dict:
+    """
+    船队利用率: 各船在时间范围内的作业 / 航行 / 停泊小时数 (分段按范围裁剪)
+
+    距离、面积按与范围重叠的完整分段累计。
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(database.TRACK_DB_PATH)
+    try:
+        rows = conn.execute(
+            """
+            SELECT mmsi, activity,
+                   SUM((julianday(MIN(end_time, :end)) - julianday(MAX(start_time, :start))) * 86400),
+                   SUM(distance_m), SUM(area_km2), COUNT(*)
+            FROM ship_activity_segments
+            WHERE end_time > :start AND start_time < :end
+            GROUP BY mmsi, activity
+            """,
+            {"start": start, "end": end}
+        ).fetchall()
+        names = dict(conn.execute("SELECT mmsi, name FROM ship_infos WHERE mmsi IS NOT NULL AND mmsi != ''").fetchall())
+    finally:
+        if own_conn:
+            conn.close()
+
+    vessels = {}
+    for mmsi, activity, seconds, distance, area, count in rows:
+        item = vessels.setdefault(mmsi, {
+            "mmsi": mmsi,
+            "name": names.get(mmsi),
+            **{f"{a}_hours": 0.0 for a in ACTIVITIES},
+            "distance_km": 0.0,
+            "dredged_area_km2": 0.0,
+            "dredging_sessions": 0,
+        })
+        item[f"{activity}_hours"] += (seconds or 0) / 3600
+        item["distance_km"] += (distance or 0) / 1000
+        if activity == "dredging":
+            item["dredged_area_km2"] += area or 0
+            item["dredging_sessions"] += count
+
+    result = []
+    for item in vessels.values():
+        tracked = sum(item[f"{a}_hours"] for a in ACTIVITIES)
+        item["tracked_hours"] = round(tracked, 2)
+        item["utilization"] = round(item["dredging_hours"] / tracked, 4) if tracked > 0 else 0.0
+        for key in [f"{a}_hours" for a in ACTIVITIES] + ["distance_km", "dredged_area_km2"]:
+            item[key] = round(item[key], 2)
+        result.append(item)
+    result.sort(key=lambda v: v["dredging_hours"], reverse=True)
+
+    totals = {key: round(sum(v[key] for v in result), 2) for key in
+              [f"{a}_hours" for a in ACTIVITIES] + ["tracked_hours", "distance_km", "dredged_area_km2"]}
+    totals["utilization"] = round(totals["dredging_hours"] / totals["tracked_hours"], 4) if totals["tracked_hours"] > 0 else 0.0
+    return {"start": start, "end": end, "vessel_count": len(result), "totals": totals, "vessels": result}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="船舶作业分段")
+    parser.add_argument("action", choices=["update", "rebuild", "report"],
+                        help="update: 增量更新; rebuild: 批量重算历史; report: 输出利用率")
+    parser.add_argument("--start", help="起始时间 ISO (rebuild / report，默认 30 天前)")
+    parser.add_argument("--end", help="结束时间 ISO (默认当前)")
+    parser.add_argument("--mmsi", help="只处理指定船舶 (rebuild)")
+    args = parser.parse_args()
+
+    start_arg = args.start or (datetime.now() - timedelta(days=30)).isoformat()
+    if args.action == "update":
+        print(f"[Activity] 增量更新 {update_activity_segments()} 艘船舶")
+    elif args.action == "rebuild":
+        rebuild_activity_segments(start_arg, args.end, mmsi=args.mmsi)
+    else:
+        report = get_fleet_utilization(start_arg, args.end or datetime.now().isoformat())
+        for v in report["vessels"]:
+            print(f"{v['mmsi']} {v['name'] or ''}: 作业 {v['dredging_hours']}h / 航行 {v['voyage_hours']}h / "
+                  f"停泊 {v['idle_hours']}h, 利用率 {v['utilization']:.1%}, 扫测 {v['dredged_area_km2']} km²")
+        print(f"船队合计: {report['totals']}")
@@ -214,7 +214,7 @@ def analyze_tracks(tracks: List[Dict], offline_hours: int) -> Tuple[str, Optiona
 def update_ships_status_from_tracks(days: int = 3, offline_hours: int = 2, limit: int = 2000) -> int:
     """根据 ship_tracks 更新 ships 的状态和速度"""
     database.init_track_db()
-    ships = database.get_all_ships()
+    ships = database.get_all_ships(columns=("mmsi", "location", "region"))
     updated = 0
     conn = sqlite3.connect(database.TRACK_DB_PATH)
     try:
@@ -0,0 +1,177 @@
+"""
+船舶轨迹抽稀与紧凑编码
+
+- Douglas-Peucker: 按容差 (米) 保留形状关键点，容差可由地图缩放级别换算
+- 时间分桶: 每个时间桶只保留最后一个点，适合按时间均匀展示
+- 输出为列式数组或 Google Encoded Polyline
+"""
+
+import math
+from typing import Dict, List, Optional, Sequence
+
+from analysis.ships_status import parse_timestamp
+
+EARTH_RADIUS_M = 6371000.0
+# Web Mercator 在赤道处 zoom=0 时每像素对应的米数
+METERS_PER_PIXEL_Z0 = 156543.03392
+# max_points 约束下逐步放大时间桶的最大轮数
+MAX_BUCKET_ROUNDS = 24
+
+
+def tolerance_for_zoom(zoom: Optional[float], pixels: float = 1.0) -> float:
+    """缩放级别对应的抽稀容差 (米)，约为屏幕上 pixels 个像素"""
+    if zoom is None:
+        return 0.0
+    return METERS_PER_PIXEL_Z0 / (2 ** max(0.0, float(zoom))) * pixels
+
+
+def _project(points: Sequence[Dict]) -> List[tuple]:
+    """等距圆柱投影到以米为单位的平面坐标 (单条轨迹范围内误差可忽略)"""
+    lat0 = math.radians(sum(p["lat"] for p in points) / len(points))
+    kx = EARTH_RADIUS_M * math.cos(lat0) * math.pi / 180.0
+    ky = EARTH_RADIUS_M * math.pi / 180.0
+    return [(p["lng"] * kx, p["lat"] * ky) for p in points]
+
+
+def _segment_distance(px, py, ax, ay, bx, by) -> float:
+    dx = bx - ax
+    dy = by - ay
+    if dx == 0 and dy == 0:
+        return math.hypot(px - ax, py - ay)
+    t = ((px - ax) * dx + (py - ay) * dy) / (dx * dx + dy * dy)
+    t = max(0.0, min(1.0, t))
+    return math.hypot(px - (ax + t * dx), py - (ay + t * dy))
+
+
+def dp_significance(points: Sequence[Dict]) -> List[float]:
+    """
+    计算每个点在 Douglas-Peucker 中的有效重要度 (米)
+
+    分割顺序与容差无关，点在容差 t 下被保留当且仅当其重要度 > t；
+    子段的重要度不超过父分割点，因此重要度对容差单调，可一次计算后按容差或点数筛选。
+    """
+    n = len(points)
+    significance = [0.0] * n
+    if n == 0:
+        return significance
+    significance[0] = significance[-1] = math.inf
+    if n <= 2:
+        return significance
+    xy = _project(points)
+    stack = [(0, n - 1, math.inf)]
+    while stack:
+        start, end, parent = stack.pop()
+        if end - start < 2:
+            continue
+        ax, ay = xy[start]
+        bx, by = xy[end]
+        max_dist = -1.0
+        index = start
+        for i in range(start + 1, end):
+            dist = _segment_distance(xy[i][0], xy[i][1], ax, ay, bx, by)
+            if dist > max_dist:
+                max_dist = dist
+                index = i
+        value = min(max_dist, parent)
+        significance[index] = value
+        stack.append((start, index, value))
+        stack.append((index, end, value))
+    return significance
+
+
+def douglas_peucker(points: Sequence[Dict], tolerance_m: float, max_points: Optional[int] = None) -> List[int]:
+    """返回 Douglas-Peucker 抽稀后保留点的下标 (升序，始终包含首尾点)"""
+    n = len(points)
+    if n <= 2 or (tolerance_m <= 0 and not max_points):
+        return list(range(n))
+    significance = dp_significance(points)
+    indexes = [i for i in range(n) if significance[i] > tolerance_m]
+    if max_points and len(indexes) > max_points:
+        indexes = sorted(sorted(indexes, key=lambda i: significance[i], reverse=True)[:max(2, max_points)])
+    return indexes
+
+
+def time_bucket(points: Sequence[Dict], bucket_seconds: float) -> List[int]:
+    """按时间分桶，每桶保留最后一个点；返回保留点下标 (始终包含首点)"""
+    n = len(points)
+    if n <= 2 or bucket_seconds <= 0:
+        return list(range(n))
+    kept = [0]
+    last_bucket = None
+    last_index = None
+    for i, p in enumerate(points):
+        ts = parse_timestamp(p.get("timestamp"))
+        bucket = int(ts.timestamp() // bucket_seconds) if ts else None
+        if last_index is not None and bucket != last_bucket:
+            kept.append(last_index)
+        last_bucket = bucket
+        last_index = i
+    kept.append(n - 1)
+    return sorted(set(kept))
+
+
+def _time_span_seconds(points: Sequence[Dict]) -> float:
+    start = parse_timestamp(points[0].get("timestamp"))
+    end = parse_timestamp(points[-1].get("timestamp"))
+    if not start or not end:
+        return 0.0
+    return max(0.0, (end - start).total_seconds())
+
+
+def simplify_track(points: Sequence[Dict], zoom: Optional[float] = None,
+                   max_points: Optional[int] = None, method: str = "dp") -> List[Dict]:
+    """
+    轨迹抽稀
+
+    Args:
+        points: 按时间升序的轨迹点 (含 lat / lng / timestamp)
+        zoom: 地图缩放级别，dp 模式下换算为约 1 像素的容差
+        max_points: 返回点数上限
+        method: dp (Douglas-Peucker) 或 time (时间分桶)
+
+    Returns:
+        抽稀后的轨迹点 (原对象子集，顺序不变)
+    """
+    points = [p for p in points if p.get("lat") is not None and p.get("lng") is not None]
+    if len(points) <= 2 or (zoom is None and not max_points):
+        return points
+    if max_points is not None:
+        max_points = max(2, int(max_points))
+
+    if method == "time":
+        bucket = 0.0
+        if max_points:
+            bucket = _time_span_seconds(points) / max_points
+        indexes = time_bucket(points, bucket)
+        rounds = 0
+        while max_points and len(indexes) > max_points and rounds < MAX_BUCKET_ROUNDS:
+            bucket = bucket * 1.5 if bucket > 0 else 60.0
+            indexes = time_bucket(points, bucket)
+            rounds += 1
+        return [points[i] for i in indexes]
+
+    indexes = douglas_peucker(points, tolerance_for_zoom(zoom), max_points=max_points)
+    return [points[i] for i in indexes]
+
+
+def encode_polyline(points: Sequence[Dict], precision: int = 5) -> str:
+    """Google Encoded Polyline 编码 (lat, lng)"""
+    factor = 10 ** precision
+    result = []
+    prev_lat = prev_lng = 0
+    for p in points:
+        lat = int(round(p["lat"] * factor))
+        lng = int(round(p["lng"] * factor))
+        for delta in (lat - prev_lat, lng - prev_lng):
+            value = ~(delta << 1) if delta < 0 else (delta << 1)
+            while value >= 0x20:
+                result.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            result.append(chr(value + 63))
+        prev_lat, prev_lng = lat, lng
+    return "".join(result)
+
+
+def to_columnar(points: Sequence[Dict], fields: Sequence[str] = ("lat", "lng", "speed", "heading", "timestamp")) -> Dict[str, list]:
+    """转为列式数组 {字段: [值...]}"""
+    return {field: [p.get(field) for p in points] for field in fields}
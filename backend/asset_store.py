@@ -0,0 +1,226 @@
+"""
+截图资源存储
+
+按图片内容哈希寻址存储网页截图:
+- 相同截图只保存一份，重复补充采集不会产生新文件
+- 统一缩放/裁剪并重新编码为 WebP (或 AVIF / JPEG)，限制单张体积
+- 生成列表页使用的小缩略图
+- 依据 articles.screenshot_path 的引用计数回收无引用文件
+"""
+
+import argparse
+import hashlib
+import io
+import os
+import re
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import config
+import database
+
+try:
+    from PIL import Image, features
+except ImportError:  # Pillow 未安装时截图按原始 JPEG 存储，不生成缩略图
+    Image = None
+    features = None
+
+ASSET_PREFIX = "assets/"
+THUMB_PREFIX = "assets/thumbs/"
+
+MAX_WIDTH = 1280
+# 截图同时是视觉模型的输入，不裁剪页面内容；WebP/AVIF 单边最多 16383 像素，
+# 超出时改用 JPEG 保存整页，JPEG 单边上限 65535 像素，仅超出该上限时裁掉底部
+WEBP_MAX_DIMENSION = 16383
+MAX_HEIGHT = 65500
+IMAGE_QUALITY = 70
+THUMB_SIZE = (320, 240)
+THUMB_QUALITY = 60
+
+FORMAT_EXTENSIONS = {"webp": "webp", "avif": "avif", "jpeg": "jpg"}
+
+# 内容寻址文件名 与 旧版 "{字母数字前缀}_{md5前8位}.jpg" 文件名
+HASHED_NAME_RE = re.compile(r"^[0-9a-f]{32}\.(webp|avif|jpg)$")
+LEGACY_NAME_RE = re.compile(r"^[A-Za-z0-9]*_[0-9a-f]{8}\.jpg$")
+
+
+def pick_image_format():
+    """选择截图编码格式，当前 Pillow 不支持时回退为 jpeg"""
+    if Image is None:
+        return "jpeg"
+    preferred = str(config.ASSET_IMAGE_FORMAT or "webp").lower()
+    if preferred in ("webp", "avif"):
+        try:
+            if features.check(preferred):
+                return preferred
+        except Exception:
+            pass
+    return "jpeg"
+
+
+def _atomic_write(path, data):
+    """先写临时文件再替换，避免读到半截图片"""
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _encode(image, fmt, quality):
+    buf = io.BytesIO()
+    if fmt == "jpeg":
+        image.save(buf, "JPEG", quality=quality, optimize=True, progressive=True)
+    else:
+        image.save(buf, fmt.upper(), quality=quality)
+    return buf.getvalue()
+
+
+def _prepare_image(image_bytes):
+    """解码并限制截图宽度: 缩放到 MAX_WIDTH 以内 (高度只在超过 JPEG 上限时裁掉)"""
+    image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+    if image.width > MAX_WIDTH:
+        height = max(1, round(image.height * MAX_WIDTH / image.width))
+        image = image.resize((MAX_WIDTH, height), Image.LANCZOS)
+    if image.height > MAX_HEIGHT:
+        image = image.crop((0, 0, image.width, MAX_HEIGHT))
+    return image
+
+
+def _write_thumbnail(image, digest, fmt):
+    """取页面首屏区域生成缩略图"""
+    thumb_w, thumb_h = THUMB_SIZE
+    top_height = min(image.height, round(image.width * thumb_h / thumb_w))
+    thumb = image.crop((0, 0, image.width, top_height))
+    thumb.thumbnail(THUMB_SIZE, Image.LANCZOS)
+    filename = f"{digest}.{FORMAT_EXTENSIONS[fmt]}"
+    _atomic_write(os.path.join(config.THUMBS_DIR, filename), _encode(thumb, fmt, THUMB_QUALITY))
+
+
+def _touch(path):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def store_screenshot(image_bytes):
+    """按内容哈希保存截图，返回 assets/ 相对路径；失败返回空字符串"""
+    if not image_bytes:
+        return ""
+    digest = hashlib.sha256(image_bytes).hexdigest()[:32]
+    fmt = pick_image_format()
+    # 超长截图以 JPEG 保存，因此两种扩展名都要检查
+    for ext in dict.fromkeys([FORMAT_EXTENSIONS[fmt], FORMAT_EXTENSIONS["jpeg"]]):
+        filename = f"{digest}.{ext}"
+        local_path = os.path.join(config.ASSETS_DIR, filename)
+        if os.path.exists(local_path):
+            # 刷新修改时间，避免在新文章入库引用前被 collect_garbage 按保护期回收
+            _touch(local_path)
+            _touch(os.path.join(config.THUMBS_DIR, filename))
+            return ASSET_PREFIX + filename
+    try:
+        if Image is None:
+            data = image_bytes
+        else:
+            image = _prepare_image(image_bytes)
+            if fmt != "jpeg" and image.height > WEBP_MAX_DIMENSION:
+                fmt = "jpeg"
+            data = _encode(image, fmt, IMAGE_QUALITY)
+            _write_thumbnail(image, digest, fmt)
+        filename = f"{digest}.{FORMAT_EXTENSIONS[fmt]}"
+        _atomic_write(os.path.join(config.ASSETS_DIR, filename), data)
+        return ASSET_PREFIX + filename
+    except Exception as e:
+        print(f"[Assets] 截图保存失败: {e}")
+        return ""
+
+
+def thumbnail_path(screenshot_path):
+    """返回截图对应的缩略图路径，没有缩略图时回退为原图路径"""
+    if not screenshot_path:
+        return ""
+    filename = os.path.basename(str(screenshot_path))
+    if HASHED_NAME_RE.match(filename) and os.path.exists(os.path.join(config.THUMBS_DIR, filename)):
+        return THUMB_PREFIX + filename
+    return screenshot_path
+
+
+def collect_garbage(grace_hours=24, dry_run=False):
+    """
+    回收没有被任何文章引用的截图与缩略图
+
+    Args:
+        grace_hours: 新写入文件的保护期（补充采集到保存入库之间的文件尚无引用）
+        dry_run: 仅统计不删除
+
+    Returns:
+        统计字典 {removed, freed_bytes, kept}
+    """
+    refs = database.get_screenshot_ref_counts()
+    cutoff = time.time() - grace_hours * 3600
+    stats = {"removed": 0, "freed_bytes": 0, "kept": 0}
+
+    for filename in os.listdir(config.ASSETS_DIR):
+        # 只处理截图文件，封面图等手工放置的资源不受影响
+        if not (HASHED_NAME_RE.match(filename) or LEGACY_NAME_RE.match(filename)):
+            continue
+        path = os.path.join(config.ASSETS_DIR, filename)
+        if refs.get(filename, 0) > 0 or os.path.getmtime(path) > cutoff:
+            stats["kept"] += 1
+            continue
+        stats["removed"] += 1
+        stats["freed_bytes"] += os.path.getsize(path)
+        if not dry_run:
+            os.remove(path)
+
+    for filename in os.listdir(config.THUMBS_DIR):
+        if not HASHED_NAME_RE.match(filename):
+            continue
+        if os.path.exists(os.path.join(config.ASSETS_DIR, filename)):
+            continue
+        path = os.path.join(config.THUMBS_DIR, filename)
+        stats["freed_bytes"] += os.path.getsize(path)
+        if not dry_run:
+            os.remove(path)
+
+    print(f"[Assets] 回收完成: 删除 {stats['removed']} 个, 保留 {stats['kept']} 个, 释放 {stats['freed_bytes'] / 1024 / 1024:.1f} MB")
+    return stats
+
+
+def migrate_legacy_assets():
+    """将旧命名的 JPEG 截图迁移到内容寻址存储并更新文章引用，返回迁移数量"""
+    migrated = 0
+    for filename in os.listdir(config.ASSETS_DIR):
+        if not LEGACY_NAME_RE.match(filename):
+            continue
+        old_path = os.path.join(config.ASSETS_DIR, filename)
+        try:
+            with open(old_path, "rb") as f:
+                new_rel = store_screenshot(f.read())
+        except Exception as e:
+            print(f"[Assets] 读取旧截图失败 {filename}: {e}")
+            continue
+        if not new_rel:
+            continue
+        database.replace_screenshot_path(ASSET_PREFIX + filename, new_rel)
+        if os.path.basename(new_rel) != filename:
+            os.remove(old_path)
+        migrated += 1
+    print(f"[Assets] 旧截图迁移完成: {migrated} 个")
+    return migrated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="截图资源维护")
+    parser.add_argument("action", choices=["gc", "migrate"], help="gc: 回收无引用截图; migrate: 迁移旧命名截图")
+    parser.add_argument("--dry-run", action="store_true", help="仅统计不删除 (gc)")
+    parser.add_argument("--grace-hours", type=int, default=24, help="新文件保护期 (gc)")
+    args = parser.parse_args()
+
+    database.init_db()
+    if args.action == "migrate":
+        migrate_legacy_assets()
+    else:
+        collect_garbage(grace_hours=args.grace_hours, dry_run=args.dry_run)
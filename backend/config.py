@@ -31,17 +31,34 @@ DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
 os.makedirs(DATA_DIR, exist_ok=True)
 
 SOURCES_FILE = os.path.join(os.path.dirname(__file__), 'static', 'sources.json')
+# 电子围栏 (港口 / 疏浚作业区 / 项目区域)，GeoJSON FeatureCollection
+GEOFENCES_FILE = os.getenv("GEOFENCES_FILE", os.path.join(os.path.dirname(__file__), 'static', 'geofences.geojson'))
 TEMPLATES_DIR = os.path.join(ROOT_DIR, 'frontend')
 REPORT_FILE = os.path.join(DATA_DIR, 'report.md')
 HISTORY_FILE = os.path.join(DATA_DIR, 'history.jsonl')
 ASSETS_DIR = os.path.join(DATA_DIR, 'assets')
 
+THUMBS_DIR = os.path.join(ASSETS_DIR, 'thumbs')
+
 # Ensure assets directory exists
 os.makedirs(ASSETS_DIR, exist_ok=True)
+os.makedirs(THUMBS_DIR, exist_ok=True)
+
+# 截图存储: 编码格式 (webp / avif / jpeg)，不支持时回退为 jpeg
+ASSET_IMAGE_FORMAT = os.getenv("ASSET_IMAGE_FORMAT", "webp")
 
 # Webhook & Server
 WECOM_WEBHOOK_URL = os.getenv("WECOM_WEBHOOK_URL")
 BACKEND_URL = os.getenv("WISEFLOW_BACKEND_URL", "http://127.0.0.1:8000")
+# Dashboard 数据库查询线程池大小 (每个线程持有一组只读连接)
+DASHBOARD_DB_WORKERS = int(os.getenv("DASHBOARD_DB_WORKERS", "4"))
+# 文本后处理进程池大小 (URL 规范化、相关性判断等纯计算步骤)，0 表示不启用
+CPU_POOL_WORKERS = int(os.getenv("CPU_POOL_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+# 语义检索向量: local 使用本地 CPU 模型 (fastembed)，provider 使用 TEXT_LLM_API_BASE 上的向量模型，
+# hash 使用字符 n-gram 哈希向量 (仅词面匹配，用于离线测试)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "local")
+EMBEDDING_LOCAL_MODEL = os.getenv("EMBEDDING_LOCAL_MODEL", "BAAI/bge-small-zh-v1.5")
+EMBEDDING_PROVIDER_MODEL = os.getenv("EMBEDDING_PROVIDER_MODEL", "BAAI/bge-m3")
 RSSHUB_BASES = [
     v.strip()
     for v in os.getenv("RSSHUB_BASES", os.getenv("RSSHUB_BASE", "https://rsshub.app")).split(",")
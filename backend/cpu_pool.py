@@ -0,0 +1,99 @@
+"""
+CPU 密集型后处理进程池
+
+近似重复签名、事件特征、哈希向量等按批的纯计算步骤放到进程池中执行，
+避免占用事件循环；大批量回填与重新分析时可以用满多核。
+单条的廉价计算与文件读写留在当前进程: 参数序列化与进程间通信的开销比计算本身还大。
+- run(func, *args): 单次调用，结果以 await 方式回到异步流程
+- map_chunked(batch_func, items): 按块分发，batch_func 接收一个列表并返回等长列表
+
+提交到进程池的函数必须是模块级函数 (可被 pickle)。CPU_POOL_WORKERS=0 时全部在当前进程内执行。
+调度进程中有线程池、数据库连接与浏览器，fork 会复制这些状态 (包括其他线程持有的锁)，
+因此子进程使用 forkserver (Windows 上为 spawn) 方式启动。
+"""
+
+import asyncio
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import config
+
+# 条目数少于该值时直接在当前进程执行，省去序列化与进程间通信开销
+INLINE_THRESHOLD = 32
+DEFAULT_CHUNK_SIZE = 64
+
+_pool = None
+_lock = threading.Lock()
+
+
+def _mp_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def get_pool():
+    """获取进程池，未启用时返回 None"""
+    global _pool
+    if config.CPU_POOL_WORKERS <= 0:
+        return None
+    with _lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=config.CPU_POOL_WORKERS, mp_context=_mp_context())
+            print(f"[CPUPool] 已启动进程池: {config.CPU_POOL_WORKERS} 个进程")
+        return _pool
+
+
+def _reset_pool(pool):
+    global _pool
+    with _lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def run(func, *args):
+    """在进程池中执行 func(*args)；进程池不可用时在当前进程执行"""
+    pool = get_pool()
+    if pool is None:
+        return func(*args)
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, func, *args)
+    except BrokenProcessPool as e:
+        # 子进程异常退出 (如被 OOM kill) 时重建进程池，本次改为在当前进程执行
+        print(f"[CPUPool] 进程池已损坏，改为本地执行: {e}")
+        _reset_pool(pool)
+        return func(*args)
+
+
+async def map_chunked(batch_func, items, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    按块并行执行 batch_func，按原顺序拼接结果
+
+    Args:
+        batch_func: 模块级函数，list -> 等长 list
+        items: 待处理条目
+        chunk_size: 每块条目数
+    """
+    items = list(items)
+    if not items:
+        return []
+    if len(items) < INLINE_THRESHOLD or get_pool() is None:
+        return batch_func(items)
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    results = await asyncio.gather(*(run(batch_func, chunk) for chunk in chunks))
+    return [value for chunk_result in results for value in chunk_result]
+
+
+def shutdown():
+    """关闭进程池 (进程退出前调用)"""
+    global _pool
+    with _lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
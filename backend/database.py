@@ -1,7 +1,10 @@
 import sqlite3
 import os
+import threading
+from pathlib import Path
 from datetime import datetime
 import config
+import text_store
 from static.constants import (
     DEFAULT_CATEGORY,
     ALLOWED_CATEGORIES,
@@ -12,10 +15,690 @@ from static.constants import (
 DB_PATH = os.path.join(config.DATA_DIR, 'dredge_intel.db')
 TRACK_DB_PATH = os.path.join(config.DATA_DIR, 'ship_tracks.db')
 
+_readonly_local = threading.local()
+
+# 文章统计日期: 优先发布日期，否则入库日期，仅接受 YYYY-MM-DD 开头的值
+_STAT_DATE_SOURCE = "substr(COALESCE(NULLIF(pub_date, ''), created_at), 1, 10)"
+STAT_DATE_SQL = f"CASE WHEN date({_STAT_DATE_SOURCE}) = {_STAT_DATE_SOURCE} THEN {_STAT_DATE_SOURCE} END"
+
+# 文章日汇总表 article_daily_stats 的维度列及其取值表达式 ({p} 为 NEW./OLD./空 前缀)
+ROLLUP_DIMENSIONS = [
+    ("day", "substr(COALESCE({p}created_at, ''), 1, 10)"),
+    ("stat_date", "COALESCE({p}stat_date, '')"),
+    ("category", "COALESCE({p}category, '')"),
+    ("source_name", "COALESCE({p}source_name, '')"),
+    ("source_type", "COALESCE({p}source_type, '')"),
+    ("valid", "COALESCE({p}valid, 1)"),
+    ("is_hidden", "COALESCE({p}is_hidden, 0)"),
+    ("is_retained", "COALESCE({p}is_retained, 0)"),
+]
+
+def _rollup_exprs(prefix):
+    return [expr.format(p=prefix) for _, expr in ROLLUP_DIMENSIONS]
+
+def _rollup_upsert_sql(prefix, delta):
+    """生成对汇总表某一维度组合累加 delta 的语句 (用于触发器)"""
+    columns = ", ".join(name for name, _ in ROLLUP_DIMENSIONS)
+    values = ", ".join(_rollup_exprs(prefix))
+    sql = f"""
+        INSERT INTO article_daily_stats ({columns}, cnt) VALUES ({values}, {delta})
+        ON CONFLICT({columns}) DO UPDATE SET cnt = cnt + ({delta});
+    """
+    if delta < 0:
+        where = " AND ".join(f"{name} = {expr}" for (name, _), expr in zip(ROLLUP_DIMENSIONS, _rollup_exprs(prefix)))
+        sql += f"DELETE FROM article_daily_stats WHERE cnt <= 0 AND {where};"
+    return sql
+
+def _init_rollup_schema(c):
+    """创建文章日汇总表及维护触发器，新建时从 articles 全量构建"""
+    c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='article_daily_stats'")
+    exists = c.fetchone() is not None
+    columns = ", ".join(name for name, _ in ROLLUP_DIMENSIONS)
+    c.execute(f'''CREATE TABLE IF NOT EXISTS article_daily_stats (
+        day TEXT NOT NULL,
+        stat_date TEXT NOT NULL,
+        category TEXT NOT NULL,
+        source_name TEXT NOT NULL,
+        source_type TEXT NOT NULL,
+        valid INTEGER NOT NULL,
+        is_hidden INTEGER NOT NULL,
+        is_retained INTEGER NOT NULL,
+        cnt INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY ({columns})
+    ) WITHOUT ROWID''')
+
+    # 任何写入路径 (save_article / save_raw_articles / 手工修改) 都通过触发器增量维护汇总
+    changed = " OR ".join(
+        f"({old}) IS NOT ({new})" for old, new in zip(_rollup_exprs("OLD."), _rollup_exprs("NEW."))
+    )
+    watched = ", ".join(["created_at", "stat_date", "category", "source_name", "source_type", "valid", "is_hidden", "is_retained"])
+    c.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_articles_rollup_insert AFTER INSERT ON articles
+        BEGIN {_rollup_upsert_sql("NEW.", 1)} END""")
+    c.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_articles_rollup_delete AFTER DELETE ON articles
+        BEGIN {_rollup_upsert_sql("OLD.", -1)} END""")
+    c.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_articles_rollup_update AFTER UPDATE OF {watched} ON articles
+        WHEN {changed}
+        BEGIN {_rollup_upsert_sql("OLD.", -1)} {_rollup_upsert_sql("NEW.", 1)} END""")
+
+    if not exists:
+        _rebuild_rollups(c)
+        print("[DB] 已构建文章日汇总表 article_daily_stats")
+
+def _rebuild_rollups(c):
+    columns = ", ".join(name for name, _ in ROLLUP_DIMENSIONS)
+    exprs = ", ".join(_rollup_exprs(""))
+    c.execute("DELETE FROM article_daily_stats")
+    c.execute(f'''
+        INSERT INTO article_daily_stats ({columns}, cnt)
+        SELECT {exprs}, COUNT(*) FROM articles GROUP BY {exprs}
+    ''')
+
+# 全文索引: trigram 分词器按 3 字符切分，中英文均可做子串匹配
+# 标题/摘要来自 articles，中文全文来自 article_texts，外部内容为两表连接的视图
+FULLTEXT_ARTICLE_COLUMNS = ["title", "title_cn", "summary_cn"]
+FULLTEXT_COLUMNS = FULLTEXT_ARTICLE_COLUMNS + ["full_text_cn"]
+FULLTEXT_MIN_KEYWORD_LENGTH = 3
+
+def _init_fulltext_schema(c):
+    """创建 articles_fts 全文索引 (外部内容视图) 及同步触发器，新建时全量构建"""
+    c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='articles_fts'")
+    if c.fetchone() is not None:
+        return
+    columns = ", ".join(FULLTEXT_COLUMNS)
+    text_of = "(SELECT full_text_cn FROM article_texts WHERE article_id = {}.id)"
+    new_values = ", ".join([f"new.{col}" for col in FULLTEXT_ARTICLE_COLUMNS] + [text_of.format("new")])
+    old_values = ", ".join([f"old.{col}" for col in FULLTEXT_ARTICLE_COLUMNS] + [text_of.format("old")])
+    article_values = ", ".join(f"a.{col}" for col in FULLTEXT_ARTICLE_COLUMNS)
+    c.execute(f"""CREATE VIEW IF NOT EXISTS article_fts_source AS
+        SELECT a.id AS id, {article_values}, t.full_text_cn AS full_text_cn
+        FROM articles a LEFT JOIN article_texts t ON t.article_id = a.id""")
+    try:
+        c.execute(f"""CREATE VIRTUAL TABLE articles_fts USING fts5(
+            {columns}, content='article_fts_source', content_rowid='id', tokenize='trigram'
+        )""")
+    except sqlite3.OperationalError as e:
+        print(f"[DB] 当前 SQLite 不支持 FTS5 trigram，关键词搜索将使用 LIKE: {e}")
+        return
+    c.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_articles_fts_insert AFTER INSERT ON articles BEGIN
+        INSERT INTO articles_fts(rowid, {columns}) VALUES (new.id, {new_values});
+    END""")
+    # 删除文章时一并删除正文 (先用正文原值从索引中删除)
+    c.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_articles_fts_delete AFTER DELETE ON articles BEGIN
+        INSERT INTO articles_fts(articles_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+        DELETE FROM article_texts WHERE article_id = old.id;
+    END""")
+    c.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_articles_fts_update AFTER UPDATE OF {", ".join(FULLTEXT_ARTICLE_COLUMNS)} ON articles BEGIN
+        INSERT INTO articles_fts(articles_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+        INSERT INTO articles_fts(rowid, {columns}) VALUES (new.id, {new_values});
+    END""")
+    c.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_article_texts_fts_insert AFTER INSERT ON article_texts BEGIN
+        INSERT INTO articles_fts(articles_fts, rowid, {columns})
+            SELECT 'delete', a.id, {article_values}, NULL FROM articles a WHERE a.id = new.article_id;
+        INSERT INTO articles_fts(rowid, {columns})
+            SELECT a.id, {article_values}, new.full_text_cn FROM articles a WHERE a.id = new.article_id;
+    END""")
+    c.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_article_texts_fts_update AFTER UPDATE OF full_text_cn ON article_texts BEGIN
+        INSERT INTO articles_fts(articles_fts, rowid, {columns})
+            SELECT 'delete', a.id, {article_values}, old.full_text_cn FROM articles a WHERE a.id = old.article_id;
+        INSERT INTO articles_fts(rowid, {columns})
+            SELECT a.id, {article_values}, new.full_text_cn FROM articles a WHERE a.id = new.article_id;
+    END""")
+    c.execute("INSERT INTO articles_fts(articles_fts) VALUES ('rebuild')")
+    print("[DB] 已构建全文索引 articles_fts")
+
+def has_fulltext_index(conn):
+    """检查数据库是否已建立 articles_fts 全文索引"""
+    c = conn.cursor()
+    c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='articles_fts'")
+    return c.fetchone() is not None
+
+def build_fulltext_query(keyword):
+    """将关键词转换为 FTS5 短语查询；过短无法使用 trigram 索引时返回 None"""
+    text = str(keyword or "").strip()
+    if len(text) < FULLTEXT_MIN_KEYWORD_LENGTH:
+        return None
+    return '"' + text.replace('"', '""') + '"'
+
+# 数据版本号: 写入方在同一事务内递增，Dashboard 据此判断响应缓存是否过期
+DATA_VERSION_SCOPES = {"articles": DB_PATH, "ships": TRACK_DB_PATH}
+
+# 正文大字段 (见 text_store): 不放在 articles 表中，只在需要时按 id 读取
+ARTICLE_TEXT_FIELDS = ("content", "full_text_cn")
+ARTICLE_TEXT_MIGRATION = "article_texts"
+# 初始化连接的等待时长 (秒): 其他进程正在执行一次性迁移时等待其完成
+SCHEMA_LOCK_TIMEOUT = 1800
+FULLTEXT_TRIGGERS = ["trg_articles_fts_insert", "trg_articles_fts_delete", "trg_articles_fts_update",
+                     "trg_article_texts_fts_insert", "trg_article_texts_fts_update"]
+
+def _init_article_text_schema(c):
+    """创建 article_texts / text_dictionaries，并把旧版 articles.content / full_text_cn 迁移过来；返回是否发生迁移"""
+    c.execute('''CREATE TABLE IF NOT EXISTS article_texts (
+        article_id INTEGER PRIMARY KEY,
+        content BLOB,
+        codec TEXT,
+        full_text_cn TEXT,
+        updated_at TEXT
+    )''')
+    c.execute('''CREATE TABLE IF NOT EXISTS text_dictionaries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        codec TEXT NOT NULL,
+        data BLOB NOT NULL,
+        samples INTEGER,
+        created_at TEXT
+    )''')
+    c.execute('''CREATE TABLE IF NOT EXISTS schema_migrations (
+        name TEXT PRIMARY KEY,
+        applied_at TEXT
+    )''')
+    if not any(col in _table_columns(c, "articles") for col in ARTICLE_TEXT_FIELDS):
+        return False
+    # Dashboard 与调度进程启动时都会调用 init_db: 检查与迁移在同一个写事务内完成，
+    # 只有先拿到写锁的进程执行迁移，其余进程等待 (连接超时 SCHEMA_LOCK_TIMEOUT) 后跳过
+    conn = c.connection
+    conn.commit()
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        applied = c.execute("SELECT 1 FROM schema_migrations WHERE name = ?", (ARTICLE_TEXT_MIGRATION,)).fetchone()
+        legacy = [col for col in ARTICLE_TEXT_FIELDS if col in _table_columns(c, "articles")]
+        if applied or not legacy:
+            conn.commit()
+            return False
+        _migrate_article_texts(c, legacy)
+        c.execute(
+            "INSERT OR REPLACE INTO schema_migrations (name, applied_at) VALUES (?, ?)",
+            (ARTICLE_TEXT_MIGRATION, datetime.now().isoformat())
+        )
+        conn.commit()
+        return True
+    except Exception:
+        conn.rollback()
+        raise
+
+def _migrate_article_texts(c, legacy):
+    """把旧版 articles 正文列搬到 article_texts 并重建全文索引 (在调用方的写事务内执行)"""
+    print(f"[DB] 检测到 articles 表中的正文列 {legacy}，正在迁移至 article_texts...")
+    # 旧版全文索引以 articles 为外部内容表，迁移后按新视图重建
+    for trigger in FULLTEXT_TRIGGERS:
+        c.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    c.execute("DROP TABLE IF EXISTS articles_fts")
+    c.execute("DROP VIEW IF EXISTS article_fts_source")
+    select_cols = ", ".join(col if col in legacy else "NULL" for col in ARTICLE_TEXT_FIELDS)
+    text_filter = " OR ".join(f"COALESCE({col}, '') != ''" for col in legacy)
+    if "content" in legacy:
+        samples = [r[0] for r in c.execute(
+            "SELECT content FROM articles WHERE COALESCE(content, '') != '' ORDER BY id DESC LIMIT ?",
+            (text_store.TRAIN_SAMPLES,)
+        )]
+        text_store.train_dictionary(samples, c.connection)
+    migrated = 0
+    last_id = 0
+    while True:
+        rows = c.execute(
+            f"SELECT id, {select_cols} FROM articles WHERE id > ? AND ({text_filter}) ORDER BY id LIMIT 500",
+            (last_id,)
+        ).fetchall()
+        if not rows:
+            break
+        now = datetime.now().isoformat()
+        c.executemany(
+            "INSERT OR REPLACE INTO article_texts (article_id, content, codec, full_text_cn, updated_at) VALUES (?, ?, ?, ?, ?)",
+            [(r[0],) + text_store.encode(r[1], c.connection) + (r[2] or None, now) for r in rows]
+        )
+        migrated += len(rows)
+        last_id = rows[-1][0]
+    for col in legacy:
+        c.execute(f"ALTER TABLE articles DROP COLUMN {col}")
+    # 全文索引在同一事务内重建，其他进程不会看到迁移了一半的表
+    _init_fulltext_schema(c)
+    print(f"[DB] 已迁移 {migrated} 篇文章正文至 article_texts")
+
+def _table_columns(c, table):
+    return {row[1] for row in c.execute(f"PRAGMA table_info({table})")}
+
+def article_text_missing_sql(field, alias="articles"):
+    """正文字段为空的过滤条件 (article_texts 中无记录或该字段为空)"""
+    return f"NOT EXISTS (SELECT 1 FROM article_texts t WHERE t.article_id = {alias}.id AND t.{field} IS NOT NULL AND t.{field} != '')"
+
+def save_article_texts(c, article_id, content=None, full_text_cn=None):
+    """写入正文 (空值保留原有内容)，在调用方事务内执行"""
+    content = content or None
+    full_text_cn = full_text_cn or None
+    if content is None and full_text_cn is None:
+        return
+    blob, codec = text_store.encode(content, c.connection)
+    c.execute(
+        '''
+        INSERT INTO article_texts (article_id, content, codec, full_text_cn, updated_at) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(article_id) DO UPDATE SET
+            content = COALESCE(excluded.content, content),
+            codec = CASE WHEN excluded.content IS NULL THEN codec ELSE excluded.codec END,
+            full_text_cn = COALESCE(excluded.full_text_cn, full_text_cn),
+            updated_at = excluded.updated_at
+        ''',
+        (article_id, blob, codec, full_text_cn, datetime.now().isoformat())
+    )
+
+def get_article_texts(ids, fields=ARTICLE_TEXT_FIELDS, conn=None):
+    """按文章 id 读取正文，返回 {id: {字段: 文本}} (缺失的字段为空字符串)"""
+    ids = [i for i in dict.fromkeys(ids) if i is not None]
+    if not ids:
+        return {}
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(DB_PATH)
+    try:
+        result = {}
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for article_id, blob, codec, full_text_cn in conn.execute(
+                f"SELECT article_id, {'content, codec' if 'content' in fields else 'NULL, NULL'}, "
+                f"{'full_text_cn' if 'full_text_cn' in fields else 'NULL'} "
+                f"FROM article_texts WHERE article_id IN ({placeholders})",
+                chunk
+            ):
+                texts = {}
+                if "content" in fields:
+                    texts["content"] = text_store.decode(blob, codec, conn)
+                if "full_text_cn" in fields:
+                    texts["full_text_cn"] = full_text_cn or ""
+                result[article_id] = texts
+        return result
+    finally:
+        if own_conn:
+            conn.close()
+
+def attach_article_texts(items, fields=ARTICLE_TEXT_FIELDS, conn=None):
+    """为文章字典补充正文字段 (原地修改并返回)"""
+    texts = get_article_texts([item.get("id") for item in items], fields, conn=conn)
+    for item in items:
+        found = texts.get(item.get("id"), {})
+        for field in fields:
+            item[field] = found.get(field, "")
+    return items
+
+def maybe_train_text_dictionary():
+    """新增正文足够多时 (重新) 训练正文压缩字典，之后入库的正文使用新字典"""
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    try:
+        dict_id = text_store.maybe_train(conn)
+        conn.commit()
+        return dict_id
+    except Exception as e:
+        print(f"[DB] 训练正文压缩字典失败: {e}")
+        return None
+    finally:
+        conn.close()
+
+def _init_data_version_schema(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS data_versions (
+        scope TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0,
+        updated_at TEXT
+    )''')
+
+def _init_reprocess_schema(c):
+    # 历史文章重新分析任务及断点 (last_id 之前的文章已处理完成)，由 reprocess.py 维护
+    c.execute('''CREATE TABLE IF NOT EXISTS reprocess_runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        filters TEXT,
+        status TEXT NOT NULL,
+        total INTEGER DEFAULT 0,
+        processed INTEGER DEFAULT 0,
+        failed INTEGER DEFAULT 0,
+        retained INTEGER DEFAULT 0,
+        last_id INTEGER DEFAULT 0,
+        created_at TEXT,
+        updated_at TEXT,
+        finished_at TEXT
+    )''')
+
+def _init_near_duplicate_schema(c):
+    # 近似重复检测: MinHash 签名与 LSH 分桶，由 analysis.near_duplicate 维护
+    try:
+        c.execute("SELECT duplicate_of FROM articles LIMIT 1")
+    except sqlite3.OperationalError:
+        print("[DB] 检测到 articles 表缺失 duplicate_of 列，正在添加...")
+        c.execute("ALTER TABLE articles ADD COLUMN duplicate_of INTEGER")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_articles_duplicate_of ON articles(duplicate_of)")
+    c.execute('''CREATE TABLE IF NOT EXISTS article_signatures (
+        article_id INTEGER PRIMARY KEY,
+        title_sig BLOB,
+        body_sig BLOB,
+        created_at TEXT
+    )''')
+    c.execute('''CREATE TABLE IF NOT EXISTS article_lsh (
+        kind TEXT NOT NULL,
+        band INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        article_id INTEGER NOT NULL,
+        PRIMARY KEY (kind, band, bucket, article_id)
+    ) WITHOUT ROWID''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_article_lsh_article ON article_lsh(article_id)")
+
+def _init_event_schema(c):
+    # 事件聚类: 同一项目/船舶的多篇报道归为一个事件，由 analysis.event_clustering 维护
+    try:
+        c.execute("SELECT event_id FROM articles LIMIT 1")
+    except sqlite3.OperationalError:
+        print("[DB] 检测到 articles 表缺失 event_id 列，正在添加...")
+        c.execute("ALTER TABLE articles ADD COLUMN event_id INTEGER")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_articles_event_id ON articles(event_id)")
+    c.execute('''CREATE TABLE IF NOT EXISTS event_clusters (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT,
+        category TEXT,
+        article_count INTEGER DEFAULT 0,
+        first_seen TEXT,
+        last_seen TEXT,
+        entities TEXT,
+        updated_at TEXT
+    )''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_event_clusters_last_seen ON event_clusters(last_seen)")
+    c.execute('''CREATE TABLE IF NOT EXISTS article_event_features (
+        article_id INTEGER PRIMARY KEY,
+        signature BLOB,
+        entities TEXT,
+        created_at TEXT
+    )''')
+    c.execute('''CREATE TABLE IF NOT EXISTS article_event_lsh (
+        band INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        article_id INTEGER NOT NULL,
+        PRIMARY KEY (band, bucket, article_id)
+    ) WITHOUT ROWID''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_article_event_lsh_article ON article_event_lsh(article_id)")
+
+def bump_data_version(scope, conn=None):
+    """递增指定范围 (articles / ships) 的数据版本号并返回新版本；传入 conn 时随调用方事务一起提交"""
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(DATA_VERSION_SCOPES[scope], timeout=30)
+    try:
+        conn.execute(
+            """
+            INSERT INTO data_versions (scope, version, updated_at) VALUES (?, 1, ?)
+            ON CONFLICT(scope) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at
+            """,
+            (scope, datetime.now().isoformat())
+        )
+        version = conn.execute("SELECT version FROM data_versions WHERE scope = ?", (scope,)).fetchone()[0]
+        if own_conn:
+            conn.commit()
+        return version
+    except sqlite3.OperationalError as e:
+        print(f"[DB] 更新数据版本失败 {scope}: {e}")
+        return None
+    finally:
+        if own_conn:
+            conn.close()
+
+def get_data_version(scope, conn=None):
+    """读取指定范围的数据版本号，表不存在时返回 0"""
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(DATA_VERSION_SCOPES[scope])
+    try:
+        row = conn.execute("SELECT version FROM data_versions WHERE scope = ?", (scope,)).fetchone()
+        return row[0] if row else 0
+    except sqlite3.OperationalError:
+        return 0
+    finally:
+        if own_conn:
+            conn.close()
+
+def rebuild_article_rollups():
+    """从 articles 全量重建文章日汇总表，返回汇总行数"""
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    c = conn.cursor()
+    try:
+        _rebuild_rollups(c)
+        conn.commit()
+        c.execute("SELECT COUNT(*) FROM article_daily_stats")
+        return c.fetchone()[0]
+    except Exception as e:
+        print(f"[DB] 重建文章日汇总失败: {e}")
+        conn.rollback()
+        return 0
+    finally:
+        conn.close()
+
+def get_readonly_connection(db_path=None):
+    """获取当前线程复用的只读连接 (行工厂为 sqlite3.Row)，供 Dashboard 查询线程池使用"""
+    db_path = db_path or DB_PATH
+    conns = getattr(_readonly_local, "conns", None)
+    if conns is None:
+        conns = _readonly_local.conns = {}
+    conn = conns.get(db_path)
+    if conn is None:
+        uri = f"{Path(db_path).resolve().as_uri()}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, timeout=10)
+        conn.row_factory = sqlite3.Row
+        conns[db_path] = conn
+    return conn
+
+def close_readonly_connections():
+    """关闭当前线程缓存的只读连接"""
+    conns = getattr(_readonly_local, "conns", None) or {}
+    for conn in conns.values():
+        try:
+            conn.close()
+        except Exception:
+            pass
+    _readonly_local.conns = {}
+
+# 每艘船的最新位置，由追踪任务随轨迹写入同步维护
+# version 取写入时 ships 范围的数据版本号，用于增量同步 (get_latest_positions)
+LATEST_POSITION_COLUMNS = ["mmsi", "lat", "lng", "speed", "heading", "status_raw", "timestamp", "vessel_name"]
+
+def _init_latest_position_schema(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS ship_latest_positions (
+        mmsi TEXT PRIMARY KEY,
+        lat REAL,
+        lng REAL,
+        speed REAL,
+        heading REAL,
+        status_raw TEXT,
+        timestamp TEXT,
+        vessel_name TEXT,
+        version INTEGER NOT NULL DEFAULT 0
+    )''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_latest_positions_version ON ship_latest_positions(version)")
+    c.execute("SELECT 1 FROM ship_latest_positions LIMIT 1")
+    if c.fetchone() is None:
+        # 首次创建时从历史轨迹回填
+        c.execute('''
+            INSERT OR REPLACE INTO ship_latest_positions (mmsi, lat, lng, speed, heading, status_raw, timestamp, vessel_name)
+            SELECT t.mmsi, t.lat, t.lng, t.speed, t.heading, t.status_raw, t.timestamp, t.vessel_name
+            FROM ship_tracks t
+            JOIN (
+                SELECT mmsi, MAX(timestamp) AS max_ts
+                FROM ship_tracks
+                GROUP BY mmsi
+            ) latest
+            ON t.mmsi = latest.mmsi AND t.timestamp = latest.max_ts
+        ''')
+        if c.rowcount > 0:
+            print(f"[DB] 已回填船舶最新位置表 ship_latest_positions: {c.rowcount} 艘")
+    _init_position_rtree_schema(c)
+
+def _init_position_rtree_schema(c):
+    """最新位置的 R-tree 空间索引，由触发器随 ship_latest_positions 同步维护"""
+    c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='ship_positions_rtree'")
+    if c.fetchone() is not None:
+        return
+    try:
+        c.execute("CREATE VIRTUAL TABLE ship_positions_rtree USING rtree(id, min_lat, max_lat, min_lng, max_lng)")
+    except sqlite3.OperationalError as e:
+        # 部分 SQLite 编译版本不含 rtree 模块，空间查询回退为全表扫描
+        print(f"[DB] 当前 SQLite 不支持 rtree，跳过空间索引: {e}")
+        return
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_latest_positions_rtree_insert
+        AFTER INSERT ON ship_latest_positions
+        WHEN NEW.lat IS NOT NULL AND NEW.lng IS NOT NULL
+        BEGIN
+            INSERT OR REPLACE INTO ship_positions_rtree (id, min_lat, max_lat, min_lng, max_lng)
+            VALUES (NEW.rowid, NEW.lat, NEW.lat, NEW.lng, NEW.lng);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_latest_positions_rtree_update
+        AFTER UPDATE OF lat, lng ON ship_latest_positions
+        BEGIN
+            DELETE FROM ship_positions_rtree WHERE id = OLD.rowid;
+            INSERT INTO ship_positions_rtree (id, min_lat, max_lat, min_lng, max_lng)
+            SELECT NEW.rowid, NEW.lat, NEW.lat, NEW.lng, NEW.lng
+            WHERE NEW.lat IS NOT NULL AND NEW.lng IS NOT NULL;
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_latest_positions_rtree_delete
+        AFTER DELETE ON ship_latest_positions
+        BEGIN
+            DELETE FROM ship_positions_rtree WHERE id = OLD.rowid;
+        END
+    ''')
+    c.execute('''
+        INSERT INTO ship_positions_rtree (id, min_lat, max_lat, min_lng, max_lng)
+        SELECT rowid, lat, lat, lng, lng FROM ship_latest_positions
+        WHERE lat IS NOT NULL AND lng IS NOT NULL
+    ''')
+    print("[DB] 已构建船舶位置空间索引 ship_positions_rtree")
+
+def _init_geofence_schema(c):
+    # 船舶当前所在的电子围栏 与 进出围栏事件
+    c.execute('''CREATE TABLE IF NOT EXISTS geofence_states (
+        mmsi TEXT NOT NULL,
+        fence_id TEXT NOT NULL,
+        entered_at TEXT,
+        PRIMARY KEY (mmsi, fence_id)
+    ) WITHOUT ROWID''')
+    c.execute('''CREATE TABLE IF NOT EXISTS geofence_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        mmsi TEXT NOT NULL,
+        fence_id TEXT NOT NULL,
+        fence_name TEXT,
+        event TEXT NOT NULL,
+        lat REAL,
+        lng REAL,
+        timestamp TEXT,
+        created_at TEXT
+    )''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_geofence_events_fence ON geofence_events(fence_id, timestamp)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_geofence_events_mmsi ON geofence_events(mmsi, timestamp)")
+
+def _init_activity_schema(c):
+    # 船舶作业分段 (航行 / 疏浚作业 / 停泊)，由 analysis.ship_activity 维护
+    c.execute('''CREATE TABLE IF NOT EXISTS ship_activity_segments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        mmsi TEXT NOT NULL,
+        activity TEXT NOT NULL,
+        start_time TEXT NOT NULL,
+        end_time TEXT NOT NULL,
+        duration_s REAL,
+        distance_m REAL,
+        area_km2 REAL,
+        avg_speed_kn REAL,
+        point_count INTEGER,
+        start_lat REAL,
+        start_lng REAL,
+        end_lat REAL,
+        end_lng REAL,
+        min_lat REAL,
+        min_lng REAL,
+        max_lat REAL,
+        max_lng REAL,
+        is_open INTEGER DEFAULT 0,
+        updated_at TEXT,
+        UNIQUE (mmsi, start_time)
+    )''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_activity_time ON ship_activity_segments(start_time, end_time)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_activity_type_time ON ship_activity_segments(activity, start_time)")
+
+def has_position_rtree(conn):
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='ship_positions_rtree'").fetchone()
+    return row is not None
+
+def query_positions_in_bbox(min_lat, min_lng, max_lat, max_lng, conn=None):
+    """
+    查询经纬度范围内的船舶最新位置 (有 rtree 时走空间索引)
+
+    Returns:
+        [(mmsi, lat, lng, speed, heading, status_raw, timestamp, vessel_name)]
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(TRACK_DB_PATH)
+    try:
+        columns = ", ".join(f"p.{col}" for col in LATEST_POSITION_COLUMNS)
+        if has_position_rtree(conn):
+            # rtree 以 32 位浮点存储坐标，范围略微放宽后再精确过滤
+            eps = 1e-4
+            rows = conn.execute(
+                f"""
+                SELECT {columns}
+                FROM ship_positions_rtree r
+                JOIN ship_latest_positions p ON p.rowid = r.id
+                WHERE r.max_lat >= ? AND r.min_lat <= ? AND r.max_lng >= ? AND r.min_lng <= ?
+                """,
+                (min_lat - eps, max_lat + eps, min_lng - eps, max_lng + eps)
+            ).fetchall()
+        else:
+            rows = conn.execute(f"SELECT {columns} FROM ship_latest_positions p").fetchall()
+        return [
+            tuple(row) for row in rows
+            if row[1] is not None and row[2] is not None
+            and min_lat <= row[1] <= max_lat and min_lng <= row[2] <= max_lng
+        ]
+    finally:
+        if own_conn:
+            conn.close()
+
+def upsert_latest_position(conn, mmsi, lat, lng, speed, heading, status_raw, timestamp, vessel_name, version):
+    """写入单船最新位置 (与轨迹写入在同一事务内)"""
+    conn.execute(
+        """
+        INSERT INTO ship_latest_positions (mmsi, lat, lng, speed, heading, status_raw, timestamp, vessel_name, version)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(mmsi) DO UPDATE SET
+            lat = excluded.lat,
+            lng = excluded.lng,
+            speed = excluded.speed,
+            heading = excluded.heading,
+            status_raw = excluded.status_raw,
+            timestamp = excluded.timestamp,
+            vessel_name = COALESCE(excluded.vessel_name, vessel_name),
+            version = excluded.version
+        """,
+        (mmsi, lat, lng, speed, heading, status_raw, timestamp, vessel_name, version or 0)
+    )
+
+def get_latest_positions(since_version=0, conn=None):
+    """获取 version 大于 since_version 的船舶最新位置 (since_version=0 返回全部)"""
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(TRACK_DB_PATH)
+    try:
+        columns = ", ".join(LATEST_POSITION_COLUMNS)
+        if since_version and since_version > 0:
+            rows = conn.execute(
+                f"SELECT {columns} FROM ship_latest_positions WHERE version > ? ORDER BY mmsi",
+                (since_version,)
+            ).fetchall()
+        else:
+            rows = conn.execute(f"SELECT {columns} FROM ship_latest_positions ORDER BY mmsi").fetchall()
+        return [tuple(row) for row in rows]
+    finally:
+        if own_conn:
+            conn.close()
+
 def init_track_db():
     """初始化轨迹数据库"""
     conn = sqlite3.connect(TRACK_DB_PATH)
     c = conn.cursor()
+    # WAL 模式: Dashboard 读取与追踪任务写入互不阻塞
+    c.execute("PRAGMA journal_mode=WAL")
     c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='ships'")
     ships_exists = c.fetchone() is not None
     c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='ship_infos'")
@@ -70,6 +753,10 @@ def init_track_db():
         speed REAL,
         heading REAL
     )''')
+    _init_data_version_schema(c)
+    _init_latest_position_schema(c)
+    _init_geofence_schema(c)
+    _init_activity_schema(c)
 
     conn.commit()
     conn.close()
@@ -80,8 +767,10 @@ def init_db():
     # 1. 初始化轨迹库
     init_track_db()
 
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, timeout=SCHEMA_LOCK_TIMEOUT)
     c = conn.cursor()
+    # WAL 模式: Dashboard 读取与采集/分析写入互不阻塞
+    c.execute("PRAGMA journal_mode=WAL")
     
     # 1. 文章表 (Articles) - 存储原始抓取信息
     c.execute('''CREATE TABLE IF NOT EXISTS articles (
@@ -93,8 +782,6 @@ def init_db():
         source_type TEXT,
         source_name TEXT,
         summary_cn TEXT,
-        full_text_cn TEXT,
-        content TEXT,
         screenshot_path TEXT,
         is_significant BOOLEAN,
         vl_desc TEXT,
@@ -168,39 +855,49 @@ def init_db():
             print(f"[DB] 添加 category 列失败: {e}")
 
     try:
-        c.execute("SELECT full_text_cn FROM articles LIMIT 1")
+        c.execute("SELECT remark FROM articles LIMIT 1")
     except sqlite3.OperationalError:
-        print("[DB] 检测到 articles 表缺失 full_text_cn 列，正在添加...")
+        print("[DB] 检测到 articles 表缺失 remark 列，正在添加...")
         try:
-            c.execute("ALTER TABLE articles ADD COLUMN full_text_cn TEXT")
-            print("[DB] 已成功添加 full_text_cn 列")
+            c.execute("ALTER TABLE articles ADD COLUMN remark TEXT")
+            print("[DB] 已成功添加 remark 列")
         except Exception as e:
-            print(f"[DB] 添加 full_text_cn 列失败: {e}")
+            print(f"[DB] 添加 remark 列失败: {e}")
 
     try:
-        c.execute("SELECT content FROM articles LIMIT 1")
+        c.execute("SELECT stat_date FROM articles LIMIT 1")
     except sqlite3.OperationalError:
-        print("[DB] 检测到 articles 表缺失 content 列，正在添加...")
+        print("[DB] 检测到 articles 表缺失 stat_date 列，正在添加...")
         try:
-            c.execute("ALTER TABLE articles ADD COLUMN content TEXT")
-            print("[DB] 已成功添加 content 列")
+            c.execute("ALTER TABLE articles ADD COLUMN stat_date TEXT")
+            c.execute(f"UPDATE articles SET stat_date = {STAT_DATE_SQL}")
+            print("[DB] 已成功添加 stat_date 列")
         except Exception as e:
-            print(f"[DB] 添加 content 列失败: {e}")
+            print(f"[DB] 添加 stat_date 列失败: {e}")
 
-    try:
-        c.execute("SELECT remark FROM articles LIMIT 1")
-    except sqlite3.OperationalError:
-        print("[DB] 检测到 articles 表缺失 remark 列，正在添加...")
-        try:
-            c.execute("ALTER TABLE articles ADD COLUMN remark TEXT")
-            print("[DB] 已成功添加 remark 列")
-        except Exception as e:
-            print(f"[DB] 添加 remark 列失败: {e}")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_articles_created_at ON articles(created_at)")
+    # 统计改为读取日汇总表，不再需要覆盖索引
+    c.execute("DROP INDEX IF EXISTS idx_articles_stats")
+    _init_rollup_schema(c)
+    texts_migrated = _init_article_text_schema(c)
+    _init_fulltext_schema(c)
+    _init_data_version_schema(c)
+    _init_reprocess_schema(c)
+    _init_near_duplicate_schema(c)
+    _init_event_schema(c)
 
+    # 旧版事件表已废弃，事件聚类见 event_clusters
     c.execute("DROP TABLE IF EXISTS events")
     c.execute("DROP TABLE IF EXISTS event_groups")
     
     conn.commit()
+    if texts_migrated:
+        # 正文迁出后回收 articles 表释放的页面
+        try:
+            conn.execute("VACUUM")
+            print("[DB] 已完成 VACUUM")
+        except sqlite3.OperationalError as e:
+            print(f"[DB] VACUUM 未完成 ({e})，可稍后执行 python text_store.py vacuum")
     conn.close()
     print(f"[DB] 数据库已初始化: {DB_PATH}")
 
@@ -227,6 +924,8 @@ def add_ship_track(mmsi, lat, lng, speed, heading, status_raw, timestamp, vessel
                 LIMIT 5000
             ) AND mmsi = ?
         ''', (mmsi, mmsi))
+        version = bump_data_version("ships", conn=conn)
+        upsert_latest_position(conn, mmsi, lat, lng, speed, heading, status_raw, timestamp, vessel_name, version)
         
         conn.commit()
         return True
@@ -237,10 +936,12 @@ def add_ship_track(mmsi, lat, lng, speed, heading, status_raw, timestamp, vessel
     finally:
         conn.close()
 
-def get_ship_tracks(mmsi, days=3):
-    """获取船舶历史轨迹"""
+def get_ship_tracks(mmsi, days=3, conn=None):
+    """获取船舶历史轨迹 (传入 conn 时复用该连接且不关闭)"""
     from datetime import timedelta
-    conn = sqlite3.connect(TRACK_DB_PATH)
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(TRACK_DB_PATH)
     c = conn.cursor()
     
     start_time = (datetime.now() - timedelta(days=days)).isoformat()
@@ -268,7 +969,8 @@ def get_ship_tracks(mmsi, days=3):
         print(f"[DB] 获取轨迹失败: {e}")
         return []
     finally:
-        conn.close()
+        if own_conn:
+            conn.close()
 
 def upsert_ships(ships):
     """批量插入或更新船舶记录"""
@@ -332,6 +1034,7 @@ def upsert_ships(ships):
                 ),
             )
             updated += 1
+        bump_data_version("ships", conn=conn)
         conn.commit()
         return updated
     except Exception as e:
@@ -361,6 +1064,8 @@ def update_ship_status(mmsi, status, status_date, location, region, country=None
             (status, status_date, location, region, datetime.now().isoformat(), 
              country, continent, province, city, speed, heading, mmsi),
         )
+        if c.rowcount:
+            bump_data_version("ships", conn=conn)
         conn.commit()
         return c.rowcount
     except Exception as e:
@@ -370,10 +1075,13 @@ def update_ship_status(mmsi, status, status_date, location, region, country=None
     finally:
         conn.close()
 
-def save_article(article_data):
+def save_article(article_data, conn=None):
+    """保存或更新文章；传入 conn 时复用该连接 (批量写入)"""
     if not article_data:
         return False
-    conn = sqlite3.connect(DB_PATH)
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
     try:
         url = article_data.get('url')
@@ -406,8 +1114,6 @@ def save_article(article_data):
                     source_type = COALESCE(NULLIF(?, ''), source_type),
                     source_name = COALESCE(NULLIF(?, ''), source_name),
                     summary_cn = COALESCE(NULLIF(?, ''), summary_cn),
-                    full_text_cn = COALESCE(NULLIF(?, ''), full_text_cn),
-                    content = COALESCE(NULLIF(?, ''), content),
                 screenshot_path = COALESCE(NULLIF(?, ''), screenshot_path),
                 is_significant = COALESCE(?, is_significant),
                 vl_desc = COALESCE(NULLIF(?, ''), vl_desc),
@@ -425,8 +1131,6 @@ def save_article(article_data):
                 article_data.get('source_type', ''),
                 article_data.get('source_name', ''),
                 article_data.get('summary_cn', ''),
-                article_data.get('full_text_cn', ''),
-                article_data.get('content', ''),
                 article_data.get('screenshot_path', ''),
                 article_data.get('significant', None),
                 article_data.get('image_desc', ''),
@@ -438,6 +1142,9 @@ def save_article(article_data):
                 article_id
             )
         )
+            c.execute(f"UPDATE articles SET stat_date = {STAT_DATE_SQL} WHERE id = ?", (article_id,))
+            save_article_texts(c, article_id, article_data.get('content'), article_data.get('full_text_cn'))
+            bump_data_version("articles", conn=conn)
             conn.commit()
             return True
         else:
@@ -468,8 +1175,8 @@ def save_article(article_data):
             except:
                 pass
             c.execute('''INSERT INTO articles 
-            (url, title, title_cn, pub_date, source_type, source_name, summary_cn, full_text_cn, content, screenshot_path, is_significant, vl_desc, category, is_hidden, valid, is_retained, remark, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            (url, title, title_cn, pub_date, source_type, source_name, summary_cn, screenshot_path, is_significant, vl_desc, category, is_hidden, valid, is_retained, remark, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
                 (
                     article_data['url'],
                     article_data['title'],
@@ -478,8 +1185,6 @@ def save_article(article_data):
                     article_data.get('source_type', 'unknown'),
                     article_data.get('source_name', ''),
                     article_data.get('summary_cn', ''),
-                    article_data.get('full_text_cn', ''),
-                    article_data.get('content', ''),
                     article_data.get('screenshot_path', ''),
                     article_data.get('significant', False),
                     article_data.get('image_desc', ''),
@@ -491,6 +1196,10 @@ def save_article(article_data):
                     datetime.now().isoformat()
                 )
             )
+            article_id = c.lastrowid
+            c.execute(f"UPDATE articles SET stat_date = {STAT_DATE_SQL} WHERE id = ?", (article_id,))
+            save_article_texts(c, article_id, article_data.get('content'), article_data.get('full_text_cn'))
+            bump_data_version("articles", conn=conn)
             conn.commit()
             return True
     except Exception as e:
@@ -498,7 +1207,8 @@ def save_article(article_data):
         conn.rollback()
         return False
     finally:
-        conn.close()
+        if own_conn:
+            conn.close()
 
 def add_ship_simple(name, mmsi):
     """添加新船舶（仅名称和MMSI）"""
@@ -507,6 +1217,7 @@ def add_ship_simple(name, mmsi):
     try:
         c.execute("INSERT INTO ship_infos (name, mmsi, updated_at) VALUES (?, ?, ?)",
                   (name, mmsi, datetime.now().isoformat()))
+        bump_data_version("ships", conn=conn)
         conn.commit()
         return True
     except Exception as e:
@@ -525,15 +1236,16 @@ def is_article_exists(url):
     conn.close()
     return row is not None
 
-def is_article_processed(url):
+def is_article_processed(url, conn=None):
     """检查文章是否已存在且已分析完成"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(DB_PATH)
     # 判断标准：URL存在，且 (摘要不为空 OR 被标记为保留 OR 被标记为无效)
     # 这样可以避免重复分析已完成或已废弃的文章
-    c.execute("SELECT id, summary_cn, is_retained, valid FROM articles WHERE url = ?", (url,))
-    row = c.fetchone()
-    conn.close()
+    row = conn.execute("SELECT id, summary_cn, is_retained, valid FROM articles WHERE url = ?", (url,)).fetchone()
+    if own_conn:
+        conn.close()
     if not row:
         return False
     
@@ -553,6 +1265,16 @@ def is_article_processed(url):
         
     return False
 
+def save_articles(items):
+    """批量保存文章 (复用同一连接)，返回保存成功的条数"""
+    if not items:
+        return 0
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        return sum(1 for item in items if save_article(item, conn=conn))
+    finally:
+        conn.close()
+
 def save_raw_articles(items):
     """保存原始文章数据，跳过已存在的。返回 (处理总数, 新增文章ID列表)"""
     if not items:
@@ -580,8 +1302,8 @@ def save_raw_articles(items):
                     content = item.get('summary_raw', '')
 
                 c.execute('''INSERT INTO articles
-                    (url, title, pub_date, source_type, source_name, valid, is_hidden, remark, content, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                    (url, title, pub_date, source_type, source_name, valid, is_hidden, remark, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
                     (
                         item['link'],
                         item.get('title', ''),
@@ -591,33 +1313,66 @@ def save_raw_articles(items):
                         valid,
                         is_hidden,
                         remark,
-                        content,
                         datetime.now().isoformat()
                     )
                 )
-                new_ids.append(c.lastrowid)
+                article_id = c.lastrowid
+                new_ids.append(article_id)
+                c.execute(f"UPDATE articles SET stat_date = {STAT_DATE_SQL} WHERE id = ?", (article_id,))
+                save_article_texts(c, article_id, content=content)
             count += 1
         except Exception as e:
             print(f"[DB] 插入文章失败 {item.get('link')}: {e}")
 
+    if new_ids:
+        bump_data_version("articles", conn=conn)
     conn.commit()
     conn.close()
     return count, new_ids
 
-def get_items_for_enrichment(created_after=None, ids=None):
+# 查询辅助函数的默认列 (显式投影)，调用方可通过 columns 只取需要的列；
+# 正文字段 (ARTICLE_TEXT_FIELDS) 只有在 columns 中出现时才从 article_texts 读取
+ARTICLE_QUERY_COLUMNS = frozenset([
+    "id", "url", "title", "title_cn", "pub_date", "source_type", "source_name", "summary_cn",
+    "screenshot_path", "is_significant", "vl_desc", "category", "is_hidden", "valid", "is_retained",
+    "remark", "stat_date", "duplicate_of", "event_id", "created_at",
+]) | frozenset(ARTICLE_TEXT_FIELDS)
+# 补充采集/分析后由 save_article 写回，category/remark 需要带上以免被推断值覆盖
+ENRICHMENT_COLUMNS = ("id", "url", "title", "pub_date", "source_type", "source_name", "category",
+                      "screenshot_path", "valid", "remark", "created_at", "content")
+ANALYSIS_COLUMNS = ("id", "url", "title", "pub_date", "source_type", "source_name", "category",
+                    "screenshot_path", "created_at", "content")
+REPORT_ARTICLE_COLUMNS = ("id", "title", "title_cn", "url", "pub_date", "summary_cn", "screenshot_path",
+                          "vl_desc", "created_at", "source_type", "source_name", "valid", "category", "is_retained")
+TIME_RANGE_COLUMNS = ("id", "title", "title_cn", "url", "pub_date", "summary_cn", "screenshot_path",
+                      "vl_desc", "created_at", "source_type", "source_name", "valid", "category")
+
+def _select_articles(conn, columns, where_sql, params=()):
+    """按列投影查询 articles，返回字典列表 (正文字段随后按 id 批量读取)"""
+    unknown = [col for col in columns if col not in ARTICLE_QUERY_COLUMNS]
+    if unknown:
+        raise ValueError(f"未知的文章列: {unknown}")
+    article_cols = [col for col in columns if col not in ARTICLE_TEXT_FIELDS]
+    text_fields = tuple(col for col in columns if col in ARTICLE_TEXT_FIELDS)
+    if "id" not in article_cols and text_fields:
+        article_cols.insert(0, "id")
+    rows = conn.execute(f"SELECT {', '.join(article_cols)} FROM articles {where_sql}", tuple(params)).fetchall()
+    items = [dict(zip(article_cols, row)) for row in rows]
+    if text_fields:
+        attach_article_texts(items, text_fields, conn=conn)
+    return items
+
+def get_items_for_enrichment(created_after=None, ids=None, columns=ENRICHMENT_COLUMNS):
     """获取需要补充采集的条目: valid=1 且 (无内容 或 无截图) 且 5天内"""
     from datetime import timedelta
     conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
     # 计算5天前的日期
     cutoff = (datetime.now() - timedelta(days=5)).strftime("%Y-%m-%d")
     
-    query = '''
-        SELECT * FROM articles 
+    query = f'''
         WHERE valid = 1 
         AND (pub_date >= ? OR pub_date IS NULL OR pub_date = '')
-        AND (content IS NULL OR content = '' OR screenshot_path IS NULL OR screenshot_path = '')
+        AND ({article_text_missing_sql("content")} OR screenshot_path IS NULL OR screenshot_path = '')
     '''
     params = [cutoff]
     
@@ -632,25 +1387,22 @@ def get_items_for_enrichment(created_after=None, ids=None):
         
     query += " ORDER BY created_at DESC"
     
-    c.execute(query, tuple(params))
-    rows = c.fetchall()
-    items = [dict(row) for row in rows]
+    try:
+        items = _select_articles(conn, columns, query, params)
+    finally:
+        conn.close()
     # 映射 key 以匹配 info_acquisition 的 expectations
     for item in items:
-        item['link'] = item['url']
-    conn.close()
+        item['link'] = item.get('url')
     return items
 
-def get_items_for_analysis(created_after=None, ids=None):
+def get_items_for_analysis(created_after=None, ids=None, columns=ANALYSIS_COLUMNS):
     """获取需要分析的条目: valid=1 且 有内容 且 尚未分析(summary_cn为空)"""
     conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
     
-    query = '''
-        SELECT * FROM articles 
+    query = f'''
         WHERE valid = 1 
-        AND (content IS NOT NULL AND content != '')
+        AND NOT {article_text_missing_sql("content")}
         AND (summary_cn IS NULL OR summary_cn = '')
     '''
     params = []
@@ -666,25 +1418,23 @@ def get_items_for_analysis(created_after=None, ids=None):
         
     query += " ORDER BY created_at DESC"
     
-    c.execute(query, tuple(params))
-    rows = c.fetchall()
-    items = [dict(row) for row in rows]
+    try:
+        items = _select_articles(conn, columns, query, params)
+    finally:
+        conn.close()
     for item in items:
-        item['link'] = item['url']
-    conn.close()
+        item['link'] = item.get('url')
     return items
 
-def get_recent_retained_articles(hours=24):
+def get_recent_retained_articles(hours=24, columns=REPORT_ARTICLE_COLUMNS):
     """获取最近保留的文章 (用于生成报告)"""
+    from datetime import timedelta
     conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
     cutoff = (datetime.now() - timedelta(hours=hours)).isoformat()
-    c.execute("SELECT * FROM articles WHERE is_retained=1 AND created_at >= ? ORDER BY pub_date DESC", (cutoff,))
-    rows = c.fetchall()
-    items = [dict(row) for row in rows]
-    conn.close()
-    return items
+    try:
+        return _select_articles(conn, columns, "WHERE is_retained=1 AND created_at >= ? ORDER BY pub_date DESC", (cutoff,))
+    finally:
+        conn.close()
 
 def get_articles_by_urls(urls):
     if not urls:
@@ -694,36 +1444,144 @@ def get_articles_by_urls(urls):
     c = conn.cursor()
     placeholders = ",".join(["?"] * len(urls))
     query = f'''
-        SELECT id, title, url, pub_date, summary_cn, full_text_cn, content, screenshot_path, vl_desc, source_type, source_name, valid
+        SELECT id, title, url, pub_date, summary_cn, screenshot_path, vl_desc, source_type, source_name, valid
         FROM articles
         WHERE url IN ({placeholders})
     '''
     c.execute(query, urls)
     rows = c.fetchall()
+    items = attach_article_texts([dict(row) for row in rows], conn=conn)
     conn.close()
-    return [dict(row) for row in rows]
+    return items
 
-def get_articles_by_time_range(start_time, end_time):
+def get_screenshot_ref_counts():
+    """统计每个截图文件被 articles.screenshot_path 引用的次数 (按文件名)"""
     conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
     c = conn.cursor()
-    query = '''
-        SELECT 
-            id, title, title_cn, url, pub_date, summary_cn, full_text_cn, content,
-            screenshot_path, vl_desc, created_at, source_type, source_name, valid, category
-        FROM articles
-        WHERE created_at BETWEEN ? AND ?
-        ORDER BY created_at DESC
-    '''
-    c.execute(query, (start_time, end_time))
-    rows = c.fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
+    try:
+        c.execute('''
+            SELECT screenshot_path, COUNT(*)
+            FROM articles
+            WHERE screenshot_path IS NOT NULL AND screenshot_path != ''
+            GROUP BY screenshot_path
+        ''')
+        refs = {}
+        for path, count in c.fetchall():
+            name = os.path.basename(str(path))
+            refs[name] = refs.get(name, 0) + count
+        return refs
+    finally:
+        conn.close()
+
+def replace_screenshot_path(old_path, new_path):
+    """将引用旧截图路径的文章改为引用新路径，返回更新条数"""
+    conn = sqlite3.connect(DB_PATH, timeout=10)
+    c = conn.cursor()
+    try:
+        c.execute("UPDATE articles SET screenshot_path = ? WHERE screenshot_path = ?", (new_path, old_path))
+        updated = c.rowcount
+        if updated:
+            bump_data_version("articles", conn=conn)
+        conn.commit()
+        return updated
+    except Exception as e:
+        print(f"[DB] 更新截图路径失败: {e}")
+        conn.rollback()
+        return 0
+    finally:
+        conn.close()
+
+def get_articles_by_time_range(start_time, end_time, conn=None, columns=TIME_RANGE_COLUMNS):
+    """按入库时间获取文章 (默认不含正文，columns 中包含正文字段时一并读取)"""
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(DB_PATH)
+    try:
+        return _select_articles(
+            conn, columns, "WHERE created_at BETWEEN ? AND ? ORDER BY created_at DESC", (start_time, end_time)
+        )
+    finally:
+        if own_conn:
+            conn.close()
+
+def get_article_statistics(start_date, end_date, conn=None):
+    """
+    按入库日期范围 (YYYY-MM-DD, 含首尾) 从日汇总表聚合文章统计
+
+    Returns:
+        (分类计数列表, (分类, 统计日期, 数量) 列表, 前 20 来源计数列表)
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    category_expr = "COALESCE(NULLIF(NULLIF(category, ''), 'None'), 'Unknown')"
+    source_expr = "CASE WHEN source_name IN ('', 'None') THEN NULLIF(source_type, '') ELSE source_name END"
+    try:
+        c.execute(f'''
+            SELECT {category_expr} AS cat, SUM(cnt) AS n
+            FROM article_daily_stats
+            WHERE day BETWEEN ? AND ?
+            GROUP BY cat
+            ORDER BY n DESC, cat
+        ''', (start_date, end_date))
+        category_counts = [(row[0], row[1]) for row in c.fetchall()]
+
+        c.execute(f'''
+            SELECT {category_expr} AS cat, stat_date, SUM(cnt)
+            FROM article_daily_stats
+            WHERE day BETWEEN ? AND ? AND stat_date != ''
+            GROUP BY cat, stat_date
+        ''', (start_date, end_date))
+        trend_counts = [(row[0], row[1], row[2]) for row in c.fetchall()]
+
+        c.execute(f'''
+            SELECT {source_expr} AS src, SUM(cnt) AS n
+            FROM article_daily_stats
+            WHERE day BETWEEN ? AND ?
+            GROUP BY src
+            ORDER BY n DESC, src
+            LIMIT 20
+        ''', (start_date, end_date))
+        source_counts = [(row[0], row[1]) for row in c.fetchall()]
+    finally:
+        if own_conn:
+            conn.close()
+    return category_counts, trend_counts, source_counts
+
+def get_daily_visible_counts(start_date, conn=None):
+    """
+    从日汇总表获取 start_date (YYYY-MM-DD) 起每天入库的有效未隐藏文章数，以及历史总数
 
-def get_articles_by_time_range_strict(start_time, end_time, is_retained=None):
+    Returns:
+        ([(日期, 数量)], 历史总数)
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    try:
+        c.execute('''
+            SELECT day, SUM(cnt)
+            FROM article_daily_stats
+            WHERE day >= ? AND is_hidden = 0 AND valid = 1
+            GROUP BY day
+            ORDER BY day ASC
+        ''', (start_date,))
+        daily = [(row[0], row[1]) for row in c.fetchall()]
+        c.execute("SELECT COALESCE(SUM(cnt), 0) FROM article_daily_stats WHERE is_hidden = 0 AND valid = 1")
+        total = c.fetchone()[0]
+    finally:
+        if own_conn:
+            conn.close()
+    return daily, total
+
+def get_articles_by_time_range_strict(start_time, end_time, is_retained=None, conn=None):
     """仅按时间窗口获取有效且未隐藏的文章 (优先使用入库时间 created_at，确保日报包含最新抓取的内容)"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(DB_PATH)
+        conn.row_factory = sqlite3.Row
     c = conn.cursor()
     
     # 逻辑修改：
@@ -732,9 +1590,9 @@ def get_articles_by_time_range_strict(start_time, end_time, is_retained=None):
     
     query = '''
         SELECT 
-            a.id, a.title, a.title_cn, a.url, a.pub_date, a.summary_cn, a.full_text_cn, a.content, 
+            a.id, a.title, a.title_cn, a.url, a.pub_date, a.summary_cn,
             a.screenshot_path, a.vl_desc, a.created_at, a.source_type, a.source_name, a.valid,
-            a.category, a.is_retained
+            a.category, a.is_retained, a.event_id
         FROM articles a
         WHERE 
           a.created_at >= ? AND a.created_at <= ?
@@ -751,7 +1609,8 @@ def get_articles_by_time_range_strict(start_time, end_time, is_retained=None):
 
     c.execute(query, tuple(params))
     rows = c.fetchall()
-    conn.close()
+    if own_conn:
+        conn.close()
     results = []
     for row in rows:
         item = dict(row)
@@ -763,15 +1622,24 @@ def get_articles_by_time_range_strict(start_time, end_time, is_retained=None):
 # 初始化
 # init_db()
 
-def get_all_ships():
-    """获取所有船舶信息"""
-    conn = sqlite3.connect(TRACK_DB_PATH) # 迁移至 TRACK_DB_PATH
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    c.execute("SELECT * FROM ship_infos")
-    rows = c.fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
+SHIP_COLUMNS = ("id", "imo", "mmsi", "name", "company", "type", "capacity_1", "capacity_2", "region",
+                "location", "status", "status_date", "remarks", "updated_at", "country", "continent",
+                "province", "city", "speed", "heading")
+
+def get_all_ships(conn=None, columns=SHIP_COLUMNS):
+    """获取所有船舶信息 (columns 指定需要的列)"""
+    unknown = [col for col in columns if col not in SHIP_COLUMNS]
+    if unknown:
+        raise ValueError(f"未知的船舶列: {unknown}")
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(TRACK_DB_PATH) # 迁移至 TRACK_DB_PATH
+    try:
+        rows = conn.execute(f"SELECT {', '.join(columns)} FROM ship_infos").fetchall()
+    finally:
+        if own_conn:
+            conn.close()
+    return [dict(zip(columns, row)) for row in rows]
 
 def update_ship_mmsi(ship_id, mmsi):
     """更新船舶MMSI"""
@@ -779,6 +1647,7 @@ def update_ship_mmsi(ship_id, mmsi):
     c = conn.cursor()
     try:
         c.execute("UPDATE ship_infos SET mmsi = ?, updated_at = ? WHERE id = ?", (mmsi, datetime.now().isoformat(), ship_id))
+        bump_data_version("ships", conn=conn)
         conn.commit()
         return True
     except Exception as e:
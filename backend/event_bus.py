@@ -0,0 +1,113 @@
+"""
+实时事件总线
+
+采集/分析任务与船舶追踪运行在调度进程中，Dashboard 运行在独立进程中。
+写入方把事件追加到 data/event_bus.db，Dashboard 单个后台任务按自增 id 增量读取
+后推送给所有 SSE 连接，客户端数量不影响数据库压力。
+
+频道:
+- article: 分析流程保存了一篇文章
+- ships: 追踪任务写入的船舶位置增量
+- geofence: 船舶进出电子围栏事件
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import config
+
+EVENT_BUS_PATH = os.path.join(config.DATA_DIR, 'event_bus.db')
+
+# 事件只用于实时推送与断线补发，保留 1 天即可
+RETENTION_HOURS = 24
+PRUNE_EVERY = 200
+
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def init_bus():
+    """创建事件表并开启 WAL (WAL 模式写入数据库文件，之后的连接无需再设置)"""
+    global _schema_ready
+    with _schema_lock:
+        if _schema_ready:
+            return
+        conn = sqlite3.connect(EVENT_BUS_PATH, timeout=10)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute('''CREATE TABLE IF NOT EXISTS bus_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                channel TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            )''')
+            conn.commit()
+        finally:
+            conn.close()
+        _schema_ready = True
+
+
+def _connect():
+    # 每个进程只建一次表，SSE 轮询的连接只执行查询
+    if not _schema_ready:
+        init_bus()
+    return sqlite3.connect(EVENT_BUS_PATH, timeout=10)
+
+
+def publish(channel, payload):
+    """追加一条事件，返回事件 id；总线不可用时只打印错误，不影响写入方"""
+    try:
+        conn = _connect()
+        try:
+            c = conn.cursor()
+            c.execute(
+                "INSERT INTO bus_events (channel, payload, created_at) VALUES (?, ?, ?)",
+                (channel, json.dumps(payload, ensure_ascii=False, default=str), datetime.now().isoformat())
+            )
+            event_id = c.lastrowid
+            if event_id % PRUNE_EVERY == 0:
+                cutoff = (datetime.now() - timedelta(hours=RETENTION_HOURS)).isoformat()
+                c.execute("DELETE FROM bus_events WHERE created_at < ?", (cutoff,))
+            conn.commit()
+            return event_id
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"[Bus] 发布事件失败 {channel}: {e}")
+        return None
+
+
+def read_since(last_id, limit=500, conn=None):
+    """读取 id 大于 last_id 的事件，返回 [(id, channel, payload)]"""
+    own_conn = conn is None
+    if own_conn:
+        conn = _connect()
+    try:
+        rows = conn.execute(
+            "SELECT id, channel, payload FROM bus_events WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, limit)
+        ).fetchall()
+        return [(row[0], row[1], json.loads(row[2])) for row in rows]
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def latest_id(conn=None):
+    """当前最新事件 id，没有事件时返回 0"""
+    own_conn = conn is None
+    if own_conn:
+        conn = _connect()
+    try:
+        row = conn.execute("SELECT MAX(id) FROM bus_events").fetchone()
+        return row[0] or 0
+    finally:
+        if own_conn:
+            conn.close()
@@ -0,0 +1,283 @@
+"""
+定时任务运行记录
+
+每次运行写入 data/scheduler.db 的 job_runs 表: 开始/结束时间、耗时、结果、处理条数。
+同名任务同时只允许一条 running 记录，调度进程与手动运行 (run_tasks_manually.py)
+之间也借此互斥，避免重复抓取与重复调用大模型。
+
+状态:
+- running: 运行中
+- success / failed: 正常结束 / 异常结束
+- skipped: 同名任务正在运行或排队已满，本次未执行
+- interrupted: 进程退出时仍为 running (下次启动时清理)
+"""
+
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import config
+
+JOB_RUNS_PATH = os.path.join(config.DATA_DIR, 'scheduler.db')
+# 其他主机上的 running 记录无法检查进程，超过该时长视为已中断
+STALE_RUN_HOURS = 12
+
+RUN_COLUMNS = ["id", "job_name", "trigger", "status", "started_at", "finished_at", "duration_s",
+               "items_processed", "detail", "error", "host", "pid"]
+
+
+def _connect():
+    conn = sqlite3.connect(JOB_RUNS_PATH, timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute('''CREATE TABLE IF NOT EXISTS job_runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        job_name TEXT NOT NULL,
+        trigger TEXT,
+        status TEXT NOT NULL,
+        started_at TEXT NOT NULL,
+        finished_at TEXT,
+        duration_s REAL,
+        items_processed INTEGER,
+        detail TEXT,
+        error TEXT,
+        host TEXT,
+        pid INTEGER
+    )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_job_runs_job ON job_runs(job_name, started_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_job_runs_status ON job_runs(status)")
+    return conn
+
+
+def _pid_exists(pid):
+    """检查本机进程是否存在 (Windows 上 os.kill(pid, 0) 会发送 CTRL_C_EVENT，不能用作探测)"""
+    if not pid or pid <= 0:
+        return False
+    if os.name == "nt":
+        import ctypes
+        PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+        STILL_ACTIVE = 259
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            # 拒绝访问说明进程存在但属于其他用户
+            return ctypes.GetLastError() == 5
+        try:
+            exit_code = ctypes.c_ulong()
+            if not kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)):
+                return True
+            return exit_code.value == STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+def _is_alive(host, pid, started_at):
+    if host != socket.gethostname():
+        try:
+            return datetime.now() - datetime.fromisoformat(started_at) < timedelta(hours=STALE_RUN_HOURS)
+        except (TypeError, ValueError):
+            return False
+    return _pid_exists(pid)
+
+
+def start_run(job_name, trigger="schedule"):
+    """
+    登记一次运行，返回 run_id；同名任务仍在运行时登记为 skipped 并返回 None
+    """
+    now = datetime.now().isoformat()
+    host = socket.gethostname()
+    conn = _connect()
+    try:
+        # 检查与登记在同一个写事务内完成，多个进程同时启动时只有一个能拿到
+        conn.execute("BEGIN IMMEDIATE")
+        running = conn.execute(
+            "SELECT id, host, pid, started_at FROM job_runs WHERE job_name = ? AND status = 'running'",
+            (job_name,)
+        ).fetchall()
+        for run_id, run_host, run_pid, started_at in running:
+            if _is_alive(run_host, run_pid, started_at):
+                conn.execute(
+                    "INSERT INTO job_runs (job_name, trigger, status, started_at, finished_at, duration_s, error, host, pid) "
+                    "VALUES (?, ?, 'skipped', ?, ?, 0, ?, ?, ?)",
+                    (job_name, trigger, now, now, f"run {run_id} still running (pid {run_pid}@{run_host})", host, os.getpid())
+                )
+                conn.commit()
+                return None
+            conn.execute(
+                "UPDATE job_runs SET status = 'interrupted', finished_at = ? WHERE id = ?",
+                (now, run_id)
+            )
+        cur = conn.execute(
+            "INSERT INTO job_runs (job_name, trigger, status, started_at, host, pid) VALUES (?, ?, 'running', ?, ?, ?)",
+            (job_name, trigger, now, host, os.getpid())
+        )
+        conn.commit()
+        return cur.lastrowid
+    finally:
+        conn.close()
+
+
+def finish_run(run_id, status, items_processed=None, detail=None, error=None):
+    """记录运行结束"""
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT started_at FROM job_runs WHERE id = ?", (run_id,)).fetchone()
+        finished = datetime.now()
+        duration = (finished - datetime.fromisoformat(row[0])).total_seconds() if row else None
+        conn.execute(
+            """
+            UPDATE job_runs
+            SET status = ?, finished_at = ?, duration_s = ?, items_processed = ?, detail = ?, error = ?
+            WHERE id = ?
+            """,
+            (status, finished.isoformat(), duration, items_processed,
+             json.dumps(detail, ensure_ascii=False, default=str) if detail is not None else None,
+             error, run_id)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def record_skipped(job_name, trigger, reason):
+    """记录一次未执行的运行 (如排队已满)"""
+    now = datetime.now().isoformat()
+    conn = _connect()
+    try:
+        conn.execute(
+            "INSERT INTO job_runs (job_name, trigger, status, started_at, finished_at, duration_s, error, host, pid) "
+            "VALUES (?, ?, 'skipped', ?, ?, 0, ?, ?, ?)",
+            (job_name, trigger, now, now, reason, socket.gethostname(), os.getpid())
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def mark_interrupted(pid=None):
+    """将本机指定进程 (默认当前进程) 遗留的 running 记录标记为 interrupted"""
+    conn = _connect()
+    try:
+        cur = conn.execute(
+            "UPDATE job_runs SET status = 'interrupted', finished_at = ? WHERE status = 'running' AND host = ? AND pid = ?",
+            (datetime.now().isoformat(), socket.gethostname(), pid or os.getpid())
+        )
+        conn.commit()
+        return cur.rowcount
+    finally:
+        conn.close()
+
+
+def list_runs(job_name=None, status=None, limit=20, conn=None):
+    """最近的运行记录 (新到旧)"""
+    own_conn = conn is None
+    if own_conn:
+        conn = _connect()
+    try:
+        where = []
+        params = []
+        if job_name:
+            where.append("job_name = ?")
+            params.append(job_name)
+        if status:
+            where.append("status = ?")
+            params.append(status)
+        where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+        rows = conn.execute(
+            f"SELECT {', '.join(RUN_COLUMNS)} FROM job_runs {where_sql} ORDER BY id DESC LIMIT ?",
+            params + [limit]
+        ).fetchall()
+        return [dict(zip(RUN_COLUMNS, row)) for row in rows]
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def job_summary(days=7, conn=None):
+    """各任务近 days 天的运行次数、失败/跳过次数、平均耗时与最近一次运行"""
+    own_conn = conn is None
+    if own_conn:
+        conn = _connect()
+    try:
+        since = (datetime.now() - timedelta(days=days)).isoformat()
+        rows = conn.execute(
+            """
+            SELECT job_name,
+                   COUNT(*),
+                   SUM(status = 'failed'),
+                   SUM(status = 'skipped'),
+                   AVG(CASE WHEN status = 'success' THEN duration_s END),
+                   MAX(CASE WHEN status = 'success' THEN duration_s END),
+                   SUM(COALESCE(items_processed, 0))
+            FROM job_runs
+            WHERE started_at >= ?
+            GROUP BY job_name
+            ORDER BY job_name
+            """,
+            (since,)
+        ).fetchall()
+        summary = []
+        for job_name, runs, failed, skipped, avg_duration, max_duration, items in rows:
+            last = list_runs(job_name, limit=1, conn=conn)
+            summary.append({
+                "job_name": job_name,
+                "runs": runs,
+                "failed": failed or 0,
+                "skipped": skipped or 0,
+                "avg_duration_s": round(avg_duration, 1) if avg_duration is not None else None,
+                "max_duration_s": round(max_duration, 1) if max_duration is not None else None,
+                "items_processed": items or 0,
+                "last_run": last[0] if last else None,
+            })
+        return summary
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def _format_duration(seconds):
+    if seconds is None:
+        return "-"
+    if seconds >= 60:
+        return f"{seconds / 60:.1f}m"
+    return f"{seconds:.1f}s"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="定时任务运行记录")
+    sub = parser.add_subparsers(dest="action")
+    runs_parser = sub.add_parser("runs", help="最近的运行记录")
+    runs_parser.add_argument("--job", help="任务名 (fetch / push / ship_tracker / asset_gc / track_archive)")
+    runs_parser.add_argument("--status", choices=["running", "success", "failed", "skipped", "interrupted"])
+    runs_parser.add_argument("--limit", type=int, default=20)
+    summary_parser = sub.add_parser("summary", help="各任务运行统计")
+    summary_parser.add_argument("--days", type=int, default=7)
+    sub.add_parser("running", help="正在运行的任务")
+    args = parser.parse_args()
+
+    if args.action == "summary":
+        for item in job_summary(days=args.days):
+            last = item["last_run"] or {}
+            print(f"{item['job_name']:<14} 运行 {item['runs']:<4} 失败 {item['failed']:<3} 跳过 {item['skipped']:<3} "
+                  f"平均 {_format_duration(item['avg_duration_s']):<7} 最长 {_format_duration(item['max_duration_s']):<7} "
+                  f"处理 {item['items_processed']:<6} 最近 {last.get('started_at', '-')[:19]} {last.get('status', '-')}")
+    else:
+        status = "running" if args.action == "running" else getattr(args, "status", None)
+        for run in list_runs(getattr(args, "job", None), status=status, limit=getattr(args, "limit", 20)):
+            line = (f"#{run['id']:<5} {run['job_name']:<14} {run['status']:<11} {run['trigger'] or '-':<9} "
+                    f"{run['started_at'][:19]}  {_format_duration(run['duration_s']):<7} items={run['items_processed'] if run['items_processed'] is not None else '-'}")
+            if run["error"]:
+                line += f"  {run['error'][:80]}"
+            print(line)
@@ -1,20 +1,24 @@
 import asyncio
-import json
 import analysis.info_analysis as info_analysis
+import analysis.near_duplicate as near_duplicate
+import analysis.event_clustering as event_clustering
+import analysis.semantic_index as semantic_index
 import reporting.report_generation as report_generation
 import config
 import os
+import sqlite3
 import time
 from datetime import datetime, timedelta
 from email.utils import parsedate_to_datetime
 from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
-from playwright.async_api import async_playwright
 
 import database
-from static.constants import JUNK_TITLES_EXACT, JUNK_KEYWORDS_PARTIAL
+import shared_resources
+from static.constants import JUNK_TITLES_EXACT, JUNK_KEYWORDS_MATCHER
 
 # 新的采集模块
 from acquisition.source_manager import SourceManager
+from acquisition.source_config import get_source_catalog
 from acquisition.sources.wechat import WeChatSource
 
 
@@ -76,9 +80,9 @@ def is_valid_article(item):
         return False, f"命中垃圾标题({title})"
         
     # 4. 包含匹配系统错误信息
-    for kw in JUNK_KEYWORDS_PARTIAL:
-        if kw.lower() in title.lower():
-            return False, f"命中系统错误关键词({kw})"
+    kw = JUNK_KEYWORDS_MATCHER.first_label(title)
+    if kw:
+        return False, f"命中系统错误关键词({kw})"
             
     # 5. 特殊模式检查
     title_lower = title.lower()
@@ -106,9 +110,7 @@ def write_scheduler_log(message):
 def load_source_count():
     """读取采集源数量"""
     try:
-        with open(config.SOURCES_FILE, "r", encoding="utf-8") as f:
-            sources = json.load(f)
-        return len(sources)
+        return len(get_source_catalog(config.SOURCES_FILE))
     except Exception:
         return 0
 
@@ -206,17 +208,9 @@ async def fetch_wechat_articles() -> list:
     
     # 从 SOURCES_FILE 加载微信公众号配置
     try:
-        with open(config.SOURCES_FILE, "r", encoding="utf-8") as f:
-            file_sources = json.load(f)
-            for src in file_sources:
-                if src.get("type") == "wechat" and src.get("fakeid"):
-                    existing_fakeids = [b.get("fakeid") for b in wechat_biz_list]
-                    if src.get("fakeid") not in existing_fakeids:
-                        wechat_biz_list.append({
-                            "name": src.get("name"),
-                            "fakeid": src.get("fakeid")
-                        })
-                        print(f"已加载微信源: {src.get('name')}")
+        for account in get_source_catalog(config.SOURCES_FILE).wechat_accounts():
+            wechat_biz_list.append(account)
+            print(f"已加载微信源: {account['name']}")
     except Exception as e:
         print(f"加载微信源失败: {e}")
         return []
@@ -240,9 +234,198 @@ async def fetch_wechat_articles() -> list:
     return all_items
 
 
+def triage_raw_items(raw_items, conn=None):
+    """
+    采集条目入库前的筛选: 任务内去重、已处理跳过、过期与无效标记
+
+    逐条写库，在线程池中调用 (不阻塞调度器事件循环)，全程复用同一数据库连接。
+    返回 (audit_rows, pending_map, pub_date_map, 统计计数)
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(database.DB_PATH, timeout=30)
+    try:
+        # 去重 & 状态更新 (更新数据库中的 valid/remark 状态)
+        skipped_count = 0
+        duplicate_count = 0
+        outdated_count = 0
+        processed_count = 0 # 已存在且已处理的数量
+        audit_rows = []
+        pending_map = {}
+        pub_date_map = {}
+        seen_links = set()
+
+        for item in raw_items:
+
+            # 基础数据补全
+            if not item.get("pub_date") and item.get("date"):
+                item["pub_date"] = item.get("date")
+            if not item.get("source_name") and item.get("source"):
+                item["source_name"] = item.get("source")
+            if not item.get("source_type") and item.get("source"):
+                item["source_type"] = "wechat"
+
+            # 准备更新到数据库的字段
+            db_update = {
+                "url": item.get('link'),
+                "source_name": item.get("source_name"),
+                "source_type": item.get("source_type"),
+                "pub_date": item.get("pub_date"),
+                # 默认保持 valid=1 (由 save_raw_articles 设置), 除非下面显式改为 0
+            }
+
+            # 1. 基础非空检查
+            if not item.get("title") or not item.get("link"):
+                skipped_count += 1
+                audit_rows.append({
+                    "site": item.get("source_name", ""),
+                    "title": item.get("title", ""),
+                    "link": item.get("link", ""),
+                    "pub_date": item.get("pub_date"),
+                    "source_type": item.get("source_type"),
+                    "keep": False,
+                    "remark": "标题或链接为空"
+                })
+                # 标记为无效
+                db_update["valid"] = 0
+                db_update["remark"] = "标题或链接为空"
+                database.save_article(db_update, conn=conn)
+                continue
+
+            # 2. 本次任务内去重
+            if item['link'] in seen_links:
+                duplicate_count += 1
+                audit_rows.append({
+                    "site": item.get("source_name", ""),
+                    "title": item.get("title", ""),
+                    "link": item.get("link", ""),
+                    "pub_date": item.get("pub_date"),
+                    "source_type": item.get("source_type"),
+                    "keep": False,
+                    "remark": "重复链接(任务内)"
+                })
+                continue
+
+            seen_links.add(item['link'])
+            pub_date_map[item['link']] = item.get("pub_date")
+
+            # 3. 数据库已存在检查 (避免重复处理已完成的文章)
+            # 如果文章已存在且已分析完成（或被废弃），则跳过后续更新
+            if database.is_article_processed(item['link'], conn=conn):
+                processed_count += 1
+                audit_rows.append({
+                    "site": item.get("source_name", ""),
+                    "title": item.get("title", ""),
+                    "link": item.get("link", ""),
+                    "pub_date": item.get("pub_date"),
+                    "source_type": item.get("source_type"),
+                    "keep": False, # 这里的 keep 仅用于 audit 表格显示，实际状态在库里
+                    "remark": "已存在且已处理"
+                })
+                continue
+
+            # 4. 处理采集阶段过滤的条目（入库但标记为无效）
+            if item.get("filtered_reason"):
+                item["valid"] = 0
+                item["is_hidden"] = 1
+                item["remark"] = f"采集阶段过滤: {item.get('filtered_reason')}"
+
+                db_update["valid"] = 0
+                db_update["is_hidden"] = 1
+                db_update["remark"] = item["remark"]
+                database.save_article(db_update, conn=conn)
+
+                audit_rows.append({
+                    "site": item.get("source_name", ""),
+                    "title": item.get("title", ""),
+                    "link": item.get("link", ""),
+                    "pub_date": item.get("pub_date"),
+                    "source_type": item.get("source_type"),
+                    "keep": False,
+                    "remark": item["remark"]
+                })
+                continue
+
+            # 5. 发布时间拦截（5天）
+            pub_dt = parse_pub_datetime(item.get("pub_date"))
+
+            # 对于Web/Official源，如果缺少时间，允许通过（等待后续enrich补充）
+            # 对于RSS/WeChat，通常已有时间，若缺则直接丢弃
+            allow_missing_date = item.get("source_type") in ["web", "official", "rsshub"]
+
+            if not pub_dt:
+                if not allow_missing_date:
+                    outdated_count += 1
+                    db_update["valid"] = 0
+                    db_update["remark"] = "发布时间缺失"
+                    database.save_article(db_update, conn=conn)
+
+                    audit_rows.append({
+                        "site": item.get("source_name", ""),
+                        "title": item.get("title", ""),
+                        "link": item.get("link", ""),
+                        "pub_date": item.get("pub_date"),
+                        "source_type": item.get("source_type"),
+                        "keep": False,
+                        "remark": "发布时间缺失"
+                    })
+                    continue
+                # else: pass through, valid remains 1 (default)
+            elif datetime.now() - pub_dt > timedelta(days=5):
+                outdated_count += 1
+                db_update["valid"] = 0
+                db_update["remark"] = "发布时间早于5天(已入库)"
+                database.save_article(db_update, conn=conn)
+
+                audit_rows.append({
+                    "site": item.get("source_name", ""),
+                    "title": item.get("title", ""),
+                    "link": item.get("link", ""),
+                    "pub_date": item.get("pub_date"),
+                    "source_type": item.get("source_type"),
+                    "keep": False,
+                    "remark": "发布时间早于5天(已入库)"
+                })
+                continue
+
+            # 有效条目，确保数据库更新（主要是 source_name/type/pub_date 可能有变化）
+            # 并且确保 valid=1 (虽然默认是1，但显式更新更好)
+            db_update["valid"] = 1
+            # 清空可能的旧 remark (如之前被标为无效) -> 暂时不清除，保留历史 remark 也许更好？
+            # 不，如果是新的一轮采集发现有效，应该清除旧的错误 remark
+            # 但 save_article 使用 COALESCE(NULLIF(?, ''), remark)，传入 '' 会被 NULLIF 变 NULL，然后保持原值
+            # 所以无法清除 remark。除非修改 save_article 或传入特殊值。
+            # 暂时忽略清除 remark 的需求。
+            database.save_article(db_update, conn=conn)
+
+            # 加入 audit 待分析
+            audit_rows.append({
+                "site": item.get("source_name", ""),
+                "title": item.get("title", ""),
+                "link": item.get("link", ""),
+                "pub_date": item.get("pub_date"),
+                "source_type": item.get("source_type"),
+                "keep": False,
+                "remark": "待分析"
+            })
+            pending_map[item['link']] = len(audit_rows) - 1
+
+        counts = {
+            "skipped": skipped_count,
+            "duplicate": duplicate_count,
+            "outdated": outdated_count,
+            "processed": processed_count,
+        }
+        return audit_rows, pending_map, pub_date_map, counts
+    finally:
+        if own_conn:
+            conn.close()
+
+
 async def main():
-    # 初始化数据库
-    database.init_db()
+    # 在调度器事件循环中运行: 数据库读写放到线程中执行，避免阻塞同一循环上的其他任务
+    # 初始化数据库 (首次升级时的数据迁移可能耗时较长)
+    await asyncio.to_thread(database.init_db)
 
     start_time = time.time()
     print(f"=== 疏浚情报极简系统启动 ===")
@@ -278,181 +461,17 @@ async def main():
 
     # --- 改动：采集阶段立即入库 (不重复) ---
     print(f"正在保存原始数据到数据库...")
-    total_scanned, new_ids = database.save_raw_articles(raw_items)
+    total_scanned, new_ids = await asyncio.to_thread(database.save_raw_articles, raw_items)
     new_inserted_count = len(new_ids)
     print(f"入库完成: 扫描 {total_scanned} 条, 实际新增 {new_inserted_count} 条")
+    if new_ids:
+        await asyncio.to_thread(database.maybe_train_text_dictionary)
     
-    # 去重 & 状态更新 (更新数据库中的 valid/remark 状态)
-    items = [] # 这里的 items 仅用于记录本次处理的有效条目(内存中)，用于后续流程参考(如统计)
-               # 实际流程将转向从数据库读取
-    
-    skipped_count = 0
-    duplicate_count = 0
-    outdated_count = 0
-    processed_count = 0 # 已存在且已处理的数量
-    audit_rows = []
-    pending_map = {}
-    pub_date_map = {}
-    seen_links = set()
+    audit_rows, pending_map, pub_date_map, counts = await asyncio.to_thread(triage_raw_items, raw_items)
+    skipped_count = counts["skipped"]
+    outdated_count = counts["outdated"]
+    processed_count = counts["processed"]
 
-    for item in raw_items:
-
-        # 基础数据补全
-        if not item.get("pub_date") and item.get("date"):
-            item["pub_date"] = item.get("date")
-        if not item.get("source_name") and item.get("source"):
-            item["source_name"] = item.get("source")
-        if not item.get("source_type") and item.get("source"):
-            item["source_type"] = "wechat"
-        normalized_link = normalize_article_url(item.get('link'))
-        if normalized_link:
-            item['link'] = normalized_link
-
-        # 准备更新到数据库的字段
-        db_update = {
-            "url": item.get('link'),
-            "source_name": item.get("source_name"),
-            "source_type": item.get("source_type"),
-            "pub_date": item.get("pub_date"),
-            # 默认保持 valid=1 (由 save_raw_articles 设置), 除非下面显式改为 0
-        }
-
-        # 1. 基础非空检查
-        if not item.get("title") or not item.get("link"):
-            skipped_count += 1
-            audit_rows.append({
-                "site": item.get("source_name", ""),
-                "title": item.get("title", ""),
-                "link": item.get("link", ""),
-                "pub_date": item.get("pub_date"),
-                "source_type": item.get("source_type"),
-                "keep": False,
-                "remark": "标题或链接为空"
-            })
-            # 标记为无效
-            db_update["valid"] = 0
-            db_update["remark"] = "标题或链接为空"
-            database.save_article(db_update)
-            continue
-
-        # 2. 本次任务内去重
-        if item['link'] in seen_links:
-            duplicate_count += 1
-            audit_rows.append({
-                "site": item.get("source_name", ""),
-                "title": item.get("title", ""),
-                "link": item.get("link", ""),
-                "pub_date": item.get("pub_date"),
-                "source_type": item.get("source_type"),
-                "keep": False,
-                "remark": "重复链接(任务内)"
-            })
-            continue
-        
-        seen_links.add(item['link'])
-        pub_date_map[item['link']] = item.get("pub_date")
-
-        # 3. 数据库已存在检查 (避免重复处理已完成的文章)
-        # 如果文章已存在且已分析完成（或被废弃），则跳过后续更新
-        if database.is_article_processed(item['link']):
-            processed_count += 1
-            audit_rows.append({
-                "site": item.get("source_name", ""),
-                "title": item.get("title", ""),
-                "link": item.get("link", ""),
-                "pub_date": item.get("pub_date"),
-                "source_type": item.get("source_type"),
-                "keep": False, # 这里的 keep 仅用于 audit 表格显示，实际状态在库里
-                "remark": "已存在且已处理"
-            })
-            continue
-
-        # 4. 处理采集阶段过滤的条目（入库但标记为无效）
-        if item.get("filtered_reason"):
-            item["valid"] = 0
-            item["is_hidden"] = 1
-            item["remark"] = f"采集阶段过滤: {item.get('filtered_reason')}"
-            
-            db_update["valid"] = 0
-            db_update["is_hidden"] = 1
-            db_update["remark"] = item["remark"]
-            database.save_article(db_update)
-            
-            audit_rows.append({
-                "site": item.get("source_name", ""),
-                "title": item.get("title", ""),
-                "link": item.get("link", ""),
-                "pub_date": item.get("pub_date"),
-                "source_type": item.get("source_type"),
-                "keep": False,
-                "remark": item["remark"]
-            })
-            continue
-
-        # 5. 发布时间拦截（5天）
-        pub_dt = parse_pub_datetime(item.get("pub_date"))
-        
-        # 对于Web/Official源，如果缺少时间，允许通过（等待后续enrich补充）
-        # 对于RSS/WeChat，通常已有时间，若缺则直接丢弃
-        allow_missing_date = item.get("source_type") in ["web", "official", "rsshub"]
-        
-        if not pub_dt:
-            if not allow_missing_date:
-                outdated_count += 1
-                db_update["valid"] = 0
-                db_update["remark"] = "发布时间缺失"
-                database.save_article(db_update)
-                
-                audit_rows.append({
-                    "site": item.get("source_name", ""),
-                    "title": item.get("title", ""),
-                    "link": item.get("link", ""),
-                    "pub_date": item.get("pub_date"),
-                    "source_type": item.get("source_type"),
-                    "keep": False,
-                    "remark": "发布时间缺失"
-                })
-                continue
-            # else: pass through, valid remains 1 (default)
-        elif datetime.now() - pub_dt > timedelta(days=5):
-            outdated_count += 1
-            db_update["valid"] = 0
-            db_update["remark"] = "发布时间早于5天(已入库)"
-            database.save_article(db_update)
-            
-            audit_rows.append({
-                "site": item.get("source_name", ""),
-                "title": item.get("title", ""),
-                "link": item.get("link", ""),
-                "pub_date": item.get("pub_date"),
-                "source_type": item.get("source_type"),
-                "keep": False,
-                "remark": "发布时间早于5天(已入库)"
-            })
-            continue
-
-        # 有效条目，确保数据库更新（主要是 source_name/type/pub_date 可能有变化）
-        # 并且确保 valid=1 (虽然默认是1，但显式更新更好)
-        db_update["valid"] = 1
-        # 清空可能的旧 remark (如之前被标为无效) -> 暂时不清除，保留历史 remark 也许更好？
-        # 不，如果是新的一轮采集发现有效，应该清除旧的错误 remark
-        # 但 save_article 使用 COALESCE(NULLIF(?, ''), remark)，传入 '' 会被 NULLIF 变 NULL，然后保持原值
-        # 所以无法清除 remark。除非修改 save_article 或传入特殊值。
-        # 暂时忽略清除 remark 的需求。
-        database.save_article(db_update)
-
-        # 加入 audit 待分析
-        audit_rows.append({
-            "site": item.get("source_name", ""),
-            "title": item.get("title", ""),
-            "link": item.get("link", ""),
-            "pub_date": item.get("pub_date"),
-            "source_type": item.get("source_type"),
-            "keep": False,
-            "remark": "待分析"
-        })
-        pending_map[item['link']] = len(audit_rows) - 1
-    
     print(f"过滤掉 {skipped_count} 条垃圾/无效信息")
     print(f"跳过 {processed_count} 条已处理信息")
     print(f"超期入库 {outdated_count} 条")
@@ -460,45 +479,55 @@ async def main():
         f"采集统计: 源站点{sources_count} 潜在消息{len(raw_items)} 新增入库{new_inserted_count} 跳过已处理{processed_count} 过滤无效{skipped_count} 超期入库{outdated_count}"
     )
 
+    # 近似重复检测 (补充采集前): 不同站点转载的同一条新闻只保留最早入库的一篇
+    duplicates = await near_duplicate.dedupe_articles(new_ids) if new_ids else []
+    for dup in duplicates:
+        if dup["url"] in pending_map:
+            audit_rows[pending_map.pop(dup["url"])]["remark"] = f"近似重复(#{dup['canonical_id']})"
+    if duplicates:
+        print(f"近似重复 {len(duplicates)} 条，跳过补充采集与分析")
+
     # --- 改动：从数据库获取需要补充采集的条目 ---
     t2_start = time.time()
     # 逻辑：valid=1 且 (无内容 或 无截图) 且 5天内
     # 处理所有需要补充采集的条目（包括本次新增和之前未完成的）
-    items_to_enrich = database.get_items_for_enrichment()
+    items_to_enrich = await asyncio.to_thread(database.get_items_for_enrichment)
     
     if items_to_enrich:
         print(f"正在对 {len(items_to_enrich)} 条条目进行补充采集(从数据库读取)...")
         try:
-            async with async_playwright() as p:
-                browser = await manager.launch_browser(p)
-                context = await browser.new_context(
-                    viewport={"width": 1280, "height": 800},
-                    user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
-                    locale="zh-CN",
-                    ignore_https_errors=True
-                )
+            # 复用调度进程中的共享浏览器，每次只新建上下文
+            browser = await shared_resources.get_browser()
+            context = await browser.new_context(
+                viewport={"width": 1280, "height": 800},
+                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
+                locale="zh-CN",
+                ignore_https_errors=True
+            )
+            try:
                 # 使用新的管理器进行补充采集
                 await manager.enrich_items(items_to_enrich, context)
-                await browser.close()
+            finally:
+                await context.close()
+            
+            # 补充采集后，更新回数据库，并再次检查时间
+            for item in items_to_enrich:
+                # 检查时间：如果之前没时间，现在有了，需要检查是否过期
+                # 注意：enrich_web_items 会修改 item["pub_date"]
+                pub_dt = parse_pub_datetime(item.get("pub_date"))
+                
+                # 再次检查：如果没有时间，不再自动补充为当前时间！(响应用户需求)
+                if not pub_dt:
+                    # 仍然无时间，标记为无效
+                    item["valid"] = 0
+                    item["remark"] = (item.get("remark") or "") + " (补充采集仍无时间)"
+                elif datetime.now() - pub_dt > timedelta(days=5):
+                    item["valid"] = 0
+                    item["remark"] = "补充采集后判定过期"
+
+            # 保存更新 (content, screenshot, pub_date, valid, remark)
+            await asyncio.to_thread(database.save_articles, items_to_enrich)
                 
-                # 补充采集后，更新回数据库，并再次检查时间
-                for item in items_to_enrich:
-                    # 检查时间：如果之前没时间，现在有了，需要检查是否过期
-                    # 注意：enrich_web_items 会修改 item["pub_date"]
-                    pub_dt = parse_pub_datetime(item.get("pub_date"))
-                    
-                    # 再次检查：如果没有时间，不再自动补充为当前时间！(响应用户需求)
-                    if not pub_dt:
-                        # 仍然无时间，标记为无效
-                        item["valid"] = 0
-                        item["remark"] = (item.get("remark") or "") + " (补充采集仍无时间)"
-                    elif datetime.now() - pub_dt > timedelta(days=5):
-                        item["valid"] = 0
-                        item["remark"] = "补充采集后判定过期"
-                    
-                    # 保存更新 (content, screenshot, pub_date, valid, remark)
-                    database.save_article(item)
-                    
         except Exception as e:
             print(f"补充采集失败: {e}")
     t2_end = time.time()
@@ -515,7 +544,18 @@ async def main():
     print(">>> 阶段2: 智能分析(从数据库读取)...")
 
     # 分析所有需要分析的条目（包括本次新增和之前未完成的）
-    analysis_items = database.get_items_for_analysis()
+    analysis_items = await asyncio.to_thread(database.get_items_for_analysis)
+
+    # 近似重复检测 (模型分析前): 补充采集后正文完整，再比较一次正文
+    if analysis_items:
+        late_duplicates = await near_duplicate.dedupe_articles([item["id"] for item in analysis_items])
+        if late_duplicates:
+            duplicate_ids = {dup["id"] for dup in late_duplicates}
+            for dup in late_duplicates:
+                if dup["url"] in pending_map:
+                    audit_rows[pending_map.pop(dup["url"])]["remark"] = f"近似重复(#{dup['canonical_id']})"
+            analysis_items = [item for item in analysis_items if item["id"] not in duplicate_ids]
+            print(f"近似重复 {len(late_duplicates)} 条，跳过模型分析")
     
     if analysis_items:
 
@@ -559,6 +599,7 @@ async def main():
 
     cutoff_dt = datetime.now() - timedelta(days=5)
     kept_results = []
+    outdated_results = []
     for r in results or []:
         link_key = r.get("url") if isinstance(r, dict) else None
         if isinstance(r, dict):
@@ -572,7 +613,7 @@ async def main():
                 if r.get("is_retained", 0) == 1:
                     r["is_retained"] = 0
                     r["remark"] = "发布时间早于5天"
-                    database.save_article(r)
+                    outdated_results.append(r)
                 
                 continue
             # 优先使用分析结果中的时间，如果没有则回退到 map
@@ -600,15 +641,37 @@ async def main():
                 else:
                      audit_rows[idx]["remark"] = "未保留 (is_retained=0)"
     
+    if outdated_results:
+        await asyncio.to_thread(database.save_articles, outdated_results)
+
     for link_key, idx in pending_map.items():
         if audit_rows[idx]["remark"] == "待分析":
             audit_rows[idx]["remark"] = "分析未通过(可能提取失败)"
 
+    # 事件聚类: 本次保留的文章并入已有事件或新建事件 (增量，不重新聚类历史文章)
+    analyzed_ids = [r["id"] for r in results or [] if isinstance(r, dict) and r.get("id")]
+    # 原始文章未保留时，其近似重复文章恢复为待分析，避免同一事件的其他报道被连带丢弃
+    released = await asyncio.to_thread(
+        near_duplicate.release_duplicates,
+        [r["id"] for r in results or [] if isinstance(r, dict) and r.get("id") and not r.get("is_retained")]
+    )
+    if released:
+        print(f"近似重复: 原始文章未保留，{len(released)} 篇重复文章恢复待分析")
+    if analyzed_ids:
+        event_stats = await event_clustering.assign_events(analyzed_ids)
+        print(f"事件聚类: 并入已有事件 {event_stats['assigned']} 篇，新建事件 {event_stats['created']} 个")
+        try:
+            # 新分析的文章尚无向量，无需 force；重新分析 (reprocess) 才覆盖旧向量
+            embedded = await semantic_index.index_articles(analyzed_ids)
+            print(f"语义索引: 写入 {embedded} 篇文章向量")
+        except Exception as e:
+            print(f"语义索引更新失败: {e}")
+
     # 3. 存储
     print(">>> 阶段3: 结果已同步至数据库")
     # report_generation.save_history(kept_results) # 移除：info_analysis 已实时保存
     try:
-        write_markdown_audit(audit_rows)
+        await asyncio.to_thread(write_markdown_audit, audit_rows)
     except Exception:
         pass
     write_scheduler_log(f"分析完成: 文章{len(kept_results)}")
@@ -658,7 +721,23 @@ async def main():
     final_log = "\n".join(log_content)
     print(final_log)
     write_scheduler_log(final_log)
+    return {
+        "items": len(analysis_items),
+        "scanned": len(raw_items),
+        "new": new_inserted_count,
+        "analyzed": len(analysis_items),
+        "kept": kept_count,
+        "junk": junk_count,
+        "duration_s": round(total_time, 1),
+    }
+
+async def run_once():
+    """单次运行: 执行完整流程后释放共享浏览器与模型客户端"""
+    try:
+        await main()
+    finally:
+        await shared_resources.close()
 
 if __name__ == "__main__":
     import time  # Ensure time is available if not imported globally
-    asyncio.run(main())
+    asyncio.run(run_once())
@@ -1,19 +1,146 @@
-from fastapi import FastAPI, Query
+from fastapi import FastAPI, Query, HTTPException, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, StreamingResponse
 import uvicorn
+import asyncio
+import base64
+import functools
+import time
 import os
 import sys
-import sqlite3
 import json
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from collections import Counter, defaultdict
+from collections import defaultdict
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import database
 import config
+import asset_store
+import track_archive
+from analysis import track_simplify
+from analysis import geofence
+from analysis import ship_activity
+from analysis import event_clustering
+from analysis import semantic_index
+import event_bus
+import job_runs
+from reporting import response_cache
+from acquisition.source_config import get_source_catalog
 
-app = FastAPI()
+# 阻塞的 SQLite 查询与文件读取统一放到专用线程池执行，避免卡住事件循环
+# 每个工作线程复用自己的只读连接 (database.get_readonly_connection)
+DB_EXECUTOR = ThreadPoolExecutor(max_workers=config.DASHBOARD_DB_WORKERS, thread_name_prefix="dashboard-db")
+
+async def run_db(func, *args, **kwargs):
+    """在数据库线程池中执行阻塞函数"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(DB_EXECUTOR, functools.partial(func, *args, **kwargs))
+
+# 轮询接口的响应缓存，按数据版本号失效 (写入方见 database.bump_data_version)
+RESPONSE_CACHE = response_cache.ResponseCache()
+DATA_VERSION_CHECK_INTERVAL = 1.0
+_data_versions = {"checked_at": 0.0, "versions": {}}
+
+def query_data_versions():
+    return {
+        scope: database.get_data_version(scope, conn=database.get_readonly_connection(path))
+        for scope, path in database.DATA_VERSION_SCOPES.items()
+    }
+
+async def current_data_versions():
+    """读取各数据范围的版本号 (同一秒内的请求共用一次查询)"""
+    now = time.monotonic()
+    if now - _data_versions["checked_at"] >= DATA_VERSION_CHECK_INTERVAL:
+        _data_versions["versions"] = await run_db(query_data_versions)
+        _data_versions["checked_at"] = now
+    return _data_versions["versions"]
+
+def _build_cached_body(versions, ttl, func, *args):
+    return response_cache.CachedBody(response_cache.encode_json(func(*args)), versions=versions, ttl=ttl)
+
+async def cached_json(request, scopes, ttl, func, *args):
+    """
+    执行查询并缓存 JSON 响应
+
+    Args:
+        request: 当前请求 (用于 ETag / Accept-Encoding)
+        scopes: 响应依赖的数据范围，如 ("articles",)
+        ttl: 最长缓存秒数，兜底依赖当前时间的默认参数 (如最近 24 小时)
+        func, args: 数据库线程池中执行的查询函数及其归一化后的参数
+    """
+    all_versions = await current_data_versions()
+    versions = tuple(all_versions.get(scope, 0) for scope in scopes)
+    key = (request.url.path, args)
+    entry = RESPONSE_CACHE.get(key, versions)
+    if entry is None:
+        entry = await run_db(_build_cached_body, versions, ttl, func, *args)
+        RESPONSE_CACHE.put(key, entry)
+    return response_cache.build_response(request, entry)
+
+# 实时推送: 单个后台任务增量读取事件总线 (event_bus) 并分发给所有 SSE 连接
+LIVE_POLL_INTERVAL = 1.0
+LIVE_HEARTBEAT_SECONDS = 15
+LIVE_QUEUE_SIZE = 1000
+
+class LiveBroadcaster:
+    def __init__(self):
+        self.subscribers = set()
+        self.last_id = 0
+        self._task = None
+
+    async def start(self):
+        self.last_id = await run_db(event_bus.latest_id)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=LIVE_QUEUE_SIZE)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    async def _run(self):
+        while True:
+            events = []
+            try:
+                events = await run_db(event_bus.read_since, self.last_id)
+                for event in events:
+                    self.last_id = event[0]
+                    for queue in list(self.subscribers):
+                        try:
+                            queue.put_nowait(event)
+                        except asyncio.QueueFull:
+                            # 消费过慢的连接丢弃事件，客户端可凭 Last-Event-ID 重连补发
+                            pass
+            except Exception as e:
+                print(f"[Live] 读取事件总线失败: {e}")
+            if len(events) < 500:
+                await asyncio.sleep(LIVE_POLL_INTERVAL)
+
+LIVE = LiveBroadcaster()
+
+@asynccontextmanager
+async def lifespan(app):
+    # 只读连接要求数据库文件已存在
+    await run_db(database.init_db)
+    await LIVE.start()
+    yield
+    await LIVE.stop()
+    DB_EXECUTOR.shutdown(wait=False)
+
+app = FastAPI(lifespan=lifespan)
 
 # Mount assets
 app.mount("/assets", StaticFiles(directory=config.ASSETS_DIR), name="assets")
@@ -25,79 +152,98 @@ print(f"[Dashboard] Mounting /static to {STATIC_DIR}")
 os.makedirs(STATIC_DIR, exist_ok=True)
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 
+# 页面模板读入内存并预压缩，文件修改时间变化后重新加载
+PAGE_CHECK_INTERVAL = 2.0
+_page_cache = {}
+
+def load_page(filename):
+    """返回页面模板的缓存内容 (response_cache.CachedBody)，文件不存在时返回 None"""
+    cached = _page_cache.get(filename)
+    now = time.monotonic()
+    if cached and now - cached["checked_at"] < PAGE_CHECK_INTERVAL:
+        return cached["body"]
+    path = os.path.join(config.TEMPLATES_DIR, filename)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        _page_cache.pop(filename, None)
+        return None
+    if cached and cached["mtime"] == mtime:
+        cached["checked_at"] = now
+        return cached["body"]
+    with open(path, "rb") as f:
+        body = response_cache.CachedBody(f.read(), media_type="text/html; charset=utf-8")
+    _page_cache[filename] = {"mtime": mtime, "checked_at": now, "body": body}
+    return body
+
+def serve_page(request, filename):
+    body = load_page(filename)
+    if body is None:
+        raise HTTPException(status_code=404, detail=f"{filename} not found")
+    return response_cache.build_response(request, body)
+
 @app.get("/", response_class=HTMLResponse)
-async def read_root():
-    with open(os.path.join(config.TEMPLATES_DIR, "dashboard.html"), "r", encoding="utf-8") as f:
-        return f.read()
+async def read_root(request: Request):
+    return serve_page(request, "dashboard.html")
 
 @app.get("/vessel_map.html", response_class=HTMLResponse)
-async def vessel_map():
-    with open(os.path.join(config.TEMPLATES_DIR, "vessel_map.html"), "r", encoding="utf-8") as f:
-        return f.read()
+async def vessel_map(request: Request):
+    return serve_page(request, "vessel_map.html")
 
 @app.get("/history.html", response_class=HTMLResponse)
-async def history_page():
-    with open(os.path.join(config.TEMPLATES_DIR, "history.html"), "r", encoding="utf-8") as f:
-        return f.read()
+async def history_page(request: Request):
+    return serve_page(request, "history.html")
 
 @app.get("/statistics.html", response_class=HTMLResponse)
-async def statistics_page():
-    with open(os.path.join(config.TEMPLATES_DIR, "statistics.html"), "r", encoding="utf-8") as f:
-        return f.read()
+async def statistics_page(request: Request):
+    return serve_page(request, "statistics.html")
 
 import traceback
 
 @app.get("/api/events")
 async def get_events(
+    request: Request,
     start: str = Query(None, description="Start time ISO format"),
     end: str = Query(None, description="End time ISO format"),
-    is_retained: int = Query(1, description="Retained filter (1 for retained, 0 for discarded, None for all)")
+    is_retained: int = Query(1, description="Retained filter (1 for retained, 0 for discarded, None for all)"),
+    group: str = Query(None, description="event: 同一事件的多篇报道合并为一条")
 ):
     """获取指定时间范围内的文章 (默认只返回 is_retained=1 的)"""
     try:
-        # Use provided times or default to last 24 hours
+        by_event = group == "event"
         if not start or not end:
-            end_dt = datetime.now()
-            start_dt = end_dt - timedelta(days=1)
-            start = start_dt.isoformat()
-            end = end_dt.isoformat()
-            
-        articles = database.get_articles_by_time_range_strict(start, end, is_retained=is_retained)
-        return {"events": articles}
+            # 默认窗口随时间滑动，缓存最多保留 60 秒
+            return await cached_json(request, ("articles",), 60, query_events, None, None, is_retained, by_event)
+        return await cached_json(request, ("articles",), None, query_events, start, end, is_retained, by_event)
     except Exception as e:
         print(f"Error in get_events: {e}")
         return {"events": [], "error": str(e)}
 
+def query_events(start, end, is_retained, by_event=False):
+    # Use provided times or default to last 24 hours
+    if not start or not end:
+        end_dt = datetime.now()
+        start_dt = end_dt - timedelta(days=1)
+        start = start_dt.isoformat()
+        end = end_dt.isoformat()
+    conn = database.get_readonly_connection(database.DB_PATH)
+    articles = database.get_articles_by_time_range_strict(start, end, is_retained=is_retained, conn=conn)
+    for a in articles:
+        a["thumbnail_path"] = asset_store.thumbnail_path(a.get("screenshot_path"))
+    if by_event:
+        return {"events": event_clustering.group_by_event(articles)}
+    return {"events": articles}
+
 @app.get("/api/stats")
-async def get_stats(days: int = 7):
+async def get_stats(request: Request, days: int = 7):
     """获取最近 N 天的统计数据"""
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=days)
-    
-    # 每天的数据
-    daily_stats = []
-    
-    conn = sqlite3.connect(database.DB_PATH)
-    c = conn.cursor()
-    
-    # 按天统计
-    query = '''
-        SELECT date(a.created_at) as d, count(*) as c
-        FROM articles a
-        WHERE a.created_at >= ? 
-          AND (a.is_hidden = 0 OR a.is_hidden IS NULL)
-          AND (a.valid = 1 OR a.valid IS NULL)
-        GROUP BY date(a.created_at)
-        ORDER BY d ASC
-    '''
-    c.execute(query, (start_date.isoformat(),))
-    rows = c.fetchall()
-    
-    # Get total historical count
-    c.execute("SELECT count(*) FROM articles a WHERE (a.is_hidden = 0 OR a.is_hidden IS NULL) AND (a.valid = 1 OR a.valid IS NULL)")
-    total_count = c.fetchone()[0]
-    
-    conn.close()
+    return await cached_json(request, ("articles",), 300, query_stats, days)
+
+def query_stats(days):
+    # 读取日汇总表，耗时与历史文章数量无关
+    start_date = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+    conn = database.get_readonly_connection(database.DB_PATH)
+    rows, total_count = database.get_daily_visible_counts(start_date, conn=conn)
     
     return {
         "stats": [{"date": r[0], "count": r[1]} for r in rows],
@@ -117,6 +263,7 @@ CATEGORY_CN_MAP = {
 
 @app.get("/api/statistics")
 async def get_statistics(
+    request: Request,
     start: str = Query(None, description="Start date YYYY-MM-DD"),
     end: str = Query(None, description="End date YYYY-MM-DD")
 ):
@@ -125,53 +272,31 @@ async def get_statistics(
     if not end:
         end = datetime.now().strftime("%Y-%m-%d")
         
-    start_time = f"{start}T00:00:00"
-    end_time = f"{end}T23:59:59"
-    
-    articles = database.get_articles_by_time_range(start_time, end_time)
+    return await cached_json(request, ("articles",), None, build_statistics, start, end)
+
+def build_statistics(start, end):
+    # 按入库日期范围读取日汇总表
+    conn = database.get_readonly_connection(database.DB_PATH)
+    category_counts, trend_counts, source_counts = database.get_article_statistics(start, end, conn=conn)
     
     # 1. Category Pie Chart
-    # Use enriched category
-    categories = []
-    for a in articles:
-        cat = a.get('category')
-        if not cat or cat == 'None':
-            cat = 'Unknown'
-        categories.append(cat)
-        
-    cat_counts = Counter(categories)
     # Convert keys to Chinese for display
-    pie_labels = [CATEGORY_CN_MAP.get(k, k) for k in cat_counts.keys()]
-    pie_values = list(cat_counts.values())
+    pie_labels = [CATEGORY_CN_MAP.get(k, k) for k, _ in category_counts]
+    pie_values = [n for _, n in category_counts]
     
     # 2. Trend Line Chart (Category over time)
+    # stat_date 在入库时已归一化为 YYYY-MM-DD (优先发布日期)
     trend_data = defaultdict(lambda: defaultdict(int))
     all_dates = set()
-    
-    for a in articles:
-        d_str = a.get('pub_date') or a.get('created_at')
-        if not d_str: continue
-        try:
-            # Handle potential ISO format with T or space
-            clean_date = str(d_str).replace('T', ' ').split('.')[0]
-            d_obj = datetime.strptime(clean_date[:10], "%Y-%m-%d")
-            date_key = d_obj.strftime("%Y-%m-%d")
-            cat = a.get('category')
-            if not cat or cat == 'None': cat = 'Unknown'
-            
-            trend_data[cat][date_key] += 1
-            all_dates.add(date_key)
-        except Exception as ex:
-            # print(f"Date parse error: {d_str} {ex}")
-            continue
+    for cat, date_key, n in trend_counts:
+        trend_data[cat][date_key] += n
+        all_dates.add(date_key)
             
     sorted_dates = sorted(list(all_dates))
-    sorted_categories = sorted(list(cat_counts.keys()))
+    sorted_categories = sorted(k for k, _ in category_counts)
     # Map sorted categories to Chinese for the frontend legend
     sorted_categories_cn = [CATEGORY_CN_MAP.get(k, k) for k in sorted_categories]
     
-    # Convert defaultdict to regular dict for JSON serialization
-    # Structure: { "Bid": {"2024-01-01": 10, ...}, ... }
     # We need to send data that matches sorted_categories
     trend_datasets = []
     for cat in sorted_categories:
@@ -183,20 +308,9 @@ async def get_statistics(
             "data": data_points
         })
     
-    # 3. Source Bar Chart
-    sources = []
-    for a in articles:
-        s = a.get('source_name')
-        if not s or s == 'None':
-            # Fallback to source_type if name missing
-            s = a.get('source_type', 'Unknown')
-        sources.append(s)
-        
-    source_counts = Counter(sources)
-    # Sort by count desc
-    sorted_sources = source_counts.most_common(20) # Top 20
-    bar_labels = [s[0] for s in sorted_sources]
-    bar_values = [s[1] for s in sorted_sources]
+    # 3. Source Bar Chart (Top 20, 按数量降序)
+    bar_labels = [s[0] for s in source_counts]
+    bar_values = [s[1] for s in source_counts]
     
     return {
         "category_stats": {
@@ -214,16 +328,291 @@ async def get_statistics(
         }
     }
 
+def format_sse(event_id, channel, payload):
+    data = json.dumps(payload, ensure_ascii=False, default=str)
+    return f"id: {event_id}\nevent: {channel}\ndata: {data}\n\n"
+
+@app.get("/api/live")
+async def live_stream(
+    request: Request,
+    channels: str = Query(None, description="Comma separated channels (article,ships,geofence), default all")
+):
+    """SSE 实时推送: 新保存的文章与船舶位置增量"""
+    wanted = {ch.strip() for ch in channels.split(",") if ch.strip()} if channels else None
+    last_event_id = request.headers.get("last-event-id", "")
+    queue = LIVE.subscribe()
+
+    async def stream():
+        try:
+            yield "retry: 5000\n\n"
+            sent_id = 0
+            # 断线重连时补发错过的事件
+            if last_event_id.isdigit():
+                for event_id, channel, payload in await run_db(event_bus.read_since, int(last_event_id), LIVE_QUEUE_SIZE):
+                    sent_id = event_id
+                    if wanted is None or channel in wanted:
+                        yield format_sse(event_id, channel, payload)
+            while True:
+                try:
+                    event_id, channel, payload = await asyncio.wait_for(queue.get(), timeout=LIVE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"
+                    continue
+                if event_id <= sent_id or (wanted is not None and channel not in wanted):
+                    continue
+                sent_id = event_id
+                yield format_sse(event_id, channel, payload)
+        finally:
+            LIVE.unsubscribe(queue)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+@app.get("/api/ships/positions")
+async def get_ship_positions(
+    request: Request,
+    since: int = Query(0, description="Return positions changed after this version (0 for all)")
+):
+    """船舶最新位置 (列式数组)，传入上次返回的 version 只获取增量"""
+    return await cached_json(request, ("ships",), None, query_ship_positions, max(since, 0))
+
+def query_ship_positions(since):
+    conn = database.get_readonly_connection(database.TRACK_DB_PATH)
+    version = database.get_data_version("ships", conn=conn)
+    rows = database.get_latest_positions(since, conn=conn)
+    # 列式输出: 每个字段一个数组，下标对应同一艘船，比逐条对象小得多
+    columns = {name: [row[i] for row in rows] for i, name in enumerate(database.LATEST_POSITION_COLUMNS)}
+    return {
+        "version": version,
+        "since": since,
+        "full": since == 0,
+        "count": len(rows),
+        **columns
+    }
+
+TRACK_BATCH_MAX_VESSELS = 50
+TRACK_SIMPLIFY_METHODS = ("dp", "time")
+TRACK_FORMATS = ("columnar", "polyline")
+
+def _check_track_options(simplify, format=None):
+    if simplify not in TRACK_SIMPLIFY_METHODS:
+        raise HTTPException(status_code=400, detail=f"simplify must be one of {TRACK_SIMPLIFY_METHODS}")
+    if format is not None and format not in TRACK_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {TRACK_FORMATS}")
+
 @app.get("/api/ship_tracks")
-async def get_ship_tracks(mmsi: str, days: int = 3):
-    """获取指定船舶的历史轨迹 (默认3天)"""
-    tracks = database.get_ship_tracks(mmsi, days=days)
-    return tracks
+async def get_ship_tracks(
+    request: Request,
+    mmsi: str,
+    days: int = 3,
+    zoom: float = Query(None, description="Map zoom level, simplifies to about one pixel"),
+    max_points: int = Query(None, description="Upper bound on returned points"),
+    simplify: str = Query("dp", description="dp (Douglas-Peucker) or time (time buckets)")
+):
+    """获取指定船舶的历史轨迹 (默认3天，可按缩放级别 / 点数上限抽稀)"""
+    _check_track_options(simplify)
+    # 时间窗口相对当前时间，缓存最多保留 60 秒
+    return await cached_json(request, ("ships",), 60, query_ship_tracks, mmsi, days, zoom, max_points, simplify)
+
+def load_ship_tracks(mmsi, days, conn):
+    """最近 days 天的轨迹；超出热表保留天数时合并归档文件"""
+    if days > track_archive.TRACK_HOT_DAYS:
+        now = datetime.now()
+        return track_archive.get_track_history(mmsi, (now - timedelta(days=days)).isoformat(), now.isoformat(), conn=conn)
+    return database.get_ship_tracks(mmsi, days=days, conn=conn)
+
+def query_ship_tracks(mmsi, days, zoom=None, max_points=None, simplify="dp"):
+    conn = database.get_readonly_connection(database.TRACK_DB_PATH)
+    tracks = load_ship_tracks(mmsi, days, conn)
+    return track_simplify.simplify_track(tracks, zoom=zoom, max_points=max_points, method=simplify)
+
+@app.get("/api/ship_tracks/history")
+async def get_ship_track_history(
+    request: Request,
+    mmsi: str,
+    start: str = Query(None, description="Start datetime ISO (default 30 days ago)"),
+    end: str = Query(None, description="End datetime ISO (default now)"),
+    zoom: float = Query(None, description="Map zoom level, simplifies to about one pixel"),
+    max_points: int = Query(2000, description="Upper bound on returned points"),
+    simplify: str = Query("dp", description="dp (Douglas-Peucker) or time (time buckets)")
+):
+    """读取单船长周期轨迹 (归档文件 + 热表)"""
+    _check_track_options(simplify)
+    ttl = 60 if not end else None
+    return await cached_json(
+        request, ("ships",), ttl, query_ship_track_history,
+        mmsi, start, end, zoom, max_points, simplify
+    )
+
+def query_ship_track_history(mmsi, start, end, zoom, max_points, simplify):
+    if not end:
+        end = datetime.now().isoformat()
+    if not start:
+        start = (datetime.now() - timedelta(days=30)).isoformat()
+    conn = database.get_readonly_connection(database.TRACK_DB_PATH)
+    raw = track_archive.get_track_history(mmsi, start, end, conn=conn)
+    points = track_simplify.simplify_track(raw, zoom=zoom, max_points=max_points, method=simplify)
+    return {"mmsi": mmsi, "start": start, "end": end, "raw_count": len(raw), "count": len(points), **track_simplify.to_columnar(points)}
+
+@app.get("/api/ship_tracks/batch")
+async def get_ship_tracks_batch(
+    request: Request,
+    mmsi: str = Query(..., description="Comma separated MMSI list"),
+    days: int = 3,
+    zoom: float = Query(None, description="Map zoom level, simplifies to about one pixel"),
+    max_points: int = Query(None, description="Upper bound on returned points per vessel"),
+    simplify: str = Query("dp", description="dp (Douglas-Peucker) or time (time buckets)"),
+    format: str = Query("columnar", description="columnar (parallel arrays) or polyline (encoded polyline)")
+):
+    """批量获取多艘船舶的抽稀轨迹"""
+    _check_track_options(simplify, format)
+    mmsi_list = tuple(dict.fromkeys(m.strip() for m in mmsi.split(",") if m.strip()))
+    if len(mmsi_list) > TRACK_BATCH_MAX_VESSELS:
+        raise HTTPException(status_code=400, detail=f"at most {TRACK_BATCH_MAX_VESSELS} vessels per request")
+    return await cached_json(
+        request, ("ships",), 60, query_ship_tracks_batch,
+        mmsi_list, days, zoom, max_points, simplify, format
+    )
+
+def query_ship_tracks_batch(mmsi_list, days, zoom, max_points, simplify, format):
+    conn = database.get_readonly_connection(database.TRACK_DB_PATH)
+    result = {}
+    for mmsi in mmsi_list:
+        raw = load_ship_tracks(mmsi, days, conn)
+        points = track_simplify.simplify_track(raw, zoom=zoom, max_points=max_points, method=simplify)
+        entry = {"count": len(points), "raw_count": len(raw)}
+        if format == "polyline":
+            entry["polyline"] = track_simplify.encode_polyline(points)
+            entry["timestamp"] = [p.get("timestamp") for p in points]
+        else:
+            entry.update(track_simplify.to_columnar(points))
+        result[mmsi] = entry
+    return {"format": format, "tracks": result}
+
+GEOFENCE_MAX_RADIUS_M = 500000
+
+def _parse_bbox(bbox):
+    try:
+        min_lng, min_lat, max_lng, max_lat = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be minLng,minLat,maxLng,maxLat")
+    if min_lat > max_lat or min_lng > max_lng:
+        raise HTTPException(status_code=400, detail="bbox min values must not exceed max values")
+    return min_lat, min_lng, max_lat, max_lng
+
+@app.get("/api/geofences")
+async def get_geofences(request: Request):
+    """已配置的电子围栏列表 (含 GeoJSON 几何)"""
+    registry = await run_db(geofence.get_registry)
+    return await cached_json(request, (), None, query_geofences, registry.mtime)
+
+def query_geofences(mtime):
+    registry = geofence.get_registry()
+    return {"count": len(registry), "fences": [f.to_dict(with_geometry=True) for f in registry.fences]}
+
+@app.get("/api/geofence")
+async def get_geofence_vessels(
+    request: Request,
+    fence_id: str = Query(None, description="Configured geofence id"),
+    bbox: str = Query(None, description="minLng,minLat,maxLng,maxLat"),
+    lat: float = Query(None, description="Circle center latitude (with lng and radius_m)"),
+    lng: float = Query(None, description="Circle center longitude"),
+    radius_m: float = Query(None, description="Circle radius in meters")
+):
+    """查询围栏 / 矩形范围 / 圆形范围内的船舶最新位置"""
+    registry = await run_db(geofence.get_registry)
+    if fence_id:
+        if fence_id not in registry.by_id:
+            raise HTTPException(status_code=404, detail="geofence not found")
+        args = ("fence", fence_id, registry.mtime)
+    elif bbox:
+        args = ("bbox", _parse_bbox(bbox), None)
+    elif lat is not None and lng is not None and radius_m is not None:
+        if not 0 < radius_m <= GEOFENCE_MAX_RADIUS_M:
+            raise HTTPException(status_code=400, detail=f"radius_m must be in (0, {GEOFENCE_MAX_RADIUS_M}]")
+        args = ("circle", (lat, lng, radius_m), None)
+    else:
+        raise HTTPException(status_code=400, detail="fence_id, bbox or lat/lng/radius_m is required")
+    return await cached_json(request, ("ships",), None, query_geofence_vessels, *args)
+
+def query_geofence_vessels(kind, target, mtime):
+    conn = database.get_readonly_connection(database.TRACK_DB_PATH)
+    result = {"query": kind}
+    if kind == "fence":
+        fence = geofence.get_registry().by_id[target]
+        vessels = geofence.vessels_in_fence(fence, conn=conn)
+        result["fence"] = fence.to_dict()
+    elif kind == "bbox":
+        vessels = geofence.vessels_in_bbox(*target, conn=conn)
+    else:
+        vessels = geofence.vessels_near(*target, conn=conn)
+    result.update({"count": len(vessels), "vessels": vessels})
+    return result
+
+@app.get("/api/geofence/events")
+async def get_geofence_events(
+    request: Request,
+    fence_id: str = Query(None),
+    mmsi: str = Query(None),
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """最近的船舶进出围栏事件"""
+    return await cached_json(request, ("ships",), None, query_geofence_events, fence_id, mmsi, limit)
+
+def query_geofence_events(fence_id, mmsi, limit):
+    conn = database.get_readonly_connection(database.TRACK_DB_PATH)
+    return {"events": geofence.get_geofence_events(fence_id=fence_id, mmsi=mmsi, limit=limit, conn=conn)}
+
+@app.get("/api/ship_activity")
+async def get_ship_activity(
+    request: Request,
+    mmsi: str = Query(None),
+    start: str = Query(None, description="Start datetime ISO"),
+    end: str = Query(None, description="End datetime ISO"),
+    activity: str = Query(None, description="voyage, dredging or idle"),
+    limit: int = Query(500, ge=1, le=5000)
+):
+    """船舶作业分段 (航行 / 疏浚作业 / 停泊)"""
+    if activity and activity not in ship_activity.ACTIVITIES:
+        raise HTTPException(status_code=400, detail=f"activity must be one of {ship_activity.ACTIVITIES}")
+    return await cached_json(request, ("ships",), None, query_ship_activity, mmsi, start, end, activity, limit)
+
+def query_ship_activity(mmsi, start, end, activity, limit):
+    conn = database.get_readonly_connection(database.TRACK_DB_PATH)
+    segments = ship_activity.get_activity_segments(mmsi=mmsi, start=start, end=end, activity=activity, limit=limit, conn=conn)
+    return {"count": len(segments), "segments": segments}
+
+@app.get("/api/fleet/utilization")
+async def get_fleet_utilization(
+    request: Request,
+    start: str = Query(None, description="Start datetime ISO (default 7 days ago)"),
+    end: str = Query(None, description="End datetime ISO (default now)")
+):
+    """船队利用率报表 (作业 / 航行 / 停泊小时数、扫测面积)"""
+    ttl = 60 if not end else None
+    return await cached_json(request, ("ships",), ttl, query_fleet_utilization, start, end)
+
+def query_fleet_utilization(start, end):
+    if not end:
+        end = datetime.now().isoformat()
+    if not start:
+        start = (datetime.now() - timedelta(days=7)).isoformat()
+    conn = database.get_readonly_connection(database.TRACK_DB_PATH)
+    return ship_activity.get_fleet_utilization(start, end, conn=conn)
 
 @app.get("/api/ships")
-async def get_ships():
+async def get_ships(request: Request):
     """获取所有船舶位置和状态 (返回所有船舶，tracked 为 24 小时内活跃数)"""
-    ships = database.get_all_ships()
+    # is_active 依赖当前时间，缓存最多保留 60 秒
+    return await cached_json(request, ("ships",), 60, query_ships)
+
+def query_ships():
+    conn = database.get_readonly_connection(database.TRACK_DB_PATH)
+    ships = database.get_all_ships(conn=conn)
     total_count = len(ships)
     # 修正 tracked 逻辑：仅统计有 MMSI 的船舶 (即被监控的船舶)
     tracked_count = 0
@@ -234,31 +623,16 @@ async def get_ships():
     now = datetime.now()
     threshold = now - timedelta(hours=24)
     
+    # 最新位置表由追踪任务维护，不再扫描整张 ship_tracks
     latest_track_map = {}
     try:
-        conn = sqlite3.connect(database.TRACK_DB_PATH)
         c = conn.cursor()
-        c.execute(
-            """
-            SELECT t.mmsi, t.lat, t.lng
-            FROM ship_tracks t
-            JOIN (
-                SELECT mmsi, MAX(timestamp) AS max_ts
-                FROM ship_tracks
-                GROUP BY mmsi
-            ) latest
-            ON t.mmsi = latest.mmsi AND t.timestamp = latest.max_ts
-            """
-        )
+        c.execute("SELECT mmsi, lat, lng FROM ship_latest_positions")
         for row in c.fetchall():
             latest_track_map[str(row[0])] = (row[1], row[2])
     except Exception:
         latest_track_map = {}
-    finally:
-        try:
-            conn.close()
-        except Exception:
-            pass
+    position_version = database.get_data_version("ships", conn=conn)
 
     for ship in ships:
         mmsi = str(ship.get('mmsi', '')).strip()
@@ -320,6 +694,7 @@ async def get_ships():
         "tracked": tracked_count, 
         "active": active_count,
         "visible": visible_count,
+        "position_version": position_version,
         "note": "tracked=MMSI configured count, active=updated < 24h"
     }
 
@@ -335,10 +710,87 @@ async def get_articles(
     valid: int = Query(None, description="Validity filter (1 for valid, 0 for invalid)"),
     is_retained: int = Query(None, description="Retained filter (1 for retained, 0 for discarded)"),
     page: int = Query(1, description="Page number"),
-    page_size: int = Query(50, description="Page size")
+    page_size: int = Query(50, description="Page size"),
+    cursor: str = Query(None, description="Keyset cursor from next_cursor (empty string for the first page)"),
+    with_total: int = Query(1, description="Set 0 to skip the total count"),
+    fields: str = Query("list", description="list: lean projection, full: include content/full_text_cn")
+):
+    return await run_db(
+        query_articles, date, start, end, keyword, category, source_type,
+        source_name, valid, is_retained, page, page_size,
+        cursor=cursor, with_total=bool(with_total), fields=fields
+    )
+
+@app.get("/api/search")
+async def search_articles(
+    q: str = Query(..., description="Semantic search text"),
+    limit: int = Query(20, description="Max results")
 ):
-    conn = sqlite3.connect(database.DB_PATH)
-    conn.row_factory = sqlite3.Row
+    """语义检索: 按标题与摘要的向量相似度返回最相关的保留文章"""
+    q = (q or "").strip()
+    if not q:
+        return {"articles": [], "count": 0}
+    limit = max(1, min(limit, 100))
+    try:
+        # 首次调用会加载向量模型，放到线程池中避免阻塞事件循环
+        embedder = await run_db(semantic_index.get_embedder)
+        vector = await embedder.embed_query(q)
+    except Exception as e:
+        print(f"Error in search_articles: embedder unavailable: {e}")
+        raise HTTPException(status_code=503, detail=f"embedding model unavailable: {e}")
+    try:
+        return await run_db(query_semantic_articles, vector, limit)
+    except Exception as e:
+        print(f"Error in search_articles: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def query_semantic_articles(vector, limit):
+    # 多取一些候选，过滤隐藏/无效文章后仍能凑满 limit
+    hits = semantic_index.search(vector, limit * 3)
+    if not hits:
+        return {"articles": [], "count": 0}
+    scores = dict(hits)
+    placeholders = ",".join("?" * len(scores))
+    select_sql = ", ".join(f"a.{col}" for col in ARTICLE_LIST_COLUMNS)
+    conn = database.get_readonly_connection(database.DB_PATH)
+    rows = conn.execute(
+        f"""
+        SELECT {select_sql} FROM articles a
+        WHERE a.id IN ({placeholders}) AND a.is_retained = 1
+          AND (a.is_hidden = 0 OR a.is_hidden IS NULL) AND (a.valid = 1 OR a.valid IS NULL)
+        """,
+        list(scores)
+    ).fetchall()
+    articles = [dict(zip(ARTICLE_LIST_COLUMNS, row)) for row in rows]
+    for a in articles:
+        a["score"] = round(scores[a["id"]], 4)
+    articles.sort(key=lambda a: a["score"], reverse=True)
+    articles = articles[:limit]
+    return {"articles": articles, "count": len(articles)}
+
+# 列表页只需要摘要字段，正文 (content / full_text_cn) 通过 /api/article/{id} 按需获取
+ARTICLE_LIST_COLUMNS = [
+    "id", "title", "title_cn", "pub_date", "source_type", "source_name",
+    "summary_cn", "screenshot_path", "url", "created_at", "valid", "category"
+]
+
+def encode_article_cursor(created_at, article_id):
+    """将 (created_at, id) 编码为不透明的分页游标"""
+    raw = json.dumps([created_at, article_id], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_article_cursor(cursor):
+    """解析分页游标，返回 (created_at, id)；格式错误时抛出 ValueError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, article_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return str(created_at), int(article_id)
+    except Exception as e:
+        raise ValueError(f"invalid cursor: {cursor}") from e
+
+def query_articles(date, start, end, keyword, category, source_type, source_name, valid, is_retained, page, page_size,
+                   cursor=None, with_total=True, fields="list"):
+    conn = database.get_readonly_connection(database.DB_PATH)
     c = conn.cursor()
 
     where = [
@@ -365,17 +817,35 @@ async def get_articles(
         where.append("a.category = ?")
         params.append(category)
 
+    # 按日期前缀做范围比较，可以直接使用 idx_articles_created_at
     if date:
-        where.append("date(substr(a.created_at, 1, 10)) = date(?)")
-        params.append(date)
+        where.append("a.created_at >= date(?) AND a.created_at < date(?, '+1 day')")
+        params.extend([date, date])
     elif start and end:
-        where.append("date(substr(a.created_at, 1, 10)) BETWEEN date(?) AND date(?)")
+        where.append("a.created_at >= date(?) AND a.created_at < date(?, '+1 day')")
         params.extend([start, end])
 
+    # 传入 cursor 时使用 (created_at, id) 键集分页，翻页成本与页码无关
+    keyset = cursor is not None
+    join_sql = ""
+    order_sql = "a.created_at DESC, a.id DESC"
+    ranked = False
     if keyword:
-        like = f"%{keyword}%"
-        where.append("(a.title LIKE ? OR a.title_cn LIKE ? OR a.summary_cn LIKE ?)")
-        params.extend([like, like, like])
+        fts_query = database.build_fulltext_query(keyword)
+        if fts_query and database.has_fulltext_index(conn):
+            # 走 FTS5 trigram 索引，按相关度排序
+            join_sql = "JOIN articles_fts ON articles_fts.rowid = a.id"
+            where.append("articles_fts MATCH ?")
+            params.append(fts_query)
+            if not keyset:
+                order_sql = "articles_fts.rank, a.created_at DESC"
+                ranked = True
+        else:
+            # 关键词过短 (trigram 至少 3 个字符) 时回退为 LIKE
+            like = f"%{keyword}%"
+            where.append("(a.title LIKE ? OR a.title_cn LIKE ? OR a.summary_cn LIKE ? "
+                         "OR a.id IN (SELECT article_id FROM article_texts WHERE full_text_cn LIKE ?))")
+            params.extend([like, like, like, like])
 
     if source_type:
         where.append("a.source_type = ?")
@@ -386,28 +856,47 @@ async def get_articles(
         params.append(source_name)
 
     where_sql = " AND ".join(where) if where else "1=1"
-    count_query = f"""
-        SELECT COUNT(a.id)
-        FROM articles a
-        WHERE {where_sql}
-    """
-    c.execute(count_query, params)
-    total = c.fetchone()[0] or 0
+    total = None
+    if with_total:
+        count_query = f"""
+            SELECT COUNT(a.id)
+            FROM articles a {join_sql}
+            WHERE {where_sql}
+        """
+        c.execute(count_query, params)
+        total = c.fetchone()[0] or 0
 
+    page_where = where_sql
+    page_params = list(params)
     offset = max(page - 1, 0) * page_size
+    if keyset:
+        offset = 0
+        if cursor:
+            try:
+                cursor_created_at, cursor_id = decode_article_cursor(cursor)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            page_where = f"{where_sql} AND (a.created_at, a.id) < (?, ?)"
+            page_params.extend([cursor_created_at, cursor_id])
+
+    select_sql = ", ".join(f"a.{col}" for col in ARTICLE_LIST_COLUMNS)
+    # 多取一行用于判断是否还有下一页
     data_query = f"""
-        SELECT 
-            a.id, a.title, a.title_cn, a.pub_date, a.source_type, a.source_name,
-            a.summary_cn, a.full_text_cn, a.content, a.screenshot_path, a.url, a.created_at,
-            a.valid, a.category
-        FROM articles a
-        WHERE {where_sql}
-        ORDER BY a.created_at DESC, a.pub_date DESC
+        SELECT {select_sql}
+        FROM articles a {join_sql}
+        WHERE {page_where}
+        ORDER BY {order_sql}
         LIMIT ? OFFSET ?
     """
-    c.execute(data_query, params + [page_size, offset])
+    c.execute(data_query, page_params + [page_size + 1, offset])
     rows = c.fetchall()
-    conn.close()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    next_cursor = None
+    if has_more and not ranked:
+        last = rows[-1]
+        next_cursor = encode_article_cursor(last["created_at"], last["id"])
 
     items = []
     for row in rows:
@@ -421,51 +910,74 @@ async def get_articles(
              
         category_val = item.get("category")
         item["categories"] = [category_val] if category_val else []
+        item["thumbnail_path"] = asset_store.thumbnail_path(item.get("screenshot_path"))
         items.append(item)
+    if fields == "full":
+        # 正文压缩存放在 article_texts 表
+        database.attach_article_texts(items, conn=conn)
 
     return {
         "total": total,
         "page": page,
         "page_size": page_size,
+        "has_more": has_more,
+        "next_cursor": next_cursor,
         "items": items
     }
 
 @app.get("/api/article/{article_id}")
 async def get_article_detail(article_id: int):
-    conn = sqlite3.connect(database.DB_PATH)
-    conn.row_factory = sqlite3.Row
+    return await run_db(query_article_detail, article_id)
+
+def query_article_detail(article_id):
+    conn = database.get_readonly_connection(database.DB_PATH)
     c = conn.cursor()
     c.execute("""
-        SELECT id, title, title_cn, url, pub_date, summary_cn, full_text_cn, content, source_type, source_name, screenshot_path, vl_desc, created_at, valid, category
+        SELECT id, title, title_cn, url, pub_date, summary_cn, source_type, source_name, screenshot_path, vl_desc, created_at, valid, category
         FROM articles
         WHERE id = ?
     """, (article_id,))
     article_row = c.fetchone()
     if not article_row:
-        conn.close()
         return {"article": None, "events": []}
-    conn.close()
 
-    article_data = dict(article_row)
+    article_data = database.attach_article_texts([dict(article_row)], conn=conn)[0]
     if article_data.get('created_at'):
         article_data['created_at'] = str(article_data['created_at']).split('.')[0]
     if article_data.get('pub_date'):
         article_data['pub_date'] = str(article_data['pub_date']).split('.')[0]
+    article_data["thumbnail_path"] = asset_store.thumbnail_path(article_data.get("screenshot_path"))
     category_val = article_data.get("category")
     return {"article": article_data, "events": [], "categories": [category_val] if category_val else []}
 
 @app.get("/api/sources")
-async def get_sources():
-    sources_path = os.path.abspath(config.SOURCES_FILE)
-    if not os.path.exists(sources_path):
-        return {"sources": []}
-    with open(sources_path, "r", encoding="utf-8") as f:
-        sources = json.load(f)
-    return {"sources": sources}
+async def get_sources(request: Request):
+    return response_cache.build_response(request, load_sources())
+
+def load_sources():
+    # 与采集任务共用解析后的配置，文件未变化时不读磁盘
+    catalog = get_source_catalog(config.SOURCES_FILE)
+    if catalog.response_body is None:
+        catalog.response_body = response_cache.CachedBody(response_cache.encode_json({"sources": catalog.sources}))
+    return catalog.response_body
+
+@app.get("/api/scheduler/jobs")
+async def get_scheduler_jobs(
+    job: str = Query(None, description="Only list runs of this job"),
+    limit: int = Query(20, ge=1, le=200)
+):
+    """定时任务运行统计与最近运行记录 (job_runs)"""
+    return await run_db(query_scheduler_jobs, job, limit)
+
+def query_scheduler_jobs(job, limit):
+    return {"summary": job_runs.job_summary(), "runs": job_runs.list_runs(job, limit=limit)}
 
 @app.get("/api/scheduler/runs")
 async def get_scheduler_runs():
     """获取历史调度任务运行结果列表"""
+    return await run_db(list_scheduler_runs)
+
+def list_scheduler_runs():
     scheduler_dir = os.path.join(config.DATA_DIR, "scheduler")
     if not os.path.exists(scheduler_dir):
         return {"runs": []}
@@ -510,6 +1022,9 @@ async def get_scheduler_runs():
 @app.get("/api/scheduler/run/{filename}")
 async def get_scheduler_run_detail(filename: str):
     """获取指定调度任务运行详情"""
+    return await run_db(read_scheduler_run, filename)
+
+def read_scheduler_run(filename):
     scheduler_dir = os.path.join(config.DATA_DIR, "scheduler")
     file_path = os.path.join(scheduler_dir, filename)
     
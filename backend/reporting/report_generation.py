@@ -2,6 +2,7 @@ import base64
 from datetime import datetime
 import config
 import database
+from analysis import event_clustering
 from static.constants import (
     DEFAULT_CATEGORY,
     ALLOWED_CATEGORIES,
@@ -26,7 +27,9 @@ def generate_report(results):
     
     md_lines.append("## 📊 分析概况")
     md_lines.append(f"- **生成时间**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    events = event_clustering.group_by_event(event_clustering.attach_event_ids(results))
     md_lines.append(f"- **总文章数**: {len(results)} 篇")
+    md_lines.append(f"- **事件数**: {len(events)} 个")
     md_lines.append(f"- **AI 模型**: {config.TEXT_MODEL} (文本) + {config.VL_MODEL} (视觉)")
     md_lines.append("")
 
@@ -41,7 +44,7 @@ def generate_report(results):
     }
     
     grouped_articles = {k: [] for k in categories_map.keys()}
-    for r in results:
+    for r in events:
         article_category = normalize_category(r.get('category')) or DEFAULT_CATEGORY
         if article_category not in ALLOWED_CATEGORIES:
             article_category = DEFAULT_CATEGORY
@@ -66,6 +69,10 @@ def generate_report(results):
             vl_desc = article.get('image_desc', '')
             if vl_desc and vl_desc != "无视觉分析" and "视觉补充" not in article.get('summary_cn', ''):
                 md_lines.append(f"- **👀 视觉补充**: {vl_desc}")
+            if article.get('related'):
+                md_lines.append(f"- **相关报道** ({article['event_size']} 篇):")
+                for related in article['related']:
+                    md_lines.append(f"  - [{related.get('title') or related.get('url')}]({related.get('url') or ''}) {related.get('source_name') or ''}".rstrip())
             md_lines.append("")
 
     # 增加详细日志区域
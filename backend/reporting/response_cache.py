@@ -0,0 +1,133 @@
+"""
+Dashboard 接口响应缓存
+
+- 以 (接口, 归一化参数) 为键缓存序列化后的 JSON 字节及其压缩副本
+- 缓存项记录生成时的数据版本号 (database.data_versions)，写入方递增版本后自动失效
+- 强 ETag 取自响应内容哈希，支持 If-None-Match 返回 304
+- 按 Accept-Encoding 返回预先压缩好的 br / gzip 副本
+"""
+
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # 未安装 brotli 时只提供 gzip
+    brotli = None
+
+MIN_COMPRESS_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+class CachedBody:
+    """一份已序列化的响应内容及其压缩副本"""
+
+    __slots__ = ("media_type", "digest", "variants", "versions", "expires_at")
+
+    def __init__(self, body, media_type="application/json", versions=None, ttl=None):
+        self.media_type = media_type
+        self.digest = hashlib.sha256(body).hexdigest()[:32]
+        self.variants = {"identity": body}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            self.variants["gzip"] = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+            if brotli is not None:
+                self.variants["br"] = brotli.compress(body, quality=BROTLI_QUALITY)
+        self.versions = versions
+        self.expires_at = time.monotonic() + ttl if ttl else None
+
+    def etag(self, encoding):
+        # 不同编码是不同的字节表示，强 ETag 需要区分
+        suffix = "" if encoding == "identity" else f"-{encoding}"
+        return f'"{self.digest}{suffix}"'
+
+    def is_fresh(self, versions):
+        if self.versions != versions:
+            return False
+        return self.expires_at is None or time.monotonic() < self.expires_at
+
+
+def encode_json(payload):
+    """与 FastAPI 默认 JSONResponse 相同的序列化方式"""
+    return json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def pick_encoding(accept_encoding, available):
+    """根据 Accept-Encoding 选择可用的压缩编码"""
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        token, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0"):
+            continue
+        accepted.add(token.strip().lower())
+    for encoding in ("br", "gzip"):
+        if encoding in available and (encoding in accepted or "*" in accepted):
+            return encoding
+    return "identity"
+
+
+def _etag_matches(if_none_match, entry):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    known = {entry.etag(encoding) for encoding in entry.variants}
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag in known:
+            return True
+    return False
+
+
+def build_response(request, entry, cache_control="no-cache"):
+    """按请求头返回 304 或对应编码的缓存内容"""
+    encoding = pick_encoding(request.headers.get("accept-encoding"), entry.variants)
+    headers = {
+        "ETag": entry.etag(encoding),
+        "Cache-Control": cache_control,
+        "Vary": "Accept-Encoding",
+    }
+    if _etag_matches(request.headers.get("if-none-match"), entry):
+        return Response(status_code=304, headers=headers)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=entry.variants[encoding], media_type=entry.media_type, headers=headers)
+
+
+class ResponseCache:
+    """线程安全的 LRU 响应缓存"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, versions):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if not entry.is_fresh(versions):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -11,6 +11,7 @@ if backend_dir not in sys.path:
     sys.path.insert(0, backend_dir)
 import config
 import database
+from analysis import event_clustering
 
 DEFAULT_CATEGORY = "Market"
 
@@ -167,35 +168,6 @@ def filter_events_by_publish_window(events, start_dt, end_dt):
         filtered.append(e)
     return filtered
 
-def normalize_title_key(text):
-    if not text:
-        return ""
-    t = str(text).lower()
-    stopwords = [
-        "集团", "公司", "股份", "有限", "有限公司",
-        "达成", "签订", "签署", "修改", "修订", "协议",
-        "合作", "宣布", "公告"
-    ]
-    for w in stopwords:
-        t = t.replace(w, "")
-    t = "".join(ch for ch in t if ch.isalnum() or '\u4e00' <= ch <= '\u9fff')
-    return t
-
-def dedupe_market_events(articles):
-    deduped_events = []
-    seen_market = set()
-    for e in articles:
-        if e.get("category") == "Market":
-            title_key = normalize_title_key(e.get("title_cn") or e.get("title") or e.get("summary_cn"))
-            if not title_key:
-                title_key = e.get("url") or e.get("id")
-            if title_key and title_key in seen_market:
-                continue
-            if title_key:
-                seen_market.add(title_key)
-        deduped_events.append(e)
-    return deduped_events
-
 def build_category_counts(articles):
     buckets = {k: set() for k in CATEGORIES_MAP.keys()}
     for e in articles:
@@ -210,7 +182,7 @@ def build_category_counts(articles):
     return {k: len(v) for k, v in buckets.items()}
 
 def push_daily_report():
-    """推送日报到企业微信"""
+    """推送日报到企业微信，返回推送的事件数 (同一事件的多篇报道合并为一条)"""
     now = datetime.now()
     start_dt, end_dt, label = get_push_window(now)
     start_time = start_dt.isoformat()
@@ -233,7 +205,7 @@ def push_daily_report():
             print("[Push] 已发送无情报通知")
         else:
             print(f"[Push] 无情报通知发送失败: {resp_json}")
-        return
+        return 0
 
     cover_image_url = f"{config.BACKEND_URL.rstrip('/')}/assets/draghead.png"
     
@@ -251,8 +223,12 @@ def push_daily_report():
 
     # 2. 构造 Template Card
     date_str = label
-    total_count = len(articles)
-    category_counts = build_category_counts(articles)
+    events = event_clustering.group_by_event(articles)
+    total_count = len(events)
+    update_desc = f"本次更新: {total_count} 个事件"
+    if len(articles) != total_count:
+        update_desc += f" ({len(articles)} 篇报道)"
+    category_counts = build_category_counts(events)
     category_labels = {
         "Market": "市场",
         "Bid": "中标",
@@ -263,7 +239,7 @@ def push_daily_report():
     }
     category_line = " | ".join([f"{category_labels[k]}{category_counts.get(k, 0)}" for k in category_labels.keys()])
     write_scheduler_log(
-        f"推送统计: 窗口{label} 原始记录{raw_event_count} 推送{total_count}"
+        f"推送统计: 窗口{label} 原始记录{raw_event_count} 推送事件{total_count}"
     )
 
 
@@ -285,7 +261,7 @@ def push_daily_report():
             },
             "main_title": {
                 "title": f"{date_str}",
-                "desc": f"本次更新: {total_count} 条"
+                "desc": update_desc
             },
             "card_image": {
                 "url": cover_image_url,
@@ -312,7 +288,7 @@ def push_daily_report():
     if resp_json.get("errcode") != 0:
         print("Template Card 推送失败，尝试降级为 Text 消息...")
         text_content = f"【全球疏浚情报 {date_str}】\n"
-        text_content += f"本次更新: {total_count} 条\n\n"
+        text_content += f"{update_desc}\n\n"
         text_content += f"{category_line}\n"
         text_content += f"\n详情请访问: {jump_url}"
         text_payload = {
@@ -324,6 +300,7 @@ def push_daily_report():
         fallback_resp = post_wecom_webhook(text_payload, date_str)
         if fallback_resp.get("errcode") != 0:
             print(f"[Push] 降级文本推送失败: {fallback_resp}")
+    return total_count
 
 if __name__ == "__main__":
     push_daily_report()
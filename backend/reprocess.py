@@ -0,0 +1,353 @@
+"""
+历史文章重新分析 (回填)
+
+调整提示词或分析逻辑后，按发布日期范围、来源、分类筛选历史文章重新调用模型分析:
+- 按文章 id 升序分块处理，块内并发数受限
+- 每块完成后把进度 (last_id 及计数) 写入 reprocess_runs 表，进程中断后 resume 从断点继续
+- 输出处理速度与预计剩余时间
+
+用法:
+    python reprocess.py run --start 2025-01-01 --end 2025-12-31 [--source 名称] [--category Bid]
+    python reprocess.py resume [--run-id N]
+    python reprocess.py list
+
+同一时间只允许一个重新分析任务 (通过 job_runs 互斥，并出现在定时任务运行记录中)。
+模型两路分析都失败的文章不写回，保留原有结果并计入失败数。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import config
+import cpu_pool
+import database
+import job_runs
+import shared_resources
+from analysis import info_analysis
+from analysis import semantic_index
+
+DEFAULT_CHUNK_SIZE = 50
+DEFAULT_CONCURRENCY = 3
+
+RUN_COLUMNS = ["id", "filters", "status", "total", "processed", "failed", "retained", "last_id",
+               "created_at", "updated_at", "finished_at"]
+ARTICLE_COLUMNS = ["id", "url", "title", "pub_date", "source_type", "source_name", "category",
+                   "screenshot_path", "created_at"]
+
+
+def _connect():
+    return sqlite3.connect(database.DB_PATH, timeout=30)
+
+
+def _filter_sql(filters):
+    """筛选条件 -> (where 子句列表, 参数)"""
+    where = [f"(NOT {database.article_text_missing_sql('content')} OR COALESCE(screenshot_path, '') != '')",
+             "duplicate_of IS NULL"]
+    params = []
+    if not filters.get("include_invalid"):
+        where.append("valid = 1")
+    if filters.get("start"):
+        where.append("stat_date >= ?")
+        params.append(filters["start"])
+    if filters.get("end"):
+        where.append("stat_date <= ?")
+        params.append(filters["end"])
+    if filters.get("source"):
+        where.append("(source_name = ? OR source_type = ?)")
+        params.extend([filters["source"], filters["source"]])
+    if filters.get("category"):
+        where.append("category = ?")
+        params.append(filters["category"])
+    return where, params
+
+
+def count_articles(filters, after_id=0, conn=None):
+    """符合条件且 id 大于 after_id 的文章数"""
+    own_conn = conn is None
+    if own_conn:
+        conn = _connect()
+    try:
+        where, params = _filter_sql(filters)
+        return conn.execute(
+            f"SELECT COUNT(*) FROM articles WHERE id > ? AND {' AND '.join(where)}",
+            [after_id] + params
+        ).fetchone()[0]
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def fetch_chunk(filters, after_id, limit, conn=None):
+    """按 id 升序取下一块待处理文章"""
+    own_conn = conn is None
+    if own_conn:
+        conn = _connect()
+    try:
+        where, params = _filter_sql(filters)
+        rows = conn.execute(
+            f"SELECT {', '.join(ARTICLE_COLUMNS)} FROM articles WHERE id > ? AND {' AND '.join(where)} ORDER BY id LIMIT ?",
+            [after_id] + params + [limit]
+        ).fetchall()
+        items = database.attach_article_texts([dict(zip(ARTICLE_COLUMNS, row)) for row in rows], ("content",), conn)
+        for item in items:
+            item["link"] = item["url"]
+        return items
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def create_run(filters):
+    """登记新的重新分析任务，返回 run_id"""
+    now = datetime.now().isoformat()
+    conn = _connect()
+    try:
+        total = count_articles(filters, conn=conn)
+        cur = conn.execute(
+            "INSERT INTO reprocess_runs (filters, status, total, created_at, updated_at) VALUES (?, 'pending', ?, ?, ?)",
+            (json.dumps(filters, ensure_ascii=False), total, now, now)
+        )
+        conn.commit()
+        return cur.lastrowid
+    finally:
+        conn.close()
+
+
+def get_run(run_id=None):
+    """读取任务；未指定 run_id 时返回最近一个未完成的任务"""
+    conn = _connect()
+    try:
+        if run_id:
+            row = conn.execute(f"SELECT {', '.join(RUN_COLUMNS)} FROM reprocess_runs WHERE id = ?", (run_id,)).fetchone()
+        else:
+            row = conn.execute(
+                f"SELECT {', '.join(RUN_COLUMNS)} FROM reprocess_runs WHERE status != 'done' ORDER BY id DESC LIMIT 1"
+            ).fetchone()
+        if not row:
+            return None
+        run = dict(zip(RUN_COLUMNS, row))
+        run["filters"] = json.loads(run["filters"] or "{}")
+        return run
+    finally:
+        conn.close()
+
+
+def list_reprocess_runs(limit=20):
+    """最近的重新分析任务 (新到旧)"""
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            f"SELECT {', '.join(RUN_COLUMNS)} FROM reprocess_runs ORDER BY id DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [dict(zip(RUN_COLUMNS, row)) for row in rows]
+    finally:
+        conn.close()
+
+
+def save_checkpoint(run_id, last_id, processed, failed, retained, status="running"):
+    """块处理完成后记录断点与累计计数"""
+    now = datetime.now().isoformat()
+    conn = _connect()
+    try:
+        conn.execute(
+            """
+            UPDATE reprocess_runs
+            SET last_id = ?, processed = processed + ?, failed = failed + ?, retained = retained + ?,
+                status = ?, updated_at = ?, finished_at = CASE WHEN ? = 'done' THEN ? ELSE finished_at END
+            WHERE id = ?
+            """,
+            (last_id, processed, failed, retained, status, now, status, now, run_id)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def set_status(run_id, status):
+    conn = _connect()
+    try:
+        conn.execute(
+            "UPDATE reprocess_runs SET status = ?, updated_at = ? WHERE id = ?",
+            (status, datetime.now().isoformat(), run_id)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _format_eta(seconds):
+    if seconds is None:
+        return "-"
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+async def _process_chunk(client, items, concurrency):
+    """并发分析一块文章并写回，返回 (失败数, 保留数)"""
+    sem = asyncio.Semaphore(concurrency)
+    junk_flags = info_analysis.junk_title_flags([item.get("title") for item in items])
+    counts = {"failed": 0, "retained": 0}
+
+    async def runner(item, junk_title):
+        async with sem:
+            try:
+                return await info_analysis.collect_item_analysis(client, item, junk_title)
+            except Exception as e:
+                print(f"[Reprocess] 分析失败 #{item['id']}: {e}")
+                return None, None
+
+    collected = await asyncio.gather(*(runner(item, flag) for item, flag in zip(items, junk_flags)))
+    # 相关性判断 (正文关键词扫描) 按块一次提交到进程池，多块文章时可用满多核
+    drafts = [draft for _, draft in collected if draft is not None]
+    flags = await cpu_pool.map_chunked(
+        info_analysis.relevance_flags,
+        [info_analysis.relevance_input(draft) for draft in drafts],
+        chunk_size=max(1, -(-len(drafts) // max(1, config.CPU_POOL_WORKERS))),
+    )
+    flags = iter(flags)
+    for res, draft in collected:
+        if draft is not None:
+            res = info_analysis.finalize_draft(draft, next(flags))
+        # 模型调用失败时不覆盖原有分析结果
+        if not res or res.get("remark") == "分析失败":
+            counts["failed"] += 1
+            continue
+        if not await asyncio.to_thread(database.save_article, res):
+            counts["failed"] += 1
+            continue
+        if res.get("is_retained") == 1:
+            counts["retained"] += 1
+    # 标题与摘要已更新，重新计算语义检索向量
+    try:
+        await semantic_index.index_articles([item["id"] for item in items], force=True)
+    except Exception as e:
+        print(f"[Reprocess] 语义索引更新失败: {e}")
+    return counts["failed"], counts["retained"]
+
+
+async def run_reprocess(run_id, chunk_size=DEFAULT_CHUNK_SIZE, concurrency=DEFAULT_CONCURRENCY):
+    """从断点开始执行重新分析任务，返回本次处理的文章数"""
+    run = get_run(run_id)
+    if not run:
+        print(f"[Reprocess] 任务不存在: {run_id}")
+        return 0
+    if run["status"] == "done":
+        print(f"[Reprocess] 任务 #{run_id} 已完成")
+        return 0
+    if not config.TEXT_LLM_API_KEY:
+        print("[Reprocess] Error: TEXT_LLM_API_KEY is not set in config.")
+        return 0
+
+    filters = run["filters"]
+    last_id = run["last_id"] or 0
+    remaining = count_articles(filters, after_id=last_id)
+    print(f"[Reprocess] 任务 #{run_id} 筛选 {filters}，已处理 {run['processed']}，剩余 {remaining} 篇")
+    set_status(run_id, "running")
+
+    client = shared_resources.get_text_client()
+    started = time.monotonic()
+    done = 0
+    status = "interrupted"
+    try:
+        while True:
+            items = fetch_chunk(filters, last_id, chunk_size)
+            if not items:
+                status = "done"
+                save_checkpoint(run_id, last_id, 0, 0, 0, status="done")
+                break
+            failed, retained = await _process_chunk(client, items, concurrency)
+            last_id = items[-1]["id"]
+            save_checkpoint(run_id, last_id, len(items), failed, retained)
+            done += len(items)
+            elapsed = time.monotonic() - started
+            rate = done / elapsed if elapsed > 0 else 0
+            left = max(remaining - done, 0)
+            eta = left / rate if rate > 0 else None
+            print(f"[Reprocess] #{run_id} {done}/{remaining} ({done / max(remaining, 1) * 100:.1f}%) "
+                  f"本块失败 {failed} 保留 {retained}  {rate * 60:.1f} 篇/分钟  预计剩余 {_format_eta(eta)}")
+    except Exception:
+        status = "failed"
+        raise
+    finally:
+        if status != "done":
+            set_status(run_id, status)
+        print(f"[Reprocess] 任务 #{run_id} {status}，本次处理 {done} 篇，用时 {_format_eta(time.monotonic() - started)}")
+    return done
+
+
+def execute(run_id, chunk_size=DEFAULT_CHUNK_SIZE, concurrency=DEFAULT_CONCURRENCY):
+    """在 job_runs 互斥下运行任务 (同一时间只允许一个重新分析任务)"""
+    job_run_id = job_runs.start_run("reprocess", "manual")
+    if job_run_id is None:
+        print("[Reprocess] 已有重新分析任务在运行，退出")
+        return 0
+
+    async def runner():
+        try:
+            return await run_reprocess(run_id, chunk_size, concurrency)
+        finally:
+            await shared_resources.close()
+
+    try:
+        done = asyncio.run(runner())
+    except BaseException as e:
+        job_runs.finish_run(job_run_id, "failed" if isinstance(e, Exception) else "interrupted",
+                            detail={"reprocess_run": run_id}, error=str(e) or type(e).__name__)
+        raise
+    job_runs.finish_run(job_run_id, "success", done, detail={"reprocess_run": run_id})
+    return done
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="历史文章重新分析")
+    sub = parser.add_subparsers(dest="action", required=True)
+    run_parser = sub.add_parser("run", help="按条件新建并执行重新分析任务")
+    run_parser.add_argument("--start", help="发布日期起 (YYYY-MM-DD)")
+    run_parser.add_argument("--end", help="发布日期止 (YYYY-MM-DD，含当天)")
+    run_parser.add_argument("--source", help="来源名称或来源类型 (rss / web / wechat ...)")
+    run_parser.add_argument("--category", help="当前分类 (Bid / Equipment / Market ...)")
+    run_parser.add_argument("--include-invalid", action="store_true", help="同时重新分析已判定无效的文章")
+    resume_parser = sub.add_parser("resume", help="从断点继续未完成的任务")
+    resume_parser.add_argument("--run-id", type=int, help="任务编号，缺省为最近一个未完成的任务")
+    for p in (run_parser, resume_parser):
+        p.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="每块文章数 (断点粒度)")
+        p.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="块内并发调用模型数")
+    list_parser = sub.add_parser("list", help="最近的重新分析任务")
+    list_parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    database.init_db()
+    if args.action == "list":
+        for run in list_reprocess_runs(args.limit):
+            print(f"#{run['id']:<4} {run['status']:<11} {run['processed']}/{run['total']} 失败 {run['failed']} "
+                  f"保留 {run['retained']} last_id={run['last_id']}  {run['created_at'][:19]}  {run['filters']}")
+    else:
+        if args.action == "run":
+            filters = {k: v for k, v in {
+                "start": args.start,
+                "end": args.end,
+                "source": args.source,
+                "category": args.category,
+                "include_invalid": args.include_invalid,
+            }.items() if v}
+            target = create_run(filters)
+            print(f"[Reprocess] 新建任务 #{target}，共 {get_run(target)['total']} 篇")
+        else:
+            run = get_run(args.run_id)
+            if not run:
+                print("[Reprocess] 没有未完成的任务")
+                sys.exit(0)
+            target = run["id"]
+        execute(target, chunk_size=args.chunk_size, concurrency=max(1, args.concurrency))
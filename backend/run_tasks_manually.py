@@ -23,7 +23,7 @@ def run(use_test_source=False):
     
     print("\n[1/3] 开始运行采集任务 (job_fetch)...")
     try:
-        scheduler.job_fetch()
+        scheduler.run_job_once(scheduler.job_fetch)
     except Exception as e:
         print(f"采集任务运行失败: {e}")
         import traceback
@@ -35,7 +35,7 @@ def run(use_test_source=False):
 
     print("\n[2/3] 开始运行船舶追踪任务 (job_ship_tracker)...")
     try:
-        scheduler.job_ship_tracker()
+        scheduler.run_job_once(scheduler.job_ship_tracker)
     except Exception as e:
         print(f"船舶追踪任务运行失败: {e}")
         import traceback
@@ -43,7 +43,7 @@ def run(use_test_source=False):
 
     print("\n[3/3] 开始运行推送任务 (job_push)...")
     try:
-        scheduler.job_push()
+        scheduler.run_job_once(scheduler.job_push)
         print("推送任务运行完成。")
     except Exception as e:
         print(f"推送任务运行失败: {e}")
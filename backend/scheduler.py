@@ -1,17 +1,39 @@
+"""
+定时任务调度器
+
+单个长驻 asyncio 事件循环驱动所有定时任务:
+- 采集任务直接在事件循环中运行，浏览器与模型客户端在多次运行之间复用 (shared_resources)
+- 同步任务 (船舶追踪、推送、回收、归档) 放到线程池执行，不阻塞事件循环
+- 同一任务不会重叠运行；到点时上一次仍未结束，则在结束后补跑一次
+- 停机或阻塞期间错过的运行，在补跑时限内补跑一次 (多次错过合并为一次)
+- 按秒计算下次运行时间
+"""
+
+import argparse
 import asyncio
+import json
 import os
-import time
-import threading
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time as dt_time, timedelta
 
 import acquisition.ship_status_fetcher as ship_status_fetcher
 import analysis.ships_status as ships_status
+import analysis.ship_activity as ship_activity
+import asset_store
 import config
+import job_runs
 import main
 import reporting.wecom_push as wecom_push
-import schedule
+import shared_resources
+import track_archive
 
 LOG_FILE = os.path.join(config.DATA_DIR, "scheduler.log")
+# 各任务最近一次开始运行的时间，用于重启后判断错过的运行
+STATE_FILE = os.path.join(config.DATA_DIR, "scheduler_state.json")
+# 单次休眠上限，系统休眠或时钟调整后也能及时发现到期任务
+MAX_SLEEP_SECONDS = 30
+
+JOB_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="job")
 
 
 def write_log(message: str) -> None:
@@ -26,76 +48,320 @@ def write_log(message: str) -> None:
         print(f"写入日志失败: {e}")
 
 
-def run_threaded(job_func):
-    """在独立线程中运行任务，避免阻塞调度器"""
-    job_thread = threading.Thread(target=job_func)
-    job_thread.start()
+# 任务返回处理条数 (int) 或统计字典 (其中 items 为处理条数)，写入 job_runs；
+# 出错时记录日志后继续抛出，由运行器记为 failed
 
-
-def job_fetch() -> None:
+async def job_fetch():
     """执行信息抓取任务"""
     write_log("启动抓取任务...")
     try:
-        # 使用 asyncio.run 运行异步主函数
-        # 注意：在线程中直接调用 asyncio.run 是安全的，因为它会创建一个新的事件循环
-        asyncio.run(main.main())
+        # 在调度器事件循环中运行，复用共享浏览器与模型客户端
+        stats = await main.main()
         write_log("抓取任务完成")
+        return stats
     except Exception as e:
         write_log(f"抓取任务出错: {e}")
+        raise
 
 
-def job_push() -> None:
+def job_push():
     """执行推送任务"""
     write_log("启动推送任务...")
     try:
-        wecom_push.push_daily_report()
+        pushed = wecom_push.push_daily_report()
         write_log("推送任务完成")
+        return pushed
     except Exception as e:
         write_log(f"推送任务出错: {e}")
+        raise
 
 
-def job_ship_tracker() -> None:
+def job_ship_tracker():
     """执行船舶追踪与分析任务"""
     write_log("启动船舶追踪任务...")
     try:
-        ship_status_fetcher.update_ship_statuses()
+        positions = ship_status_fetcher.update_ship_statuses()
         updated = ships_status.update_ships_status_from_tracks()
-        write_log(f"船舶追踪任务完成，分析更新了 {updated} 艘船舶状态")
+        segmented = ship_activity.update_activity_segments()
+        write_log(f"船舶追踪任务完成，分析更新了 {updated} 艘船舶状态，{segmented} 艘船舶作业分段")
+        return {"items": positions, "positions": positions, "status_updated": updated, "segmented": segmented}
     except Exception as e:
         write_log(f"船舶追踪任务出错: {e}")
+        raise
+
+
+def job_asset_gc():
+    """回收无引用的截图文件"""
+    write_log("启动截图回收任务...")
+    try:
+        stats = asset_store.collect_garbage()
+        write_log(f"截图回收任务完成，删除 {stats['removed']} 个文件")
+        return {"items": stats["removed"], **stats}
+    except Exception as e:
+        write_log(f"截图回收任务出错: {e}")
+        raise
+
+
+def job_track_archive():
+    """将热表中的旧轨迹归档为按月列式文件"""
+    write_log("启动轨迹归档任务...")
+    try:
+        stats = track_archive.compact_tracks()
+        write_log(f"轨迹归档任务完成，归档 {stats['archived']} 个轨迹点")
+        return {"items": stats["archived"], **stats}
+    except Exception as e:
+        write_log(f"轨迹归档任务出错: {e}")
+        raise
+
+
+class Job:
+    """一个定时任务: 每天固定时刻 (times) 或固定间隔 (interval 秒) 运行"""
+
+    def __init__(self, name, func, times=None, interval=None, misfire_grace=6 * 3600, max_queue=1):
+        self.name = name
+        self.func = func
+        self.times = sorted(dt_time.fromisoformat(t) for t in (times or []))
+        self.interval = interval
+        self.misfire_grace = misfire_grace
+        self.last_run = None
+        self.next_run = None
+        self.running = False
+        # 运行中再次到期的触发排队等待，超过 max_queue 的直接丢弃 (记为 skipped)
+        self.max_queue = max_queue
+        self.queue = []
+
+    def describe(self) -> str:
+        if self.interval:
+            return f"每 {self.interval // 60} 分钟" if self.interval % 60 == 0 else f"每 {self.interval} 秒"
+        return ", ".join(t.strftime("%H:%M:%S" if t.second else "%H:%M") for t in self.times)
+
+    def next_after(self, moment: datetime) -> datetime:
+        """moment 之后的第一个计划时间"""
+        if self.interval:
+            base = self.next_run or moment
+            if base > moment:
+                return base
+            steps = int((moment - base).total_seconds() // self.interval) + 1
+            return base + timedelta(seconds=steps * self.interval)
+        for day in range(2):
+            date = (moment + timedelta(days=day)).date()
+            for t in self.times:
+                candidate = datetime.combine(date, t)
+                if candidate > moment:
+                    return candidate
+        return datetime.combine(moment.date() + timedelta(days=1), self.times[0])
+
+    def previous_slot(self, moment: datetime):
+        """moment 及之前最近的计划时间 (固定时刻任务)"""
+        for day in range(2):
+            date = (moment - timedelta(days=day)).date()
+            for t in reversed(self.times):
+                candidate = datetime.combine(date, t)
+                if candidate <= moment:
+                    return candidate
+        return None
+
+
+class Scheduler:
+    """asyncio 调度器"""
 
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self.tasks = set()
 
-def setup_schedule() -> None:
+    def _load_state(self):
+        try:
+            with open(STATE_FILE, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_state(self):
+        state = {job.name: job.last_run.isoformat() for job in self.jobs if job.last_run}
+        tmp_path = f"{STATE_FILE}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, STATE_FILE)
+        except Exception as e:
+            print(f"写入调度状态失败: {e}")
+
+    def _init_next_runs(self, now: datetime):
+        state = self._load_state()
+        for job in self.jobs:
+            last_run = state.get(job.name)
+            job.last_run = datetime.fromisoformat(last_run) if last_run else None
+            if job.interval:
+                # 间隔任务: 超过一个间隔未运行则立即运行
+                if job.last_run and now - job.last_run < timedelta(seconds=job.interval):
+                    job.next_run = job.last_run + timedelta(seconds=job.interval)
+                else:
+                    job.next_run = now
+                continue
+            # 固定时刻任务: 停机期间错过的最近一次在补跑时限内补跑
+            slot = job.previous_slot(now)
+            if job.last_run and slot and job.last_run < slot and (now - slot).total_seconds() <= job.misfire_grace:
+                write_log(f"任务 {job.name} 错过了 {slot.strftime('%m-%d %H:%M')} 的运行，立即补跑")
+                job.next_run = now
+            else:
+                job.next_run = job.next_after(now)
+
+    def _dispatch(self, job: Job, trigger="schedule"):
+        if job.running:
+            # 不重叠运行: 排队等待当前运行结束，队列满则放弃本次
+            if len(job.queue) >= job.max_queue:
+                write_log(f"任务 {job.name} 仍在运行且排队已满，跳过本次 ({trigger})")
+                job_runs.record_skipped(job.name, trigger, "queue full")
+            else:
+                write_log(f"任务 {job.name} 上一次运行尚未结束，结束后补跑")
+                job.queue.append(trigger)
+            return
+        job.running = True
+        task = asyncio.create_task(self._run(job, trigger))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _run(self, job: Job, trigger):
+        try:
+            run_id = job_runs.start_run(job.name, trigger)
+            if run_id is None:
+                # 其他进程 (如手动运行) 正在执行同名任务
+                write_log(f"任务 {job.name} 正在其他进程中运行，跳过本次")
+                return
+            job.last_run = datetime.now()
+            self._save_state()
+            status, items, detail, error = "success", None, None, None
+            try:
+                if asyncio.iscoroutinefunction(job.func):
+                    result = await job.func()
+                else:
+                    result = await asyncio.get_running_loop().run_in_executor(JOB_EXECUTOR, job.func)
+                items, detail = _split_result(result)
+            except asyncio.CancelledError:
+                job_runs.finish_run(run_id, "interrupted", error="cancelled")
+                raise
+            except Exception as e:
+                status, error = "failed", str(e)
+                write_log(f"任务 {job.name} 异常退出: {e}")
+            job_runs.finish_run(run_id, status, items, detail, error)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            write_log(f"任务 {job.name} 运行记录失败: {e}")
+        finally:
+            job.running = False
+        if job.queue:
+            self._dispatch(job, job.queue.pop(0))
+
+    def _tick(self, now: datetime):
+        for job in self.jobs:
+            if job.next_run > now:
+                continue
+            late = (now - job.next_run).total_seconds()
+            if late > job.misfire_grace:
+                write_log(f"任务 {job.name} 已错过 {late / 3600:.1f} 小时，超过补跑时限，跳过")
+            elif late > MAX_SLEEP_SECONDS * 2:
+                write_log(f"任务 {job.name} 延迟 {late:.0f} 秒，补跑一次")
+                self._dispatch(job, "catchup")
+            else:
+                self._dispatch(job)
+            job.next_run = job.next_after(now)
+
+    async def run_forever(self):
+        self._init_next_runs(datetime.now())
+        # 上次异常退出时遗留的 running 记录 (同 pid 复用的极端情况)
+        job_runs.mark_interrupted()
+        try:
+            while True:
+                now = datetime.now()
+                self._tick(now)
+                wake = min(job.next_run for job in self.jobs)
+                delay = (wake - datetime.now()).total_seconds()
+                await asyncio.sleep(min(max(delay, 0.05), MAX_SLEEP_SECONDS))
+        finally:
+            for task in list(self.tasks):
+                task.cancel()
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+            await shared_resources.close()
+
+
+def _split_result(result):
+    """任务返回值拆分为 (处理条数, 统计详情)"""
+    if isinstance(result, dict):
+        items = result.get("items")
+        return (int(items) if isinstance(items, (int, float)) else None), result
+    if isinstance(result, (int, float)) and not isinstance(result, bool):
+        return int(result), None
+    return None, None
+
+
+def build_jobs():
     """注册定时任务"""
-    # 抓取任务耗时较长，使用多线程运行，避免阻塞船舶追踪
-    schedule.every().day.at("00:00").do(run_threaded, job_fetch)
-    schedule.every().day.at("04:00").do(run_threaded, job_fetch)
-    schedule.every().day.at("07:30").do(run_threaded, job_fetch)
-    schedule.every().day.at("12:00").do(run_threaded, job_fetch)
-    schedule.every().day.at("16:00").do(run_threaded, job_fetch)
-    schedule.every().day.at("20:00").do(run_threaded, job_fetch)
-    
-    # 推送任务也建议独立线程
-    schedule.every().day.at("08:00").do(run_threaded, job_push)
-    schedule.every().day.at("18:00").do(run_threaded, job_push)
-    
-    # 船舶追踪任务频率高但耗时短，可以直接运行，也可以独立线程（为了保险起见，建议也独立）
-    schedule.every(5).minutes.do(run_threaded, job_ship_tracker)
+    return [
+        Job("fetch", job_fetch, times=["00:00", "04:00", "07:30", "12:00", "16:00", "20:00"]),
+        # 推送时效性强，错过 2 小时以上不再补推
+        Job("push", job_push, times=["08:00", "18:00"], misfire_grace=2 * 3600),
+        Job("ship_tracker", job_ship_tracker, interval=5 * 60),
+        # 截图回收与轨迹归档避开采集时段
+        Job("asset_gc", job_asset_gc, times=["03:00"]),
+        Job("track_archive", job_track_archive, times=["03:30"]),
+    ]
+
+
+JOB_LABELS = {
+    "fetch": "采集",
+    "push": "推送",
+    "ship_tracker": "追踪",
+    "asset_gc": "截图回收",
+    "track_archive": "轨迹归档",
+}
+
+
+def run_job_once(job_func, job_name=None):
+    """在当前线程单独执行一次任务 (手动运行)，同样登记运行记录并与调度进程互斥"""
+    job_name = job_name or job_func.__name__.replace("job_", "", 1)
+    run_id = job_runs.start_run(job_name, "manual")
+    if run_id is None:
+        print(f"任务 {job_name} 正在其他进程中运行，跳过")
+        return None
+
+    async def runner():
+        try:
+            return await job_func()
+        finally:
+            await shared_resources.close()
+
+    try:
+        result = asyncio.run(runner()) if asyncio.iscoroutinefunction(job_func) else job_func()
+    except BaseException as e:
+        job_runs.finish_run(run_id, "failed" if isinstance(e, Exception) else "interrupted", error=str(e))
+        raise
+    items, detail = _split_result(result)
+    job_runs.finish_run(run_id, "success", items, detail)
+    return result
 
 
 def main_entry() -> None:
-    """启动调度器主循环"""
-    setup_schedule()
+    """启动调度器主循环；--once 单独执行一次指定任务"""
+    jobs = build_jobs()
+    parser = argparse.ArgumentParser(description="疏浚情报定时任务调度器 (运行记录见 python job_runs.py runs / summary)")
+    parser.add_argument("--once", choices=[job.name for job in jobs], help="立即执行一次指定任务后退出")
+    args = parser.parse_args()
+    if args.once:
+        job = next(job for job in jobs if job.name == args.once)
+        run_job_once(job.func, job.name)
+        return
+
     print("=== 疏浚情报定时任务系统启动 ===")
     print("计划任务:")
-    print("- 采集: 00:00, 04:00, 07:30, 0:00, 12:00, 16:00, 20:00")
-    print("- 推送: 08:00, 18:00")
-    print("- 追踪: 每 5 分钟")
+    for job in jobs:
+        print(f"- {JOB_LABELS.get(job.name, job.name)}: {job.describe()}")
     print("--------------------------------")
     print("系统正在运行中 (Ctrl+C 停止)...")
-    while True:
-        schedule.run_pending()
-        time.sleep(60)
+    try:
+        asyncio.run(Scheduler(jobs).run_forever())
+    except KeyboardInterrupt:
+        print("调度器已停止")
 
 
 if __name__ == "__main__":
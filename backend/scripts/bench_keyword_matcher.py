@@ -0,0 +1,115 @@
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+import database
+from analysis import info_analysis
+from static import keyword_matcher
+from static.constants import KEYWORD_CATEGORY_MAP, infer_category_from_text
+
+# 合成文本: 疏浚相关 (命中较早) 与无关 (需扫描全部关键词) 各一半
+RELEVANT_WORDS = (
+    "the of and to in for on with by from company said project vessel contract port harbour channel "
+    "dredging works river terminal coastal completed expansion maintenance government funding 港口 航道 "
+    "疏浚 码头 工程 项目 合同 建设 完成 公司 表示 海岸 运河 泊位"
+).split()
+UNRELATED_WORDS = "the of and to in for on with by from said today year new also after 公司 表示 今天 发布 会议".split()
+
+
+def legacy_is_relevant(text):
+    """改造前的逐词子串判断 (仅正文部分)"""
+    lower = text.lower()
+    strong = info_analysis.RELEVANT_STRONG_MATCHER.keywords
+    secondary = info_analysis.RELEVANT_SECONDARY_MATCHER.keywords
+    if any(k in lower for k in strong):
+        return True
+    return sum(1 for k in secondary if k in lower) >= 2
+
+
+def legacy_infer_category(text):
+    lower = text.lower()
+    for keywords, category in KEYWORD_CATEGORY_MAP:
+        if any(k in lower for k in keywords):
+            return category
+    return None
+
+
+def current_is_relevant(text):
+    lower = text.lower()
+    if info_analysis.RELEVANT_STRONG_MATCHER.contains_any(lower, lowered=True):
+        return True
+    return info_analysis.RELEVANT_SECONDARY_MATCHER.count(lower, limit=2, lowered=True) >= 2
+
+
+def synthetic_texts(words, count, seed):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(300, 2500)))[:15000] for _ in range(count)]
+
+
+def load_texts(limit):
+    """从文章库读取正文 (原文 + 中文全文)，没有文章时使用合成文本"""
+    texts = []
+    if os.path.exists(database.DB_PATH):
+        conn = sqlite3.connect(database.DB_PATH)
+        try:
+            rows = conn.execute(
+                "SELECT a.id, a.title FROM articles a JOIN article_texts t ON t.article_id = a.id "
+                "WHERE t.content IS NOT NULL ORDER BY a.id DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+            items = database.attach_article_texts([{"id": r[0], "title": r[1]} for r in rows], conn=conn)
+            texts = [" ".join(v for v in (i["title"], i["content"], i["full_text_cn"]) if v) for i in items]
+        finally:
+            conn.close()
+    if texts:
+        return {"articles": texts}
+    half = max(limit // 2, 1)
+    return {
+        "synthetic relevant": synthetic_texts(RELEVANT_WORDS, half, 42),
+        "synthetic unrelated": synthetic_texts(UNRELATED_WORDS, half, 43),
+    }
+
+
+def bench(func, texts, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            func(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(texts) * 1e6
+
+
+def main():
+    """关键词匹配微基准: 改造前的逐词子串查找 vs KeywordMatcher"""
+    parser = argparse.ArgumentParser(description="Keyword matcher micro-benchmark")
+    parser.add_argument("--limit", type=int, default=500, help="number of article texts")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    backend = "pyahocorasick" if keyword_matcher.ahocorasick else "substring scan"
+    print(f"matcher backend: {backend}")
+    cases = [
+        ("relevance", legacy_is_relevant, current_is_relevant),
+        ("category", legacy_infer_category, infer_category_from_text),
+    ]
+    for source, texts in load_texts(args.limit).items():
+        avg_len = sum(len(t) for t in texts) / len(texts)
+        print(f"{source}: {len(texts)} texts, avg {avg_len:.0f} chars")
+        for name, legacy, current in cases:
+            mismatches = sum(1 for t in texts if legacy(t) != current(t))
+            legacy_us = bench(legacy, texts, args.repeat)
+            current_us = bench(current, texts, args.repeat)
+            print(f"  {name:<10} legacy {legacy_us:8.1f} us/text  matcher {current_us:8.1f} us/text  "
+                  f"speedup {legacy_us / current_us:4.2f}x  mismatches {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
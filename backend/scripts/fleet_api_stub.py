@@ -0,0 +1,115 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+import database
+
+
+class FleetState:
+    """模拟 Fleet API 的船队数据，每隔 interval 秒移动一部分船舶"""
+
+    def __init__(self, mmsi_list, move_ratio):
+        self.lock = threading.Lock()
+        self.move_ratio = move_ratio
+        self.ships = {
+            mmsi: {
+                "mmsi": mmsi,
+                "shipname": f"STUB {mmsi}",
+                "lat": round(random.uniform(20, 35), 6),
+                "lon": round(random.uniform(110, 125), 6),
+                "speed": 0.0,
+                "heading": 0.0,
+                "status": "Moored",
+                "updatetime": datetime.now().isoformat(timespec="seconds"),
+            }
+            for mmsi in mmsi_list
+        }
+        self._render()
+
+    def _render(self):
+        self.body = json.dumps({"result": "ok", "list": list(self.ships.values())}).encode("utf-8")
+        self.etag = f'"{hashlib.sha1(self.body).hexdigest()}"'
+        self.modified = time.time()
+
+    def tick(self):
+        with self.lock:
+            now = datetime.now().isoformat(timespec="seconds")
+            for ship in random.sample(list(self.ships.values()), int(len(self.ships) * self.move_ratio)):
+                ship["lat"] = round(ship["lat"] + random.uniform(-0.01, 0.01), 6)
+                ship["lon"] = round(ship["lon"] + random.uniform(-0.01, 0.01), 6)
+                ship["speed"] = round(random.uniform(0, 12), 1)
+                ship["status"] = "Under way"
+                ship["updatetime"] = now
+            self._render()
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with state.lock:
+                body, etag, modified = state.body, state.etag, state.modified
+            since = self.headers.get("If-Modified-Since")
+            not_modified = self.headers.get("If-None-Match") == etag
+            if not not_modified and since and not self.headers.get("If-None-Match"):
+                try:
+                    not_modified = parsedate_to_datetime(since).timestamp() >= int(modified)
+                except (TypeError, ValueError):
+                    pass
+            if not_modified:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", formatdate(modified, usegmt=True))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt, *args):
+            print(f"[FleetStub] {self.address_string()} {fmt % args}")
+
+    return Handler
+
+
+def main():
+    """本地 Fleet API 替身，用于调试 ship_status_fetcher (FLEET_API_URL=http://127.0.0.1:<port>/)"""
+    parser = argparse.ArgumentParser(description="Local stand-in for the Fleet API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--interval", type=float, default=60, help="seconds between fleet movements")
+    parser.add_argument("--move-ratio", type=float, default=0.2, help="share of vessels that move per interval")
+    parser.add_argument("--count", type=int, default=0, help="generate N fake vessels instead of using ship_infos")
+    args = parser.parse_args()
+
+    if args.count:
+        mmsi_list = [str(413000000 + i) for i in range(args.count)]
+    else:
+        mmsi_list = [str(ship["mmsi"]) for ship in database.get_all_ships(columns=("mmsi",)) if ship.get("mmsi")]
+    state = FleetState(mmsi_list, args.move_ratio)
+
+    def mover():
+        while True:
+            time.sleep(args.interval)
+            state.tick()
+
+    threading.Thread(target=mover, daemon=True).start()
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(state))
+    print(f"[FleetStub] serving {len(mmsi_list)} vessels on http://127.0.0.1:{args.port}/")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+import sys
+import os
+
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+import database
+
+def rebuild():
+    """从 articles 全量重建文章日汇总表 (统计页数据来源)"""
+    database.init_db()
+    count = database.rebuild_article_rollups()
+    print(f"Rebuilt article_daily_stats: {count} rows.")
+
+if __name__ == "__main__":
+    rebuild()
@@ -0,0 +1,101 @@
+"""
+长驻进程共享资源
+
+调度器在同一个事件循环中反复执行采集与分析任务，浏览器与大模型客户端在任务之间复用，
+不再每次运行都重新启动 Playwright / 建立 HTTP 连接池:
+- get_browser(): 共享 Chromium 实例，调用方自行创建并关闭 BrowserContext
+- get_text_client() / get_vl_client(): 复用的 AsyncOpenAI 客户端
+- 文本后处理进程池 (cpu_pool) 同样在 close() 时关闭
+
+资源绑定到创建它们的事件循环；单次运行 (asyncio.run) 结束前应调用 close()。
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import config
+import cpu_pool
+
+
+class _Resources:
+    def __init__(self, loop):
+        self.loop = loop
+        self.lock = asyncio.Lock()
+        self.playwright = None
+        self.browser = None
+        self.text_client = None
+        self.vl_client = None
+
+
+_resources = None
+
+
+def _current():
+    """当前事件循环的资源，事件循环变化 (新的 asyncio.run) 时重新创建"""
+    global _resources
+    loop = asyncio.get_running_loop()
+    if _resources is None or _resources.loop is not loop:
+        _resources = _Resources(loop)
+    return _resources
+
+
+async def get_browser():
+    """获取共享浏览器，未启动或已断开时 (重新) 启动"""
+    from playwright.async_api import async_playwright
+    from acquisition.source_manager import SourceManager
+
+    res = _current()
+    async with res.lock:
+        if res.browser is not None and res.browser.is_connected():
+            return res.browser
+        if res.playwright is None:
+            res.playwright = await async_playwright().start()
+        res.browser = await SourceManager.launch_browser(res.playwright)
+        print("[Resources] 已启动共享浏览器")
+        return res.browser
+
+
+def get_text_client():
+    """文本模型客户端"""
+    from openai import AsyncOpenAI
+
+    res = _current()
+    if res.text_client is None:
+        res.text_client = AsyncOpenAI(api_key=config.TEXT_LLM_API_KEY, base_url=config.TEXT_LLM_API_BASE)
+    return res.text_client
+
+
+def get_vl_client():
+    """视觉模型客户端"""
+    from openai import AsyncOpenAI
+
+    res = _current()
+    if res.vl_client is None:
+        res.vl_client = AsyncOpenAI(api_key=config.VL_LLM_API_KEY, base_url=config.VL_LLM_API_BASE)
+    return res.vl_client
+
+
+async def close():
+    """关闭当前事件循环中的共享资源"""
+    global _resources
+    cpu_pool.shutdown()
+    res = _resources
+    if res is None or res.loop is not asyncio.get_running_loop():
+        return
+    _resources = None
+    for client in (res.text_client, res.vl_client):
+        if client is not None:
+            try:
+                await client.close()
+            except Exception as e:
+                print(f"[Resources] 关闭模型客户端失败: {e}")
+    try:
+        if res.browser is not None:
+            await res.browser.close()
+        if res.playwright is not None:
+            await res.playwright.stop()
+    except Exception as e:
+        print(f"[Resources] 关闭浏览器失败: {e}")
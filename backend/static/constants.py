@@ -2,6 +2,8 @@
 公共常量模块 - 集中管理全系统共享的常量和配置
 """
 
+from static.keyword_matcher import KeywordMatcher
+
 DEFAULT_CATEGORY = "Market"
 
 ALLOWED_CATEGORIES = {
@@ -51,6 +53,11 @@ JUNK_KEYWORDS_PARTIAL = [
     "Browser Update", "Enable JavaScript"
 ]
 
+# 关键词集合在加载时编译一次
+CATEGORY_MATCHER = KeywordMatcher.from_groups(KEYWORD_CATEGORY_MAP)
+# 每个关键词单独成组，first_label 返回原始写法便于记录过滤原因
+JUNK_KEYWORDS_MATCHER = KeywordMatcher.from_groups([([kw], kw) for kw in JUNK_KEYWORDS_PARTIAL])
+
 def normalize_category(value):
     """归一化分类名称"""
     if value is None:
@@ -77,25 +84,20 @@ def normalize_category(value):
     compact = "".join(ch for ch in lower if ch.isalnum())
     if compact in ["rd", "researchdevelopment"]:
         return "R&D"
-    for keywords, category in KEYWORD_CATEGORY_MAP:
-        if any(k in lower for k in keywords):
-            return category
-    return None
+    return CATEGORY_MATCHER.first_label(lower, lowered=True)
 
 def infer_category_from_text(text):
     """从文本内容推断分类"""
     if not text:
         return None
-    lower = str(text).lower()
-    for keywords, category in KEYWORD_CATEGORY_MAP:
-        if any(k in lower for k in keywords):
-            return category
-    return None
+    return CATEGORY_MATCHER.first_label(text)
 
 def text_contains_any(text, keywords):
-    """检查文本是否包含任意关键词"""
+    """检查文本是否包含任意关键词 (keywords 可为关键词列表或 KeywordMatcher)"""
     if not text:
         return False
+    if isinstance(keywords, KeywordMatcher):
+        return keywords.contains_any(text)
     lower = str(text).lower()
     return any(k in lower for k in keywords)
 
@@ -103,6 +105,8 @@ __all__ = [
     "DEFAULT_CATEGORY",
     "ALLOWED_CATEGORIES",
     "KEYWORD_CATEGORY_MAP",
+    "CATEGORY_MATCHER",
+    "JUNK_KEYWORDS_MATCHER",
     "CATEGORY_CN_MAP",
     "normalize_category",
     "infer_category_from_text",
@@ -0,0 +1,136 @@
+"""
+关键词匹配器
+
+相关性判断、垃圾标题识别、分类推断等处使用的关键词集合在模块加载时编译一次:
+- 安装了 pyahocorasick 时构建 Aho-Corasick 自动机，一次扫描得到全部命中，
+  扫描耗时与关键词数量无关；只需判断“是否命中/前几个命中”时在得到结论后立即停止
+- 未安装时逐个关键词做子串查找并尽早返回 (CPython 的子串查找比合并正则更快)
+
+匹配语义与原先的 `k in text.lower()` 完全一致 (子串匹配、忽略大小写、命中可重叠)。
+调用方已做过小写转换时传入 lowered=True，避免对长正文重复转换。
+"""
+
+try:
+    import ahocorasick
+except ImportError:  # 未安装 pyahocorasick 时退化为逐词子串查找
+    ahocorasick = None
+
+
+class KeywordMatcher:
+    """编译后的关键词集合，可按组 (label) 归类"""
+
+    __slots__ = ("keywords", "order", "groups", "_group_index", "_automaton")
+
+    def __init__(self, keywords, label=None):
+        self.keywords = []       # 去重后的小写关键词，保持定义顺序
+        self.order = {}          # 关键词 -> 定义顺序
+        self.groups = []         # [(label, [关键词])]，顺序即 first_label 的优先级
+        self._group_index = {}   # 关键词 -> 所属的第一个组
+        self._automaton = None
+        if keywords:
+            self._add_group(keywords, label)
+            self._build()
+
+    @classmethod
+    def from_groups(cls, groups):
+        """由 [(关键词列表, label), ...] 构建"""
+        matcher = cls(None)
+        for keywords, label in groups:
+            matcher._add_group(keywords, label)
+        matcher._build()
+        return matcher
+
+    def _add_group(self, keywords, label):
+        group = []
+        for keyword in keywords:
+            key = str(keyword).lower()
+            if not key or key in group:
+                continue
+            group.append(key)
+            if key not in self.order:
+                self.order[key] = len(self.keywords)
+                self.keywords.append(key)
+                self._group_index[key] = len(self.groups)
+        self.groups.append((label, group))
+
+    def _build(self):
+        if ahocorasick is None or not self.keywords:
+            return
+        automaton = ahocorasick.Automaton()
+        for key in self.keywords:
+            automaton.add_word(key, (key, self.order[key], self._group_index[key]))
+        automaton.make_automaton()
+        self._automaton = automaton
+
+    @staticmethod
+    def _lower(text, lowered):
+        if not text:
+            return ""
+        return text if lowered else str(text).lower()
+
+    def find_all(self, text, lowered=False):
+        """文本中出现的全部关键词 (集合)"""
+        lower = self._lower(text, lowered)
+        if not lower:
+            return set()
+        if self._automaton is not None:
+            return {value[0] for _, value in self._automaton.iter(lower)}
+        return {key for key in self.keywords if key in lower}
+
+    def contains_any(self, text, lowered=False):
+        """是否命中任一关键词"""
+        lower = self._lower(text, lowered)
+        if not lower:
+            return False
+        if self._automaton is not None:
+            return next(self._automaton.iter(lower), None) is not None
+        return any(key in lower for key in self.keywords)
+
+    def count(self, text, limit=None, lowered=False):
+        """命中的不同关键词数；给定 limit 时数到 limit 即停止"""
+        lower = self._lower(text, lowered)
+        if not lower:
+            return 0
+        seen = set()
+        if self._automaton is not None:
+            hits = (value[0] for _, value in self._automaton.iter(lower))
+        else:
+            hits = (key for key in self.keywords if key in lower)
+        for key in hits:
+            seen.add(key)
+            if limit is not None and len(seen) >= limit:
+                break
+        return len(seen)
+
+    def first(self, text, lowered=False):
+        """按定义顺序第一个命中的关键词，未命中返回 None"""
+        lower = self._lower(text, lowered)
+        if not lower:
+            return None
+        if self._automaton is None:
+            return next((key for key in self.keywords if key in lower), None)
+        best = None
+        for _, (key, order, _group) in self._automaton.iter(lower):
+            if best is None or order < best[1]:
+                best = (key, order)
+                if order == 0:
+                    break
+        return best[0] if best else None
+
+    def first_label(self, text, lowered=False):
+        """按组定义顺序第一个有命中的组，未命中返回 None"""
+        lower = self._lower(text, lowered)
+        if not lower:
+            return None
+        if self._automaton is None:
+            for label, keys in self.groups:
+                if any(key in lower for key in keys):
+                    return label
+            return None
+        best = None
+        for _, (_key, _order, group) in self._automaton.iter(lower):
+            if best is None or group < best:
+                best = group
+                if group == 0:
+                    break
+        return self.groups[best][0] if best is not None else None
@@ -0,0 +1,230 @@
+"""
+文章正文压缩存储
+
+正文等大字段不放在 articles 表中，而是存放在按文章 id 索引的 article_texts 表，只在需要时读取:
+- content (网页原文，最长约 1.5 万字符): 使用 zstd + 训练得到的字典压缩为 BLOB
+- full_text_cn (中文全文翻译): 以文本形式保存，全文索引 articles_fts 需要直接读取
+
+同一站点的文章共享大量模板文本 (导航、版权声明、常用术语)，短文本单独压缩效果有限，
+用已有正文训练的字典 (text_dictionaries 表) 可以明显提高压缩率。每行记录使用的编码:
+- "zstd:<字典 id>" / "zstd": zstd 压缩 (有 / 无字典)
+- "zlib": 未安装 zstandard 时的退化方案
+- "raw": 未压缩的 UTF-8
+
+用法:
+    python text_store.py stats        # 查看压缩率
+    python text_store.py train        # 用最近的正文重新训练字典
+    python text_store.py recompress   # 用最新字典重新压缩旧记录
+    python text_store.py vacuum       # 回收迁移/重新压缩后空闲的数据库空间
+"""
+
+import argparse
+import os
+import sys
+import threading
+import zlib
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    import zstandard
+except ImportError:  # 未安装 zstandard 时使用 zlib 压缩 (无字典)
+    zstandard = None
+
+ZSTD_LEVEL = 9
+ZLIB_LEVEL = 9
+DICT_SIZE = 64 * 1024
+TRAIN_SAMPLES = 2000
+TRAIN_MIN_SAMPLES = 200
+# 最新字典之后新增的未用字典压缩的正文达到该数量时重新训练
+RETRAIN_AFTER = 5000
+
+_local = threading.local()
+_latest_dict_id = None
+
+
+def _codecs():
+    """当前线程的 {字典 id: (压缩器, 解压器)} 缓存 (zstd 压缩器不能跨线程共享)"""
+    cache = getattr(_local, "codecs", None)
+    if cache is None:
+        cache = _local.codecs = {}
+    return cache
+
+
+def _zstd_pair(conn, dict_id):
+    cache = _codecs()
+    if dict_id not in cache:
+        dict_data = None
+        if dict_id is not None:
+            row = conn.execute("SELECT data FROM text_dictionaries WHERE id = ?", (dict_id,)).fetchone()
+            if not row:
+                raise ValueError(f"压缩字典不存在: {dict_id}")
+            dict_data = zstandard.ZstdCompressionDict(bytes(row[0]))
+        if dict_data is None:
+            cache[dict_id] = (zstandard.ZstdCompressor(level=ZSTD_LEVEL), zstandard.ZstdDecompressor())
+        else:
+            cache[dict_id] = (
+                zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dict_data),
+                zstandard.ZstdDecompressor(dict_data=dict_data),
+            )
+    return cache[dict_id]
+
+
+def latest_dict_id(conn, refresh=False):
+    """最新的 zstd 字典 id，没有时返回 None"""
+    global _latest_dict_id
+    if _latest_dict_id is None or refresh:
+        row = conn.execute("SELECT MAX(id) FROM text_dictionaries WHERE codec = 'zstd'").fetchone()
+        _latest_dict_id = row[0] if row else None
+    return _latest_dict_id
+
+
+def encode(text, conn):
+    """文本 -> (BLOB, 编码)；空文本返回 (None, None)"""
+    if not text:
+        return None, None
+    raw = str(text).encode("utf-8")
+    if zstandard is None:
+        return zlib.compress(raw, ZLIB_LEVEL), "zlib"
+    dict_id = latest_dict_id(conn)
+    compressor, _ = _zstd_pair(conn, dict_id)
+    return compressor.compress(raw), f"zstd:{dict_id}" if dict_id is not None else "zstd"
+
+
+def decode(blob, codec, conn):
+    """(BLOB, 编码) -> 文本；无法解码时返回空字符串"""
+    if blob is None:
+        return ""
+    data = bytes(blob)
+    try:
+        if not codec or codec == "raw":
+            return data.decode("utf-8")
+        if codec == "zlib":
+            return zlib.decompress(data).decode("utf-8")
+        if codec.startswith("zstd"):
+            if zstandard is None:
+                raise RuntimeError("未安装 zstandard")
+            dict_id = int(codec.split(":", 1)[1]) if ":" in codec else None
+            _, decompressor = _zstd_pair(conn, dict_id)
+            return decompressor.decompress(data).decode("utf-8")
+        raise ValueError(f"未知编码: {codec}")
+    except Exception as e:
+        print(f"[TextStore] 正文解码失败 ({codec}): {e}")
+        return ""
+
+
+def train_dictionary(samples, conn):
+    """用正文样本训练 zstd 字典并保存，返回字典 id；样本不足或未安装 zstandard 时返回 None"""
+    samples = [str(s).encode("utf-8") for s in samples if s]
+    if zstandard is None or len(samples) < TRAIN_MIN_SAMPLES:
+        return None
+    try:
+        trained = zstandard.train_dictionary(DICT_SIZE, samples)
+    except zstandard.ZstdError as e:
+        print(f"[TextStore] 字典训练失败: {e}")
+        return None
+    cur = conn.execute(
+        "INSERT INTO text_dictionaries (codec, data, samples, created_at) VALUES ('zstd', ?, ?, ?)",
+        (trained.as_bytes(), len(samples), datetime.now().isoformat())
+    )
+    latest_dict_id(conn, refresh=True)
+    print(f"[TextStore] 已训练压缩字典 #{cur.lastrowid}: {len(samples)} 个样本，{len(trained.as_bytes())} 字节")
+    return cur.lastrowid
+
+
+def _recent_contents(conn, limit=TRAIN_SAMPLES):
+    rows = conn.execute(
+        "SELECT content, codec FROM article_texts WHERE content IS NOT NULL ORDER BY article_id DESC LIMIT ?",
+        (limit,)
+    ).fetchall()
+    return [decode(blob, codec, conn) for blob, codec in rows]
+
+
+def maybe_train(conn):
+    """未用最新字典压缩的正文足够多时 (重新) 训练字典，返回新字典 id 或 None"""
+    if zstandard is None:
+        return None
+    dict_id = latest_dict_id(conn, refresh=True)
+    expected = f"zstd:{dict_id}" if dict_id is not None else None
+    pending = conn.execute(
+        "SELECT COUNT(*) FROM article_texts WHERE content IS NOT NULL AND codec IS NOT ?", (expected,)
+    ).fetchone()[0]
+    threshold = TRAIN_MIN_SAMPLES if dict_id is None else RETRAIN_AFTER
+    if pending < threshold:
+        return None
+    return train_dictionary(_recent_contents(conn), conn)
+
+
+def recompress(conn, batch_size=500):
+    """用最新字典重新压缩旧记录，返回处理行数"""
+    dict_id = latest_dict_id(conn, refresh=True)
+    if zstandard is None or dict_id is None:
+        return 0
+    target = f"zstd:{dict_id}"
+    done = 0
+    while True:
+        rows = conn.execute(
+            "SELECT article_id, content, codec FROM article_texts WHERE content IS NOT NULL AND codec != ? LIMIT ?",
+            (target, batch_size)
+        ).fetchall()
+        if not rows:
+            break
+        updates = []
+        for article_id, blob, codec in rows:
+            text = decode(blob, codec, conn)
+            if not text:
+                updates.append((None, None, article_id))
+                continue
+            updates.append(encode(text, conn) + (article_id,))
+        conn.executemany("UPDATE article_texts SET content = ?, codec = ? WHERE article_id = ?", updates)
+        conn.commit()
+        done += len(rows)
+    return done
+
+
+def stats(conn):
+    """正文存储统计: 行数、压缩前后字节数 (按编码)"""
+    result = []
+    for codec, count, stored in conn.execute(
+        "SELECT codec, COUNT(*), SUM(LENGTH(content)) FROM article_texts WHERE content IS NOT NULL GROUP BY codec"
+    ):
+        sample = conn.execute(
+            "SELECT content FROM article_texts WHERE codec IS ? AND content IS NOT NULL LIMIT 200", (codec,)
+        ).fetchall()
+        raw_bytes = sum(len(decode(r[0], codec, conn).encode("utf-8")) for r in sample)
+        stored_sample = sum(len(r[0]) for r in sample)
+        result.append({
+            "codec": codec,
+            "rows": count,
+            "stored_bytes": stored or 0,
+            "ratio": round(raw_bytes / stored_sample, 2) if stored_sample else None,
+        })
+    return result
+
+
+if __name__ == "__main__":
+    import sqlite3
+
+    import database
+
+    parser = argparse.ArgumentParser(description="文章正文压缩存储")
+    parser.add_argument("action", choices=["stats", "train", "recompress", "vacuum"])
+    args = parser.parse_args()
+
+    database.init_db()
+    conn = sqlite3.connect(database.DB_PATH, timeout=30)
+    try:
+        if args.action == "train":
+            train_dictionary(_recent_contents(conn), conn)
+            conn.commit()
+        elif args.action == "recompress":
+            print(f"[TextStore] 已重新压缩 {recompress(conn)} 篇正文")
+        elif args.action == "vacuum":
+            before = os.path.getsize(database.DB_PATH)
+            conn.execute("VACUUM")
+            print(f"[TextStore] 数据库 {before / 1e6:.1f} MB -> {os.path.getsize(database.DB_PATH) / 1e6:.1f} MB")
+        for item in stats(conn):
+            print(f"  {item['codec']:<10} {item['rows']:>8} 篇  {item['stored_bytes'] / 1e6:8.1f} MB  压缩比 {item['ratio']}")
+    finally:
+        conn.close()
@@ -0,0 +1,332 @@
+"""
+船舶轨迹归档
+
+ship_tracks.db 只保留最近 TRACK_HOT_DAYS 天的热数据；更早的轨迹点按月压缩为
+列式 NumPy 文件 data/track_archive/YYYY-MM.npz，避免被每船 5000 点的上限清理掉。
+
+每个归档文件按 (mmsi, ts) 排序，包含列:
+- mmsi: 字符串
+- ts: 轨迹时间 (本地时间按 UTC 编码的秒数，与热表中的无时区时间一致)
+- lat / lng / speed / heading: float32
+- status_raw: 字符串
+
+读取接口 get_track_history 合并归档与热表，供长周期利用率分析与 Dashboard 使用。
+"""
+
+import argparse
+import calendar
+import os
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import config
+import database
+from analysis.ships_status import parse_timestamp
+
+ARCHIVE_DIR = os.path.join(config.DATA_DIR, 'track_archive')
+TRACK_HOT_DAYS = int(os.getenv("TRACK_HOT_DAYS", "7"))
+ARCHIVE_BATCH_SIZE = 50000
+FLOAT_COLUMNS = ("lat", "lng", "speed", "heading")
+
+# 已加载的月文件缓存 (按文件修改时间失效)
+_MONTH_CACHE_SIZE = 12
+_month_cache = OrderedDict()
+_month_cache_lock = threading.Lock()
+
+
+def _to_epoch(value):
+    """轨迹时间字符串转秒数，无法解析时返回 None"""
+    dt = parse_timestamp(value)
+    if dt is None:
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone().replace(tzinfo=None)
+    return calendar.timegm(dt.timetuple())
+
+
+def _naive_from_epoch(ts):
+    return datetime.fromtimestamp(int(ts), timezone.utc).replace(tzinfo=None)
+
+
+def _from_epoch(ts):
+    return _naive_from_epoch(ts).isoformat()
+
+
+def _month_key(ts):
+    return _naive_from_epoch(ts).strftime("%Y-%m")
+
+
+def _month_path(month):
+    return os.path.join(ARCHIVE_DIR, f"{month}.npz")
+
+
+def _empty_columns():
+    return {
+        "mmsi": np.array([], dtype="U16"),
+        "ts": np.array([], dtype=np.int64),
+        "lat": np.array([], dtype=np.float32),
+        "lng": np.array([], dtype=np.float32),
+        "speed": np.array([], dtype=np.float32),
+        "heading": np.array([], dtype=np.float32),
+        "status_raw": np.array([], dtype="U32"),
+    }
+
+
+def _load_month_file(path):
+    with np.load(path, allow_pickle=False) as data:
+        return {name: data[name] for name in data.files}
+
+
+def load_month(month):
+    """读取一个月的归档列，文件不存在时返回空列"""
+    path = _month_path(month)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return _empty_columns()
+    with _month_cache_lock:
+        cached = _month_cache.get(path)
+        if cached and cached[0] == mtime:
+            _month_cache.move_to_end(path)
+            return cached[1]
+    columns = _load_month_file(path)
+    with _month_cache_lock:
+        _month_cache[path] = (mtime, columns)
+        _month_cache.move_to_end(path)
+        while len(_month_cache) > _MONTH_CACHE_SIZE:
+            _month_cache.popitem(last=False)
+    return columns
+
+
+def _write_month(month, columns):
+    """按 (mmsi, ts) 排序、去重后原子写入月文件"""
+    order = np.lexsort((columns["ts"], columns["mmsi"]))
+    columns = {name: values[order] for name, values in columns.items()}
+    if len(order) > 1:
+        same = (columns["mmsi"][1:] == columns["mmsi"][:-1]) & (columns["ts"][1:] == columns["ts"][:-1])
+        keep = np.concatenate(([True], ~same))
+        columns = {name: values[keep] for name, values in columns.items()}
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    path = _month_path(month)
+    tmp_path = f"{path}.tmp{os.getpid()}.npz"
+    np.savez_compressed(tmp_path, **columns)
+    os.replace(tmp_path, path)
+    return len(columns["ts"])
+
+
+def _rows_to_columns(rows):
+    columns = {
+        "mmsi": np.array([r[0] for r in rows], dtype="U16"),
+        "ts": np.array([r[1] for r in rows], dtype=np.int64),
+        "status_raw": np.array([r[6] or "" for r in rows], dtype="U32"),
+    }
+    for i, name in enumerate(FLOAT_COLUMNS, start=2):
+        columns[name] = np.array([np.nan if r[i] is None else r[i] for r in rows], dtype=np.float32)
+    return columns
+
+
+def compact_tracks(hot_days=TRACK_HOT_DAYS, dry_run=False):
+    """
+    将热表中早于 hot_days 天的轨迹点归档到月文件并从热表删除
+
+    Returns:
+        统计字典 {archived, skipped, months}
+    """
+    database.init_track_db()
+    cutoff = (datetime.now() - timedelta(days=hot_days)).isoformat()
+    stats = {"archived": 0, "skipped": 0, "months": set()}
+
+    conn = sqlite3.connect(database.TRACK_DB_PATH, timeout=30)
+    last_id = 0
+    try:
+        while True:
+            rows = conn.execute(
+                """
+                SELECT id, mmsi, timestamp, lat, lng, speed, heading, status_raw, created_at
+                FROM ship_tracks
+                WHERE timestamp < ? AND id > ?
+                ORDER BY id
+                LIMIT ?
+                """,
+                (cutoff, last_id, ARCHIVE_BATCH_SIZE)
+            ).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            by_month = {}
+            archived_ids = []
+            for row_id, mmsi, timestamp, lat, lng, speed, heading, status_raw, created_at in rows:
+                ts = _to_epoch(timestamp)
+                if ts is None:
+                    ts = _to_epoch(created_at)
+                if ts is None or lat is None or lng is None:
+                    stats["skipped"] += 1
+                    continue
+                by_month.setdefault(_month_key(ts), []).append(
+                    (str(mmsi), ts, lat, lng, speed, heading, status_raw)
+                )
+                archived_ids.append((row_id,))
+
+            if dry_run:
+                stats["archived"] += sum(len(v) for v in by_month.values())
+                stats["months"].update(by_month)
+                continue
+
+            # 先写归档文件再删除热表数据，中途失败最多产生重复点 (写入时去重)
+            for month, month_rows in by_month.items():
+                existing = load_month(month)
+                incoming = _rows_to_columns(month_rows)
+                merged = {name: np.concatenate([existing[name], incoming[name]]) for name in incoming}
+                _write_month(month, merged)
+                stats["archived"] += len(month_rows)
+                stats["months"].add(month)
+
+            # 无法解析时间的点留在热表，由每船点数上限自然清理
+            conn.executemany("DELETE FROM ship_tracks WHERE id = ?", archived_ids)
+            database.bump_data_version("ships", conn=conn)
+            conn.commit()
+    finally:
+        conn.close()
+
+    stats["months"] = sorted(stats["months"])
+    print(f"[Archive] 轨迹归档完成: 归档 {stats['archived']} 点, 跳过 {stats['skipped']} 点, 涉及月份 {stats['months']}")
+    return stats
+
+
+def _iter_months(start_ts, end_ts):
+    current = _naive_from_epoch(start_ts).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    last = _naive_from_epoch(end_ts)
+    while current <= last:
+        yield current.strftime("%Y-%m")
+        current = (current + timedelta(days=32)).replace(day=1)
+
+
+def read_archive_columns(start, end, mmsi=None):
+    """
+    读取时间范围内的归档列 (可按单船过滤)，供批量统计分析使用
+
+    Args:
+        start, end: datetime 或 ISO 字符串 (本地无时区时间)
+        mmsi: 只返回该船数据，None 表示全部
+
+    Returns:
+        {列名: numpy 数组}
+    """
+    start_ts = _to_epoch(start.isoformat() if isinstance(start, datetime) else start)
+    end_ts = _to_epoch(end.isoformat() if isinstance(end, datetime) else end)
+    if start_ts is None or end_ts is None or start_ts > end_ts:
+        return _empty_columns()
+
+    parts = []
+    for month in _iter_months(start_ts, end_ts):
+        columns = load_month(month)
+        if not len(columns["ts"]):
+            continue
+        if mmsi is not None:
+            key = str(mmsi)
+            lo = np.searchsorted(columns["mmsi"], key, side="left")
+            hi = np.searchsorted(columns["mmsi"], key, side="right")
+            columns = {name: values[lo:hi] for name, values in columns.items()}
+        mask = (columns["ts"] >= start_ts) & (columns["ts"] <= end_ts)
+        parts.append({name: values[mask] for name, values in columns.items()})
+
+    if not parts:
+        return _empty_columns()
+    return {name: np.concatenate([p[name] for p in parts]) for name in parts[0]}
+
+
+def get_track_history(mmsi, start, end, conn=None):
+    """
+    读取单船在时间范围内的完整轨迹 (归档 + 热表)，格式与 database.get_ship_tracks 一致
+
+    Args:
+        mmsi: 船舶 MMSI
+        start, end: ISO 时间字符串
+        conn: 轨迹库连接 (可选，复用且不关闭)
+    """
+    archived = read_archive_columns(start, end, mmsi=mmsi)
+    tracks = []
+    seen = set()
+    for i in range(len(archived["ts"])):
+        ts = int(archived["ts"][i])
+        seen.add(ts)
+        tracks.append({
+            "lat": round(float(archived["lat"][i]), 6),
+            "lng": round(float(archived["lng"][i]), 6),
+            "speed": None if np.isnan(archived["speed"][i]) else round(float(archived["speed"][i]), 2),
+            "heading": None if np.isnan(archived["heading"][i]) else round(float(archived["heading"][i]), 1),
+            "timestamp": _from_epoch(ts),
+            "created_at": None
+        })
+
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(database.TRACK_DB_PATH)
+    try:
+        rows = conn.execute(
+            """
+            SELECT lat, lng, speed, heading, timestamp, created_at
+            FROM ship_tracks
+            WHERE mmsi = ? AND timestamp >= ? AND timestamp <= ?
+            ORDER BY timestamp ASC
+            """,
+            (str(mmsi), start, end)
+        ).fetchall()
+    finally:
+        if own_conn:
+            conn.close()
+    for row in rows:
+        # 归档与热表重叠 (归档后删除前中断) 时以归档为准
+        if _to_epoch(row[4]) in seen:
+            continue
+        tracks.append({
+            "lat": row[0],
+            "lng": row[1],
+            "speed": row[2],
+            "heading": row[3],
+            "timestamp": row[4],
+            "created_at": row[5]
+        })
+    tracks.sort(key=lambda t: _to_epoch(t["timestamp"]) or 0)
+    return tracks
+
+
+def archive_stats():
+    """各月归档文件的点数与体积"""
+    result = []
+    if not os.path.isdir(ARCHIVE_DIR):
+        return result
+    for filename in sorted(os.listdir(ARCHIVE_DIR)):
+        if not filename.endswith(".npz") or ".tmp" in filename:
+            continue
+        month = filename[:-4]
+        columns = load_month(month)
+        result.append({
+            "month": month,
+            "points": int(len(columns["ts"])),
+            "vessels": int(len(np.unique(columns["mmsi"]))),
+            "bytes": os.path.getsize(os.path.join(ARCHIVE_DIR, filename))
+        })
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="船舶轨迹归档")
+    parser.add_argument("action", choices=["compact", "stats"], help="compact: 归档热表旧轨迹; stats: 查看归档文件")
+    parser.add_argument("--hot-days", type=int, default=TRACK_HOT_DAYS, help="热表保留天数 (compact)")
+    parser.add_argument("--dry-run", action="store_true", help="仅统计不写入 (compact)")
+    args = parser.parse_args()
+
+    if args.action == "compact":
+        compact_tracks(hot_days=args.hot_days, dry_run=args.dry_run)
+    else:
+        for item in archive_stats():
+            print(f"{item['month']}: {item['points']} 点, {item['vessels']} 艘, {item['bytes'] / 1024:.1f} KB")
@@ -23,6 +23,7 @@ export interface NewsItem {
   article_title?: string
   article_url?: string
   screenshot_path?: string
+  thumbnail_path?: string
   full_text_cn?: string
   contractor?: string
   client?: string
@@ -40,6 +41,7 @@ export interface NewsItem {
 
 export interface VesselItem {
   id: string
+  mmsi?: string
   name: string
   type: string
   status: string
@@ -51,6 +53,47 @@ export interface VesselItem {
   city?: string
   lastUpdate?: string
   updated_at?: string
+  speed?: number
+  heading?: number
+}
+
+export interface VesselDelta {
+  mmsi: string
+  lat: number
+  lng: number
+  speed?: number
+  heading?: number
+  status?: string
+  timestamp?: string
+  country?: string
+  province?: string
+  city?: string
+}
+
+export interface LiveHandlers {
+  article?: (payload: Record<string, any>) => void
+  ships?: (payload: { ships: VesselDelta[] }) => void
+}
+
+/**
+ * 订阅后端 SSE 实时推送 (/api/live)，返回取消订阅函数
+ * EventSource 断线后会自动重连并携带 Last-Event-ID 补发错过的事件
+ */
+export function subscribeLiveUpdates(handlers: LiveHandlers): () => void {
+  if (typeof EventSource === 'undefined') return () => {}
+  const source = new EventSource('/api/live')
+  for (const channel of ['article', 'ships'] as const) {
+    const handler = handlers[channel]
+    if (!handler) continue
+    source.addEventListener(channel, (e) => {
+      try {
+        handler(JSON.parse((e as MessageEvent).data))
+      } catch (err) {
+        console.error('Failed to handle live event:', err)
+      }
+    })
+  }
+  return () => source.close()
 }
 
 export const useNewsStore = defineStore('news', () => {
@@ -149,12 +192,34 @@ export const useVesselStore = defineStore('vessel', () => {
     }
   }
 
+  // 合并实时推送的位置增量，不再重新拉取全量船舶列表
+  function applyVesselDeltas(deltas: VesselDelta[]) {
+    const byMmsi = new Map(deltas.map(d => [String(d.mmsi), d]))
+    vessels.value = vessels.value.map(v => {
+      const delta = v.mmsi ? byMmsi.get(String(v.mmsi)) : undefined
+      if (!delta) return v
+      return {
+        ...v,
+        lat: delta.lat,
+        lng: delta.lng,
+        speed: delta.speed ?? v.speed,
+        heading: delta.heading ?? v.heading,
+        status: delta.status || v.status,
+        country: delta.country || v.country,
+        province: delta.province || v.province,
+        city: delta.city || v.city,
+        updated_at: new Date().toISOString()
+      }
+    })
+  }
+
   return {
     vessels,
     loading,
     trackedCount,
     totalCount,
     vesselsByStatus,
-    fetchVessels
+    fetchVessels,
+    applyVesselDeltas
   }
 })